@@ -0,0 +1,331 @@
+"""Synthetic databases and a benchmark suite for timing regolith at scale.
+
+``regolith bench`` writes a database generated from the exemplars at each of
+a number of scales, times loading it, validating it and a set of builders and
+helpers on it, and writes the timings as JSON so that runs on different
+commits can be compared::
+
+    regolith bench --scales 1 10 100 --out before.json
+    git checkout my-branch
+    regolith bench --scales 1 10 100 --out after.json --compare before.json
+"""
+
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from copy import copy, deepcopy
+
+from regolith import __version__
+from regolith.fsclient import date_encoder, dump_json, dump_yaml
+from regolith.schemas import EXEMPLARS
+
+DEFAULT_SCALES = (1, 10, 100)
+
+# the fields of people and contacts that copies get a suffix on, so that each
+# copy is a different person to the builders and helpers that look them up
+NAME_FIELDS = ("name", "aka")
+
+
+def _numbered(name, i):
+    # the number goes before the last name, which names are sorted by
+    first, _, last = name.rpartition(" ")
+    return " ".join(s for s in (first, str(i), last) if s)
+
+
+def _rename(doc, i):
+    for field in NAME_FIELDS:
+        value = doc.get(field)
+        if isinstance(value, str):
+            doc[field] = _numbered(value, i)
+        elif isinstance(value, list):
+            doc[field] = [_numbered(v, i) if isinstance(v, str) else v for v in value]
+
+
+def synthesize(scale=1, counts=None):
+    """Generates a database from the exemplars.
+
+    Every collection holds ``scale`` times as many documents as there are
+    exemplars of it, unless it is given a count of its own. The documents are
+    copies of the exemplars, in turn, with a suffix on their ``_id``, and on
+    the names of people and contacts, so that they are all schema valid and
+    refer to each other as the exemplars do. Appointments, education,
+    employment and the todos of people grow with the number of people.
+
+    Parameters
+    ----------
+    scale : int, optional
+        The number of copies of the exemplars, defaults to 1, which is the
+        exemplars themselves.
+    counts : dict, optional
+        Maps collection names to their number of documents, overriding scale.
+
+    Returns
+    -------
+    collections : dict
+        Maps collection names to dicts of documents by ``_id``.
+    """
+    counts = counts or {}
+    collections = {}
+    for collname, exemplars in EXEMPLARS.items():
+        if not isinstance(exemplars, list):
+            exemplars = [exemplars]
+        n = counts.get(collname, scale * len(exemplars))
+        coll = {}
+        for j in range(n):
+            doc = deepcopy(exemplars[j % len(exemplars)])
+            i = j // len(exemplars)
+            if i > 0:
+                doc["_id"] = "{0}-{1}".format(doc["_id"], i)
+                if collname in ("people", "contacts"):
+                    _rename(doc, i)
+            coll[doc["_id"]] = doc
+        collections[collname] = coll
+    return collections
+
+
+def write_database(path, scale=1, counts=None, fmt="yaml"):
+    """Writes a synthetic database, and a regolithrc.json to use it, to path.
+
+    Parameters
+    ----------
+    path : str
+        The directory to write to, it is created if need be.
+    scale : int, optional
+        See synthesize, defaults to 1.
+    counts : dict, optional
+        See synthesize.
+    fmt : str, optional
+        The format of the collection files, "yaml" or "json", defaults to
+        "yaml".
+
+    Returns
+    -------
+    collections : dict
+        The collections that were written.
+    """
+    dbpath = os.path.join(path, "db")
+    os.makedirs(dbpath, exist_ok=True)
+    rc = {
+        "default_user_id": "sbillinge",
+        "groupname": "ERGS",
+        "databases": [
+            {
+                "name": "test",
+                "url": path,
+                "public": True,
+                "path": "db",
+                "local": True,
+                "backend": "filesystem",
+            }
+        ],
+    }
+    with open(os.path.join(path, "regolithrc.json"), "w", encoding="utf-8") as f:
+        json.dump(rc, f, indent=2)
+    collections = synthesize(scale=scale, counts=counts)
+    for collname, docs in collections.items():
+        filename = os.path.join(dbpath, "{0}.{1}".format(collname, fmt))
+        if fmt == "json":
+            dump_json(filename, docs, date_handler=date_encoder)
+        else:
+            dump_yaml(filename, deepcopy(docs))
+    return collections
+
+
+def _open():
+    from regolith.database import open_dbs
+    from regolith.runcontrol import DEFAULT_RC, filter_databases, load_rcfile
+
+    rc = copy(DEFAULT_RC)
+    rc._update(load_rcfile("regolithrc.json"))
+    filter_databases(rc)
+    client = open_dbs(rc)
+    client.close()
+
+
+def _main(*args):
+    def run():
+        from regolith.main import main
+
+        main(list(args))
+
+    return run
+
+
+def _html():
+    os.makedirs(os.path.join("templates", "static"), exist_ok=True)
+    _main("build", "html", "--no-pdf")()
+
+
+# name -> function that runs the benchmark in the database directory
+BENCHMARKS = {
+    "load": _open,
+    "validate": _main("validate"),
+    "build-cv": _main("build", "cv", "--no-pdf"),
+    "build-publist": _main("build", "publist", "--no-pdf"),
+    "build-html": _html,
+    "build-recent-collabs": _main("build", "recent-collabs", "--no-pdf", "--people", "scopatz"),
+    "build-current-pending": _main("build", "current-pending", "--no-pdf"),
+    "helper-makeappointments": _main(
+        "helper", "makeappointments", "run", "--no-plot", "--projection-from-date", "2020-08-31"
+    ),
+    "helper-l_todo": _main("helper", "l_todo", "--assigned-to", "sbillinge", "--date", "2020-05-01"),
+    "helper-lister": _main("helper", "lister", "people"),
+}
+
+# spans of the profiler that are reported as benchmarks of their own, from
+# the runs of the benchmark they are recorded in
+SPANS = {"load": ("load_database", "chain")}
+
+
+def time_benchmark(name, repeat=3):
+    """Runs a benchmark repeat times in the current directory.
+
+    Returns
+    -------
+    timings : dict
+        Maps the benchmark name, and the names of its SPANS, prefixed with
+        the benchmark name, to their times in seconds, one per run.
+    """
+    from regolith.profiler import PROFILER
+
+    spans = SPANS.get(name, ())
+    timings = {name: []}
+    timings.update({"{0}.{1}".format(name, s): [] for s in spans})
+    for _ in range(repeat):
+        if spans:
+            PROFILER.enable()
+        start = time.perf_counter()
+        try:
+            with redirect_stdout(io.StringIO()):
+                BENCHMARKS[name]()
+        finally:
+            timings[name].append(time.perf_counter() - start)
+            if spans:
+                PROFILER.disable()
+        if spans:
+            totals = {row[0]: row[2] for row in PROFILER.summary()}
+            for s in spans:
+                timings["{0}.{1}".format(name, s)].append(totals.get(s, 0.0))
+    return timings
+
+
+def git_commit():
+    """Returns the commit regolith is running from, or None."""
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, repeat=3, only=None, directory=None, verbose=True):
+    """Times the benchmarks on a synthetic database at each scale.
+
+    Parameters
+    ----------
+    scales : sequence of int, optional
+        The scales to run at, see synthesize.
+    repeat : int, optional
+        The number of runs of each benchmark, the minimum and median of which
+        are reported, defaults to 3.
+    only : sequence of str, optional
+        The names of the benchmarks to run, defaults to all of them.
+    directory : str, optional
+        Where the databases are written, one subdirectory per scale, defaults
+        to a temporary directory.
+    verbose : bool, optional
+        Print each result to stderr as it comes in, defaults to True.
+
+    Returns
+    -------
+    results : dict
+        The environment and the results, ready to be written as JSON.
+    """
+    names = list(BENCHMARKS) if not only else list(only)
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError("unknown benchmark {0!r}, pick from {1}".format(name, ", ".join(BENCHMARKS)))
+    results = {
+        "version": __version__,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "results": [],
+    }
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="regolith-bench-") as tmp:
+        for scale in scales:
+            path = os.path.abspath(os.path.join(directory or tmp, "scale-{0}".format(scale)))
+            write_database(path, scale=scale)
+            os.chdir(path)
+            try:
+                for name in names:
+                    for key, times in time_benchmark(name, repeat=repeat).items():
+                        result = {
+                            "name": key,
+                            "scale": scale,
+                            "times": times,
+                            "min": min(times),
+                            "median": statistics.median(times),
+                        }
+                        results["results"].append(result)
+                        if verbose:
+                            print(
+                                "{0:<32} x{1:<5} min {2:8.3f} s  median {3:8.3f} s".format(
+                                    key, scale, result["min"], result["median"]
+                                ),
+                                file=sys.stderr,
+                            )
+            finally:
+                os.chdir(cwd)
+    return results
+
+
+def compare(old, new, file=None):
+    """Prints the ratio of the new to the old minimum time of each benchmark
+    and scale that both results have."""
+    if file is None:
+        file = sys.stdout
+    before = {(r["name"], r["scale"]): r["min"] for r in old["results"]}
+    print(
+        "comparing {0} to {1}".format(
+            old.get("commit") or old["timestamp"], new.get("commit") or new["timestamp"]
+        ),
+        file=file,
+    )
+    for r in new["results"]:
+        key = (r["name"], r["scale"])
+        if key not in before or before[key] == 0:
+            continue
+        print(
+            "{0:<32} x{1:<5} {2:8.3f} s -> {3:8.3f} s  {4:6.2f}x".format(
+                r["name"], r["scale"], before[key], r["min"], r["min"] / before[key]
+            ),
+            file=file,
+        )
+
+
+def main(rc):
+    """Runs the benchmarks with the options of ``regolith bench``."""
+    results = run_benchmarks(scales=rc.scales, repeat=rc.repeat, only=rc.only, directory=rc.bench_dir)
+    if rc.out:
+        with open(rc.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if rc.compare:
+        with open(rc.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
@@ -82,6 +82,7 @@ class ActivitylogBuilder(LatexBuilderBase):
     def latex(self):
         """Render latex template"""
         rc = self.rc
+        index = rc.client.reference_index()
         group = fuzzy_retrieval(self.gtx["groups"], ["_id", "aka", "name"], rc.groupname)
         if not rc.people:
             raise RuntimeError("ERROR: please rerun specifying --people name")
@@ -105,7 +106,7 @@ class ActivitylogBuilder(LatexBuilderBase):
         me["pre_begin_period"] = dt.date.strftime(pre_begin_period, "%m/%d/%Y")
         me["end_period"] = dt.date.strftime(end_period, "%m/%d/%Y")
         me["post_end_period"] = dt.date.strftime(post_end_period, "%m/%d/%Y")
-        projs = filter_projects(self.gtx["projects"], set([build_target]), group=group["_id"])
+        projs = filter_projects(self.gtx["projects"], set([build_target]), group=group["_id"], index=index)
         ########
         # Recommendation Letters count
         ########
@@ -170,7 +171,7 @@ class ActivitylogBuilder(LatexBuilderBase):
                 g["subaward_amount"] = sum(amounts)
 
         current_grants = [dict(g) for g in grants if is_current(g)]
-        current_grants, _, _ = filter_grants(current_grants, {pi["name"]}, pi=False, multi_pi=True)
+        current_grants, _, _ = filter_grants(current_grants, {pi["name"]}, pi=False, multi_pi=True, index=index)
         current_grants = [g for g in current_grants if g.get("status") != "declined"]
         for g in current_grants:
             if g.get("budget"):
@@ -183,7 +184,7 @@ class ActivitylogBuilder(LatexBuilderBase):
                 rperson = fuzzy_retrieval(self.gtx["people"], ["aka", "name"], person["name"])
                 if rperson:
                     person["name"] = rperson["name"]
-        pending_grants, _, _ = filter_grants(pending_grants, {pi["name"]}, pi=False, multi_pi=True)
+        pending_grants, _, _ = filter_grants(pending_grants, {pi["name"]}, pi=False, multi_pi=True, index=index)
         badids = [i["_id"] for i in current_grants if not i.get("cpp_info").get("cppflag", "")]
 
         declined_proposals = [g for g in self.gtx["proposals"] if is_declined(g["status"])]
@@ -192,7 +193,9 @@ class ActivitylogBuilder(LatexBuilderBase):
                 rperson = fuzzy_retrieval(self.gtx["people"], ["aka", "name"], person["name"])
                 if rperson:
                     person["name"] = rperson["name"]
-        declined_proposals, _, _ = filter_grants(declined_proposals, {pi["name"]}, pi=False, multi_pi=True)
+        declined_proposals, _, _ = filter_grants(
+            declined_proposals, {pi["name"]}, pi=False, multi_pi=True, index=index
+        )
         declined_proposals = [
             proposal
             for proposal in declined_proposals
@@ -226,15 +229,21 @@ class ActivitylogBuilder(LatexBuilderBase):
         #########
         # advising
         #########
-        undergrads = filter_employment_for_advisees(self.gtx["people"], begin_period, "undergrad", rc.people[0])
-        masters = filter_employment_for_advisees(self.gtx["people"], begin_period, "ms", rc.people[0])
-        currents = filter_employment_for_advisees(self.gtx["people"], begin_period, "phd", rc.people[0])
+        undergrads = filter_employment_for_advisees(
+            self.gtx["people"], begin_period, "undergrad", rc.people[0], index=index
+        )
+        masters = filter_employment_for_advisees(self.gtx["people"], begin_period, "ms", rc.people[0], index=index)
+        currents = filter_employment_for_advisees(
+            self.gtx["people"], begin_period, "phd", rc.people[0], index=index
+        )
         graduateds = filter_employment_for_advisees(
-            self.gtx["people"], begin_period.replace(year=begin_year - 5), "phd", rc.people[0]
+            self.gtx["people"], begin_period.replace(year=begin_year - 5), "phd", rc.people[0], index=index
+        )
+        postdocs = filter_employment_for_advisees(
+            self.gtx["people"], begin_period, "postdoc", rc.people[0], index=index
         )
-        postdocs = filter_employment_for_advisees(self.gtx["people"], begin_period, "postdoc", rc.people[0])
         visitors = filter_employment_for_advisees(
-            self.gtx["people"], begin_period, "visitor-unsupported", rc.people[0]
+            self.gtx["people"], begin_period, "visitor-unsupported", rc.people[0], index=index
         )
         iter = deepcopy(graduateds)
         for g in iter:
@@ -302,6 +311,8 @@ class ActivitylogBuilder(LatexBuilderBase):
             since=begin_period,
             before=end_period,
             statuses=["accepted"],
+            resolver=self.institution_resolver(),
+            view=self.presentations_view(),
         )
         invpres = filter_presentations(
             self.gtx["people"],
@@ -312,6 +323,8 @@ class ActivitylogBuilder(LatexBuilderBase):
             since=begin_period,
             before=end_period,
             statuses=["accepted"],
+            resolver=self.institution_resolver(),
+            view=self.presentations_view(),
         )
         sempres = filter_presentations(
             self.gtx["people"],
@@ -322,6 +335,8 @@ class ActivitylogBuilder(LatexBuilderBase):
             since=begin_period,
             before=end_period,
             statuses=["accepted"],
+            resolver=self.institution_resolver(),
+            view=self.presentations_view(),
         )
         declpres = filter_presentations(
             self.gtx["people"],
@@ -332,6 +347,8 @@ class ActivitylogBuilder(LatexBuilderBase):
             since=begin_period,
             before=end_period,
             statuses=["declined"],
+            resolver=self.institution_resolver(),
+            view=self.presentations_view(),
         )
 
         #########################
@@ -373,7 +390,9 @@ class ActivitylogBuilder(LatexBuilderBase):
         #############
         # IP
         #############
-        patents = filter_patents(self.gtx["patents"], self.gtx["people"], build_target, since=begin_period)
+        patents = filter_patents(
+            self.gtx["patents"], self.gtx["people"], build_target, since=begin_period, index=index
+        )
         licenses = filter_licenses(self.gtx["patents"], self.gtx["people"], build_target, since=begin_period)
         #############
         # hindex
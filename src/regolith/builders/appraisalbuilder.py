@@ -68,6 +68,7 @@ class AppraisalBuilder(LatexBuilderBase):
     def latex(self):
         """Render latex template"""
         rc = self.rc
+        index = rc.client.reference_index()
         if not rc.people:
             raise RuntimeError("ERROR: please rerun specifying --people name")
         if not rc.from_date:
@@ -90,7 +91,7 @@ class AppraisalBuilder(LatexBuilderBase):
         me["pre_begin_period"] = dt.date.strftime(pre_begin_period, "%m/%d/%Y")
         me["end_period"] = dt.date.strftime(end_period, "%m/%d/%Y")
         me["post_end_period"] = dt.date.strftime(post_end_period, "%m/%d/%Y")
-        projs = filter_projects(self.gtx["projects"], set([build_target]), group="bg")
+        projs = filter_projects(self.gtx["projects"], set([build_target]), group="bg", index=index)
         #########
         # highlights
         #########
@@ -120,7 +121,7 @@ class AppraisalBuilder(LatexBuilderBase):
 
         current_grants = [dict(g) for g in grants if is_current(g)]
 
-        current_grants, _, _ = filter_grants(current_grants, {pi["name"]}, pi=False, multi_pi=True)
+        current_grants, _, _ = filter_grants(current_grants, {pi["name"]}, pi=False, multi_pi=True, index=index)
 
         pending_grants = [g for g in self.gtx["proposals"] if g["status"] == "pending"]
         for g in pending_grants:
@@ -128,7 +129,7 @@ class AppraisalBuilder(LatexBuilderBase):
                 rperson = fuzzy_retrieval(self.gtx["people"], ["aka", "name"], person["name"])
                 if rperson:
                     person["name"] = rperson["name"]
-        pending_grants, _, _ = filter_grants(pending_grants, {pi["name"]}, pi=False, multi_pi=True)
+        pending_grants, _, _ = filter_grants(pending_grants, {pi["name"]}, pi=False, multi_pi=True, index=index)
         grants = pending_grants + current_grants
         for grant in grants:
             grant_dates = get_dates(grant)
@@ -216,6 +217,8 @@ class AppraisalBuilder(LatexBuilderBase):
             since=begin_period,
             before=end_period,
             statuses=["accepted"],
+            resolver=self.institution_resolver(),
+            view=self.presentations_view(),
         )
         invpres = filter_presentations(
             self.gtx["people"],
@@ -226,6 +229,8 @@ class AppraisalBuilder(LatexBuilderBase):
             since=begin_period,
             before=end_period,
             statuses=["accepted"],
+            resolver=self.institution_resolver(),
+            view=self.presentations_view(),
         )
         sempres = filter_presentations(
             self.gtx["people"],
@@ -236,6 +241,8 @@ class AppraisalBuilder(LatexBuilderBase):
             since=begin_period,
             before=end_period,
             statuses=["accepted"],
+            resolver=self.institution_resolver(),
+            view=self.presentations_view(),
         )
         declpres = filter_presentations(
             self.gtx["people"],
@@ -246,6 +253,8 @@ class AppraisalBuilder(LatexBuilderBase):
             since=begin_period,
             before=end_period,
             statuses=["declined"],
+            resolver=self.institution_resolver(),
+            view=self.presentations_view(),
         )
 
         #########################
@@ -287,7 +296,9 @@ class AppraisalBuilder(LatexBuilderBase):
         #############
         # IP
         #############
-        patents = filter_patents(self.gtx["patents"], self.gtx["people"], build_target, since=begin_period)
+        patents = filter_patents(
+            self.gtx["patents"], self.gtx["people"], build_target, since=begin_period, index=index
+        )
         licenses = filter_licenses(self.gtx["patents"], self.gtx["people"], build_target, since=begin_period)
         #############
         # hindex
@@ -15,8 +15,20 @@ try:
 except ImportError:
     HAVE_BIBTEX_PARSER = False
 
+from regolith.profiler import span
 from regolith.sorters import category_val, date_key, doc_date_key, level_val
-from regolith.tools import LATEX_OPTS, date_to_rfc822, gets, latex_safe, latex_safe_url, month_and_year, rfc822now
+from regolith.tools import (
+    LATEX_OPTS,
+    InstitutionResolver,
+    PresentationsView,
+    all_docs_from_collection,
+    date_to_rfc822,
+    gets,
+    latex_safe,
+    latex_safe_url,
+    month_and_year,
+    rfc822now,
+)
 
 
 class BuilderBase(object):
@@ -41,6 +53,8 @@ class BuilderBase(object):
         self.gtx = {}
         self.construct_global_ctx()
         self.cmds = []
+        self._resolver = None
+        self._presentations_view = None
 
     def construct_global_ctx(self):
         """Constructs the global context"""
@@ -71,22 +85,49 @@ class BuilderBase(object):
         kwargs : dict
             Additional kwargs to the renderer
         """
-        template = self.env.get_template(tname)
-        ctx = dict(self.gtx)
-        ctx.update(kwargs)
-        ctx["rc"] = ctx.get("rc", self.rc)
-        ctx["static"] = ctx.get("static", os.path.relpath("static", os.path.dirname(fname)))
-        ctx["root"] = ctx.get("root", os.path.relpath("/", os.path.dirname(fname)))
-        result = template.render(ctx)
-        with open(os.path.join(self.bldir, fname), "wt", encoding="utf-8") as f:
-            f.write(result)
+        with span("render", cat="build", template=tname):
+            template = self.env.get_template(tname)
+            ctx = dict(self.gtx)
+            ctx.update(kwargs)
+            ctx["rc"] = ctx.get("rc", self.rc)
+            ctx["static"] = ctx.get("static", os.path.relpath("static", os.path.dirname(fname)))
+            ctx["root"] = ctx.get("root", os.path.relpath("/", os.path.dirname(fname)))
+            result = template.render(ctx)
+            with open(os.path.join(self.bldir, fname), "wt", encoding="utf-8") as f:
+                f.write(result)
 
     def build(self):
         """Build the thing that is being built, note this runs all commands
         listed in ``self.cmds``"""
         os.makedirs(self.bldir, exist_ok=True)
         for cmd in self.cmds:
-            getattr(self, cmd)()
+            with span(f"{self.btype}.{cmd}", cat="build"):
+                getattr(self, cmd)()
+        if self._resolver is not None:
+            self._resolver.report()
+
+    def institution_resolver(self):
+        """Returns the InstitutionResolver for this build, built on first use
+        from the institutions in the global context, or in the database.
+        Its warnings are reported once the build is done."""
+        if self._resolver is None:
+            if "institutions" in self.gtx:
+                institutions = self.gtx["institutions"]
+            else:
+                institutions = all_docs_from_collection(self.rc.client, "institutions", copy=False)
+            self._resolver = InstitutionResolver(institutions)
+        return self._resolver
+
+    def presentations_view(self, people=None):
+        """Returns the PresentationsView of the presentations in the global
+        context for this build, built on first use with their authors
+        resolved to people, which defaults to the people in the global
+        context."""
+        if self._presentations_view is None:
+            if people is None:
+                people = self.gtx["people"]
+            self._presentations_view = PresentationsView(people, self.gtx["presentations"])
+        return self._presentations_view
 
 
 class LatexBuilderBase(BuilderBase):
@@ -108,7 +149,8 @@ class LatexBuilderBase(BuilderBase):
 
     def run(self, cmd):
         """Run command in build dir"""
-        subprocess.run(cmd, cwd=self.bldir, check=True)
+        with span(cmd[0], cat="subprocess", cmd=" ".join(cmd)):
+            subprocess.run(cmd, cwd=self.bldir, check=True)
 
     def pdf(self, base):
         """Compiles latex files to PDF"""
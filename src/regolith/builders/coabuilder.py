@@ -9,7 +9,8 @@ and all coauthors in the past 48 months.
 import datetime as dt
 import os
 import sys
-from copy import copy
+from collections import defaultdict
+from copy import copy, deepcopy
 
 import openpyxl
 from dateutil.relativedelta import relativedelta
@@ -24,7 +25,7 @@ NUM_COAUTHOR_MONTHS = 48
 NUM_POSTDOC_MONTHS = None
 
 
-def get_advisors_name_inst(advisee, rc):
+def get_advisors_name_inst(advisee, rc, resolver=None, graph=None):
     """Get the advisee's advisor. Yield (last name, first name, institution name)."""
 
     phd_advisors = [
@@ -48,12 +49,21 @@ def get_advisors_name_inst(advisee, rc):
         if i.get("status") == "postdoc"
     ]
     advisors = phd_advisors + pdoc_advisors
-    return retrieve_names_and_insts(rc, advisors)
+    return retrieve_names_and_insts(rc, advisors, resolver=resolver, graph=graph)
 
 
-def get_advisees_name_inst(coll, advisor, rc):
-    """Get advisor's advisees. Yield (last name, first name, institutions)"""
+def get_advisees_name_inst(coll, advisor, rc, index=None, resolver=None, graph=None):
+    """Get advisor's advisees. Yield (last name, first name, institutions)
+
+    If a ReferenceIndex, or a CollaborationGraph, is given, only the people
+    that it has the advisor on are considered.
+    """
     advisor_names = advisor.get("aka", []) + [advisor.get("name"), advisor.get("_id")]
+    if graph is not None:
+        coll = graph.advisee_candidates(advisor_names)
+    elif index is not None:
+        ids = index.referencing("people", advisor_names)
+        coll = [person for person in coll if person.get("_id") in ids]
     advisees = []
     for person in coll:
         my_eme = person.get("employment", []) + person.get("education", [])
@@ -82,7 +92,7 @@ def get_advisees_name_inst(coll, advisor, rc):
             pdoc_advisees = [i for i in pdoc_advisees if rc.postdoc_since_date < i.get("interaction_date")]
         advisees.extend(phd_advisees)
         advisees.extend(pdoc_advisees)
-    return retrieve_names_and_insts(rc, advisees)
+    return retrieve_names_and_insts(rc, advisees, resolver=resolver, graph=graph)
 
 
 def filter_since_date(pubs, rc):
@@ -117,7 +127,7 @@ def get_since_dates(rc):
     return
 
 
-def get_coauthors_from_pubs(rc, pubs, not_person):
+def get_coauthors_from_pubs(rc, pubs, not_person, resolver=None, graph=None):
     """Get co-authors' names from the publication. Not include the person itself."""
     not_person_akas = [not_person["_id"], not_person["name"]] + not_person["aka"]
     my_collabs = list()
@@ -130,54 +140,66 @@ def get_coauthors_from_pubs(rc, pubs, not_person):
             ]
         )
     my_collabs.sort(key=lambda x: x["interaction_date"], reverse=True)
-    coauthors = retrieve_names_and_insts(rc, my_collabs, not_person_akas)
+    coauthors = retrieve_names_and_insts(rc, my_collabs, not_person_akas, resolver=resolver, graph=graph)
     return coauthors
 
 
-def retrieve_names_and_insts(rc, collabs, not_person_akas=[]):
+def retrieve_names_and_insts(rc, collabs, not_person_akas=[], resolver=None, graph=None):
+    """Looks up the collaborators in people and contacts, and their most
+    recent institutions. If a CollaborationGraph is given, the collaborators
+    are looked up in it, and if an InstitutionResolver is given, the
+    institutions are looked up, and missing ones reported, with it."""
     collab_buffer, my_collab_set = [], []
     for collab in collabs:
-        person = fuzzy_retrieval(
-            all_docs_from_collection(rc.client, "people"),
-            ["name", "aka", "_id"],
-            collab["name"],
-            case_sensitive=False,
-        )
-        if not person:
+        if graph is not None:
+            person = graph.find(collab["name"])
+        else:
             person = fuzzy_retrieval(
+                all_docs_from_collection(rc.client, "people"),
+                ["name", "aka", "_id"],
+                collab["name"],
+                case_sensitive=False,
+            ) or fuzzy_retrieval(
                 all_docs_from_collection(rc.client, "contacts"),
                 ["name", "aka", "_id"],
                 collab["name"],
                 case_sensitive=False,
             )
-            if not person:
-                if collab["name"] == "missing name":
-                    print(
-                        f"WARNING: a {collab.get('advis_type')} appointment "
-                        f"was found for the target {collab.get('type')} but "
-                        f"no name was specified. Please add an 'advisor' field "
-                        f"for that education/employment entry in the database."
-                    )
-                else:
-                    print(f"WARNING: {collab['name']} not found in contacts or people.")
-                person = {"_id": collab["name"], "name": collab["name"], "type": collab.get("type")}
+        if not person:
+            if collab["name"] == "missing name":
+                print(
+                    f"WARNING: a {collab.get('advis_type')} appointment "
+                    f"was found for the target {collab.get('type')} but "
+                    f"no name was specified. Please add an 'advisor' field "
+                    f"for that education/employment entry in the database."
+                )
+            else:
+                print(f"WARNING: {collab['name']} not found in contacts or people.")
+            person = {"_id": collab["name"], "name": collab["name"], "type": collab.get("type")}
         if person.get("name", ""):
             collab["name"] = HumanName(person.get("name", ""))
         else:
             print("missing_person", person)
         collab["_id"] = person.get("_id")
         pinst = get_recent_org(person)
-        inst = fuzzy_retrieval(
-            all_docs_from_collection(rc.client, "institutions"),
-            ["name", "aka", "_id"],
-            pinst,
-            case_sensitive=False,
-        )
+        if resolver is not None:
+            inst = resolver.institution(pinst, case_sensitive=False)
+        else:
+            inst = fuzzy_retrieval(
+                all_docs_from_collection(rc.client, "institutions"),
+                ["name", "aka", "_id"],
+                pinst,
+                case_sensitive=False,
+            )
         if inst:
             collab["institution"] = inst["name"]
         else:
             collab["institution"] = pinst
-            print(f"WARNING: {pinst} for {person.get('_id')} missing from institutions")
+            message = f"WARNING: {pinst} for {person.get('_id')} missing from institutions"
+            if resolver is not None:
+                resolver.warn(message)
+            else:
+                print(message)
         if collab["_id"] not in collab_buffer and collab["name"] not in not_person_akas:
             my_collab_set.append(collab)
             collab_buffer.append(collab["_id"])
@@ -369,8 +391,14 @@ def unmerge(ws, cells):
     return
 
 
-def get_person(person_id, rc):
+def get_person(person_id, rc, graph=None):
     """Get the person's name."""
+    if graph is not None:
+        person_found = graph.find(person_id)
+        if not person_found:
+            print("WARNING: {} missing from people and contacts. Check aka.".format(person_id))
+            person_found = {"name": person_id}
+        return person_found
     person_found = fuzzy_retrieval(
         all_docs_from_collection(rc.client, "people"), ["name", "aka", "_id"], person_id, case_sensitive=False
     )
@@ -385,7 +413,7 @@ def get_person(person_id, rc):
     return person_found
 
 
-def find_coeditors(person, rc):
+def find_coeditors(person, rc, graph=None):
     """Get the coeditors info of the person. Return (last, first, inst, journal)."""
     emps = person.get("employment")
     if emps is None:
@@ -401,13 +429,91 @@ def find_coeditors(person, rc):
 
     coeditor_inst_journals = set()
     for coeditor_id, journal in coeditor_id_journals(emps):
-        coeditor = get_person(coeditor_id, rc)
+        coeditor = get_person(coeditor_id, rc, graph=graph)
         coeditor_name = HumanName(coeditor.get("name"), "")
         inst_name = get_inst_name(coeditor, rc)
         coeditor_inst_journals.add((coeditor_name.last, coeditor_name.first, inst_name, journal, "co-editor"))
     return coeditor_inst_journals
 
 
+def _folded_aliases(docs, sources):
+    aliases = {}
+    for doc in docs:
+        for k in sources:
+            values = doc.get(k, [])
+            for value in values if isinstance(values, list) else [values]:
+                if isinstance(value, str):
+                    aliases.setdefault(value.lower(), doc)
+    return aliases
+
+
+class CollaborationGraph(object):
+    """Links people to their advisees and coauthors, built once from the
+    people, contacts and citations, so that the recent collaborators of many
+    people can be listed without scanning every person and citation for
+    each of them.
+
+    People are linked to their advisees through an index of the advisors of
+    every employment and education entry, and to their coauthors through an
+    index of the citations by author and editor. Advisors and coeditors are
+    on the person's own document. Names are looked up in people, and then
+    contacts, the way ``fuzzy_retrieval(docs, ["name", "aka", "_id"], name,
+    case_sensitive=False)`` does.
+
+    Parameters
+    ----------
+    people : iterable of dicts
+        The people
+    contacts : iterable of dicts, optional
+        The contacts
+    citations : iterable of dicts, optional
+        The citations
+    """
+
+    def __init__(self, people, contacts=(), citations=()):
+        self.people = list(people)
+        self.citations = list(citations)
+        self._people = _folded_aliases(self.people, ["aka", "name", "_id"])
+        self._everybody = _folded_aliases(contacts, ["name", "aka", "_id"])
+        self._everybody.update(self._people)
+        self.by_author = defaultdict(list)
+        for i, cite in enumerate(self.citations):
+            for name in set(cite.get("author", [])) | set(cite.get("editor", [])):
+                self.by_author[name].append(i)
+        self.by_advisor = defaultdict(list)
+        for i, person in enumerate(self.people):
+            for entry in person.get("employment", []) + person.get("education", []):
+                advisor = entry.get("advisor", "")
+                if isinstance(advisor, str) and i not in self.by_advisor[advisor][-1:]:
+                    self.by_advisor[advisor].append(i)
+
+    def person(self, name):
+        """Returns the person with name as their alias, name or id, or None."""
+        return self._people.get(name.lower()) if isinstance(name, str) else None
+
+    def find(self, name):
+        """Returns the person, or else the contact, with name as their name,
+        alias or id, or None."""
+        return self._everybody.get(name.lower()) if isinstance(name, str) else None
+
+    def publications(self, names):
+        """Returns the citations with any of names as an author or editor, in
+        the order of the citations."""
+        positions = set()
+        for name in names:
+            positions.update(self.by_author.get(name, ()))
+        return [self.citations[i] for i in sorted(positions)]
+
+    def advisee_candidates(self, names):
+        """Returns the people with any of names as the advisor of one of their
+        employment or education entries, in the order of the people."""
+        positions = set()
+        for name in names:
+            if isinstance(name, str):
+                positions.update(self.by_advisor.get(name, ()))
+        return [self.people[i] for i in sorted(positions)]
+
+
 class RecentCollaboratorsBuilder(BuilderBase):
     """Build recent collaborators from database entries"""
 
@@ -424,6 +530,7 @@ class RecentCollaboratorsBuilder(BuilderBase):
             os.path.dirname(os.path.dirname(__file__)), "templates", "coa_template_doe.xlsx"
         )
         self.cmds = ["excel"]
+        self._graph = None
         try:
             rc.verbose
         except AttributeError:
@@ -448,17 +555,29 @@ class RecentCollaboratorsBuilder(BuilderBase):
         gtx["citations"] = all_docs_from_collection(rc.client, "citations")
         gtx["all_docs_from_collection"] = all_docs_from_collection
 
+    def collaboration_graph(self):
+        """Returns the CollaborationGraph of the database, built on first use
+        and shared by all of the people the collaborators are built for."""
+        if self._graph is None:
+            rc = self.rc
+            self._graph = CollaborationGraph(
+                all_docs_from_collection(rc.client, "people"),
+                all_docs_from_collection(rc.client, "contacts"),
+                all_docs_from_collection(rc.client, "citations"),
+            )
+        return self._graph
+
     def query_ppl(self, target):
         """Query the data base for the target's collaborators' information."""
         rc = self.rc
-        gtx = self.gtx
-        person = fuzzy_retrieval(
-            all_docs_from_collection(rc.client, "people"), ["aka", "name", "_id"], target, case_sensitive=False
-        )
+        graph = self.collaboration_graph()
+        person = graph.person(target)
         if not person:
             raise RuntimeError("Person {} not found in people.".format(target).encode("utf-8"))
-
-        pubs = get_person_pubs(gtx["citations"], person)
+        # the documents in the graph are shared between targets
+        person = deepcopy(person)
+        names = person.get("aka", []) + [person["name"]]
+        pubs = get_person_pubs(graph.publications(names), person)
         pubs = filter_since_date(pubs, rc)
         try:
             if rc.verbose:
@@ -466,9 +585,10 @@ class RecentCollaboratorsBuilder(BuilderBase):
                     print(f"{pub.get('title')}, ({pub.get('year')})")
         except AttributeError:
             pass
-        my_collabs = get_coauthors_from_pubs(rc, pubs, person)
-        advisors = get_advisors_name_inst(person, rc)
-        advisees = get_advisees_name_inst(all_docs_from_collection(rc.client, "people"), person, rc)
+        resolver = self.institution_resolver()
+        my_collabs = get_coauthors_from_pubs(rc, pubs, person, resolver=resolver, graph=graph)
+        advisors = get_advisors_name_inst(person, rc, resolver=resolver, graph=graph)
+        advisees = get_advisees_name_inst(graph.people, person, rc, resolver=resolver, graph=graph)
         collabs = []
         adviseors = advisors + advisees
         for collab in my_collabs:
@@ -10,7 +10,6 @@ from regolith.stylers import month_fullnames, sentencecase
 from regolith.tools import (
     all_docs_from_collection,
     awards_grants_honors,
-    dereference_institution,
     filter_employment_for_advisees,
     filter_grants,
     filter_presentations,
@@ -49,6 +48,7 @@ class CVBuilder(LatexBuilderBase):
     def latex(self):
         """Render latex template"""
         rc = self.rc
+        index = rc.client.reference_index()
         gtx = self.gtx
         if rc.people:
             people = [fuzzy_retrieval(gtx["people"], ["aka", "_id", "name"], rc.people[0])]
@@ -77,7 +77,7 @@ class CVBuilder(LatexBuilderBase):
             for t in teach:
                 t["position"] = t.get("position").title()
 
-            projs = filter_projects(all_docs_from_collection(rc.client, "projects"), names)
+            projs = filter_projects(all_docs_from_collection(rc.client, "projects"), names, index=index)
             for proj in projs:
                 for member in proj.get("team", []):
                     member.get("role", "").replace("pi", "PI")
@@ -91,14 +91,16 @@ class CVBuilder(LatexBuilderBase):
                 self.gtx["institutions"],
                 person.get("_id"),
                 statuses=["accepted"],
+                resolver=self.institution_resolver(),
+                view=self.presentations_view(),
             )
 
             for grant in grants:
                 for member in grant.get("team"):
-                    dereference_institution(member, self.gtx["institutions"])
+                    self.institution_resolver().dereference(member)
 
-            pi_grants, pi_amount, _ = filter_grants(grants, names, pi=True)
-            coi_grants, coi_amount, coi_sub_amount = filter_grants(grants, names, pi=False)
+            pi_grants, pi_amount, _ = filter_grants(grants, names, pi=True, index=index)
+            coi_grants, coi_amount, coi_sub_amount = filter_grants(grants, names, pi=False, index=index)
             for grant in coi_grants:
                 format_pi = grant["me"].get("position", "").replace("copi", "Co-PI")
                 format_role = format_pi.replace("pi", "PI")
@@ -109,22 +111,30 @@ class CVBuilder(LatexBuilderBase):
             # TODO: pull this out so we can use it everywhere
             for ee in [emps, edu]:
                 for e in ee:
-                    dereference_institution(e, self.gtx["institutions"])
+                    self.institution_resolver().dereference(e)
 
             undergrads = filter_employment_for_advisees(
-                self.gtx["people"], begin_period, "undergrad", person["_id"]
+                self.gtx["people"], begin_period, "undergrad", person["_id"], index=index
             )
             for undergrad in undergrads:
                 undergrad["role"] = undergrad["role"].title()
-            masters = filter_employment_for_advisees(self.gtx["people"], begin_period, "ms", person["_id"])
+            masters = filter_employment_for_advisees(
+                self.gtx["people"], begin_period, "ms", person["_id"], index=index
+            )
             for master in masters:
                 master["role"] = master["role"].title()
-            currents = filter_employment_for_advisees(self.gtx["people"], begin_period, "phd", person["_id"])
-            graduateds = filter_employment_for_advisees(self.gtx["people"], begin_period, "phd", person["_id"])
-            postdocs = filter_employment_for_advisees(self.gtx["people"], begin_period, "postdoc", person["_id"])
+            currents = filter_employment_for_advisees(
+                self.gtx["people"], begin_period, "phd", person["_id"], index=index
+            )
+            graduateds = filter_employment_for_advisees(
+                self.gtx["people"], begin_period, "phd", person["_id"], index=index
+            )
+            postdocs = filter_employment_for_advisees(
+                self.gtx["people"], begin_period, "postdoc", person["_id"], index=index
+            )
             postdocs = remove_duplicate_docs(postdocs, "name")
             visitors = filter_employment_for_advisees(
-                self.gtx["people"], begin_period, "visitor-unsupported", person["_id"]
+                self.gtx["people"], begin_period, "visitor-unsupported", person["_id"], index=index
             )
             visitors = remove_duplicate_docs(visitors, "name")
             for visitor in visitors:
@@ -136,6 +136,8 @@ class GrantReportBuilder(LatexBuilderBase):
                     since=rp_start_date,
                     before=rp_end_date,
                     statuses=["accepted"],
+                    resolver=self.institution_resolver(),
+                    view=self.presentations_view(),
                 )
             )
         # thesis defendings
@@ -187,11 +189,13 @@ class GrantReportBuilder(LatexBuilderBase):
                     name = contact.get("name")
                     aka = contact.get("aka")
                     institution_id = contact.get("institution")
-                    institution = fuzzy_retrieval(institutions_coll, ["name", "aka", "_id"], institution_id)
+                    institution = self.institution_resolver().institution(institution_id)
                     if institution:
                         inst_name = institution.get("name")
                     else:
-                        print(f"WARNING: institution {institution_id} not found " f"in institutions collection")
+                        self.institution_resolver().warn(
+                            f"WARNING: institution {institution_id} not found " f"in institutions collection"
+                        )
                         inst_name = institution_id
                     collaborators[id] = {"aka": aka, "name": name, "institution": inst_name}
         missing_contacts = [id for id in grant_prum_collaborators if not collaborators.get(id)]
@@ -9,7 +9,6 @@ from regolith.fsclient import _id_key
 from regolith.sorters import ene_date_key, position_key
 from regolith.tools import (
     all_docs_from_collection,
-    dereference_institution,
     document_by_value,
     filter_projects,
     filter_publications,
@@ -98,7 +97,7 @@ class HtmlBuilder(BuilderBase):
             ene = emps + p.get("education", [])
             ene.sort(key=ene_date_key, reverse=True)
             for e in ene:
-                dereference_institution(e, all_docs_from_collection(rc.client, "institutions"))
+                self.institution_resolver().dereference(e)
             projs = filter_projects(all_docs_from_collection(rc.client, "projects"), names)
             for serve in p.get("service", []):
                 serve_dates = get_dates(serve)
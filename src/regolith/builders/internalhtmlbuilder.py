@@ -10,7 +10,6 @@ from regolith.fsclient import _id_key
 from regolith.sorters import ene_date_key, position_key
 from regolith.tools import (
     all_docs_from_collection,
-    dereference_institution,
     document_by_value,
     filter_projects,
     filter_publications,
@@ -186,7 +185,7 @@ class InternalHtmlBuilder(BuilderBase):
             ene = p.get("employment", []) + p.get("education", [])
             ene.sort(key=ene_date_key, reverse=True)
             for e in ene:
-                dereference_institution(e, self.gtx["institutions"])
+                self.institution_resolver().dereference(e)
             projs = filter_projects(all_docs_from_collection(rc.client, "projects"), names)
             self.render(
                 "person.html",
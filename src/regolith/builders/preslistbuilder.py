@@ -66,7 +66,13 @@ class PresListBuilder(LatexBuilderBase):
                     if member not in self.rc.people:
                         continue
                 presclean = filter_presentations(
-                    everybody, self.gtx["presentations"], self.gtx["institutions"], member, statuses=["accepted"]
+                    everybody,
+                    self.gtx["presentations"],
+                    self.gtx["institutions"],
+                    member,
+                    statuses=["accepted"],
+                    resolver=self.institution_resolver(),
+                    view=self.presentations_view(everybody),
                 )
 
                 if len(presclean) > 0:
@@ -4,7 +4,7 @@ from nameparser import HumanName
 
 from regolith.builders.basebuilder import LatexBuilderBase
 from regolith.fsclient import _id_key
-from regolith.tools import all_docs_from_collection, dereference_institution
+from regolith.tools import all_docs_from_collection
 
 
 class PropRevBuilder(LatexBuilderBase):
@@ -44,7 +44,7 @@ class PropRevBuilder(LatexBuilderBase):
             institution_docs = []
             for inst in rev["institutions"]:
                 instdoc = {"institution": inst}
-                dereference_institution(instdoc, self.gtx["institutions"])
+                self.institution_resolver().dereference(instdoc)
                 if not instdoc:
                     instdoc = {"institution": inst}
                 institution_docs.append(instdoc)
@@ -6,7 +6,7 @@ Copyright 2015-2016, the xonsh developers
 
 import itertools
 from collections import ChainMap
-from collections.abc import MutableMapping
+from collections.abc import ItemsView, Mapping, MutableMapping, ValuesView
 
 
 class ChainDBSingleton(object):
@@ -75,3 +75,70 @@ def _convert_to_dict(cm):
         return r
     else:
         return cm
+
+
+class _ChainedValues(ValuesView):
+    def __iter__(self):
+        for key in self._mapping:
+            yield self._mapping.chain(key)
+
+
+class _ChainedItems(ItemsView):
+    def __iter__(self):
+        for key in self._mapping:
+            yield key, self._mapping.chain(key)
+
+
+class ChainedCollection(Mapping):
+    """The chained documents of a collection from several databases, built
+    on access rather than up front.
+
+    This is what the dict of ChainDBs of a collection is when the collection
+    is loaded lazily, so that iterating over it does not hold every document
+    at once. Documents are chained in the order their collections were
+    added, as they are in a dict of ChainDBs.
+    """
+
+    def __init__(self, colls=()):
+        self.colls = list(colls)
+
+    def add(self, coll):
+        """Chains the collection of one more database."""
+        self.colls.append(coll)
+
+    def chain(self, key, keep=False):
+        """Returns the ChainDB of the documents with a key, decoding lazily
+        loaded documents without keeping them unless keep is true."""
+        res = None
+        for coll in self.colls:
+            if key not in coll:
+                continue
+            doc = coll[key] if keep or not hasattr(coll, "peek") else coll.peek(key)
+            if res is None:
+                res = ChainDB(doc)
+            else:
+                res.maps.append(doc)
+        if res is None:
+            raise KeyError(key)
+        return res
+
+    def __getitem__(self, key):
+        return self.chain(key, keep=True)
+
+    def __contains__(self, key):
+        return any(key in coll for coll in self.colls)
+
+    def __iter__(self):
+        for i, coll in enumerate(self.colls):
+            for key in coll:
+                if not any(key in c for c in self.colls[:i]):
+                    yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def values(self):
+        return _ChainedValues(self)
+
+    def items(self):
+        return _ChainedItems(self)
@@ -1,15 +1,106 @@
+import sys
+import time
 from collections import defaultdict
+from contextlib import contextmanager
 from copy import deepcopy
 
-from regolith.fsclient import FileSystemClient
-from regolith.mongoclient import MongoClient
+from regolith.chained_db import ChainDB, ChainedCollection
+from regolith.fragmentindex import FragmentIndex
+from regolith.references import REFERENCES, ReferenceIndex
+from regolith.registry import LazyRegistry
+from regolith.tools import doc_matches, fuzzy_retrieval
 
-CLIENTS = {
-    "mongo": MongoClient,
-    "mongodb": MongoClient,
-    "fs": FileSystemClient,
-    "filesystem": FileSystemClient,
-}
+# backends are imported only when a database uses them, see LazyRegistry
+CLIENTS = LazyRegistry(
+    {
+        "mongo": "regolith.mongoclient:MongoClient",
+        "mongodb": "regolith.mongoclient:MongoClient",
+        "fs": "regolith.fsclient:FileSystemClient",
+        "filesystem": "regolith.fsclient:FileSystemClient",
+        "sqlite": "regolith.sqliteclient:SQLiteClient",
+    }
+)
+
+
+def _peek(coll, _id):
+    """Gets a document of a collection without marking it as changed, or None."""
+    try:
+        return coll.peek(_id) if hasattr(coll, "peek") else coll.get(_id)
+    except KeyError:
+        return None
+
+
+def _project(doc, fields):
+    """Copies a document, keeping only the given fields and the _id."""
+    if fields is None:
+        return deepcopy(doc)
+    return deepcopy({k: doc[k] for k in ["_id"] + list(fields) if k in doc})
+
+
+class WriteBatch(object):
+    """A unit of work, the writes queued on a client manager inside of a
+    ``with client.batch():`` block.
+
+    The writes are flushed when the block exits, one bulk write per
+    collection, and are dropped if the block raises. The queued writes are
+    not visible to reads until they are flushed.
+
+    Attributes
+    ----------
+    ops : list of tuple
+        The queued writes, as ``(dbname, collname, op)`` where op is
+        ``("insert", doc)``, ``("delete", doc)`` or
+        ``("update", filter, update, kwargs)``.
+    reports : list of dict
+        For each collection flushed, the number of writes of each kind and the
+        time the flush took.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.ops = []
+        self.reports = []
+
+    def queue(self, dbname, collname, op):
+        self.ops.append((dbname, collname, op))
+
+    def flush(self):
+        """Writes the queued writes, restoring the in-memory collections, and
+        dropping what was journaled of the writes, if any of them fail."""
+        groups = {}
+        for dbname, collname, op in self.ops:
+            groups.setdefault((dbname, collname), []).append(op)
+        self.ops = []
+        snapshots = self.manager._snapshot(groups)
+        journals = [
+            (client, dbname, collname, client.journal_length(dbname, collname))
+            for dbname, collname in groups
+            for client in self.manager.clients
+            if hasattr(client, "journal_length")
+        ]
+        try:
+            for (dbname, collname), ops in groups.items():
+                start = time.perf_counter()
+                counts = self.manager._bulk_write(dbname, collname, ops)
+                report = dict(db=dbname, collection=collname, writes=len(ops), seconds=time.perf_counter() - start)
+                report.update(counts)
+                self.reports.append(report)
+                print(
+                    "flushed {writes} writes to {db}/{collection} ({inserted} inserted, {updated} updated, "
+                    "{deleted} deleted) in {seconds:.3f} s".format(**report),
+                    file=sys.stderr,
+                )
+        except Exception:
+            for client, dbname, collname, snapshot in snapshots:
+                coll = client.dbs[dbname][collname]
+                coll.clear()
+                coll.update(snapshot)
+                if hasattr(client, "drop_indexes"):
+                    client.drop_indexes(dbname, collname)
+            # nor are the writes that were rolled back journaled
+            for client, dbname, collname, length in journals:
+                client.truncate_journal(dbname, collname, length)
+            raise
 
 
 class ClientManager:
@@ -35,6 +126,11 @@ class ClientManager:
         self.rc = rc
         self.closed = True
         self.chained_db = None
+        # the seconds each database took to fetch and load, see open_dbs
+        self.load_timings = []
+        self.fragment_indexes = {}
+        self._reference_index = None
+        self._batch = None
         # self.open()
         self._collfiletypes = {}
         self._collexts = {}
@@ -71,12 +167,12 @@ class ClientManager:
 
     def import_database(self, db: dict):
         for client in self.clients:
-            if isinstance(client, MongoClient):
+            if isinstance(client, CLIENTS["mongo"]):
                 client.import_database(db)
 
     def export_database(self, db: dict):
         for client in self.clients:
-            if isinstance(client, MongoClient):
+            if isinstance(client, CLIENTS["mongo"]):
                 client.export_database(db)
 
     def dump_database(self, db):
@@ -102,26 +198,226 @@ class ClientManager:
             if dbname in client.keys():
                 return client.collection_names(dbname)
 
+    def _deferring(self, collname):
+        """Yields the clients and database names that have not loaded a collection."""
+        for client in self.clients:
+            for dbname, collnames in getattr(client, "deferred", {}).items():
+                if collname in collnames:
+                    yield client, dbname
+
+    def load_deferred(self, collname):
+        """Loads a collection from the databases that deferred it and chains
+        it, in the order of the databases, see the ``preload`` helper attribute."""
+        deferring = list(self._deferring(collname))
+        if len(deferring) == 0:
+            return
+        for client, dbname in deferring:
+            client.load_collection(dbname, collname)
+        chained = {}
+        dbs = self.dbs
+        for db in self.rc.databases:
+            for k, v in dbs[db["name"]].get(collname, {}).items():
+                if k in chained:
+                    chained[k].maps.append(v)
+                else:
+                    chained[k] = ChainDB(v)
+        self.chained_db[collname] = chained
+        self._written(collname)
+
+    def _load_unqueryable(self, collname):
+        """Loads a deferred collection if any of the clients deferring it
+        cannot query it in place, as with sparse git checkouts."""
+        if any(not hasattr(client, "find") for client, _ in self._deferring(collname)):
+            self.load_deferred(collname)
+
+    def find(self, collname, filter=None, fields=None, case_sensitive=True):
+        """Finds the documents of a collection where every field in filter has
+        the given value (or, for lists, contains it).
+
+        Collections that were not preloaded are queried on the server, so
+        only the matching documents, and only the requested fields of them,
+        are ever transferred.
+
+        Parameters
+        ----------
+        collname : str
+            The name of the collection.
+        filter : dict, optional
+            Maps fields to the values they must have.
+        fields : list of str, optional
+            Only return these fields (and the _id) of the documents.
+        case_sensitive : bool, optional
+            When false, strings are compared ignoring case, defaults to True.
+
+        Returns
+        -------
+        docs : list of dict
+            Copies of the matching documents.
+        """
+        filter = filter or {}
+        self._load_unqueryable(collname)
+        matched = {}
+        for doc in self.chained_db.get(collname, {}).values():
+            if doc_matches(doc, filter, case_sensitive=case_sensitive):
+                matched[doc["_id"]] = doc
+        deferring = list(self._deferring(collname))
+        if len(deferring) == 0:
+            return [_project(doc, fields) for doc in matched.values()]
+        # the matches of each database that was not preloaded, by _id
+        queried = {}
+        for client, dbname in deferring:
+            docs = client.find(dbname, collname, filter, fields=fields, case_sensitive=case_sensitive)
+            queried[dbname] = {doc["_id"]: doc for doc in docs}
+            matched.update((doc["_id"], None) for doc in docs if doc["_id"] not in matched)
+        # a document that matched in one database is chained with its copies
+        # in the others, in the order of the databases, as in the chained db
+        for client, dbname in deferring:
+            missing = [_id for _id in matched if _id not in queried[dbname]]
+            if missing:
+                for doc in client.find(dbname, collname, {"_id": {"$in": missing}}, fields=fields):
+                    queried[dbname][doc["_id"]] = doc
+        dbs = self.dbs
+        found = []
+        for _id in matched:
+            chain = None
+            for db in self.rc.databases:
+                if db["name"] in queried:
+                    doc = queried[db["name"]].get(_id)
+                else:
+                    doc = _peek(dbs[db["name"]].get(collname, {}), _id)
+                if doc is None:
+                    continue
+                if chain is None:
+                    chain = ChainDB(doc)
+                else:
+                    chain.maps.append(doc)
+            found.append(_project(chain, fields))
+        return found
+
+    def lookup(self, collname, value, sources=("_id", "name", "aka"), fields=None):
+        """Finds the document of a collection where any of the sources fields
+        is value, ignoring case, like fuzzy_retrieval.
+
+        Returns a copy of the document, or None if there is no such document.
+        """
+        self._load_unqueryable(collname)
+        doc = fuzzy_retrieval(self.chained_db.get(collname, {}).values(), sources, value, case_sensitive=False)
+        if doc is not None:
+            return _project(doc, fields)
+        for client, dbname in self._deferring(collname):
+            doc = client.lookup(dbname, collname, value, sources=sources, fields=fields)
+            if doc is not None:
+                return doc
+        return None
+
     def all_documents(self, collname, copy=True):
         """Returns an iteratable over all documents in a collection."""
+        self.load_deferred(collname)
+        coll = self.chained_db.get(collname, {})
         if copy:
-            return deepcopy(self.chained_db.get(collname, {})).values()
-        return self.chained_db.get(collname, {}).values()
+            if isinstance(coll, ChainedCollection):
+                # copy one document at a time, rather than the whole collection
+                return (deepcopy(doc) for doc in coll.values())
+            return deepcopy(coll).values()
+        return coll.values()
+
+    def fragment_index(self, collname, docs):
+        """Returns a substring index over docs, the documents of a collection.
+
+        The index is kept for the rest of the session, so that repeated
+        searches, such as from helper_connect, do not rebuild it, and is
+        dropped whenever the collection is written to.
+        """
+        index = self.fragment_indexes.get(collname)
+        if index is None or not index.matches(docs):
+            index = self.fragment_indexes[collname] = FragmentIndex(docs)
+        else:
+            index.docs = list(docs)
+        return index
+
+    @contextmanager
+    def batch(self):
+        """Queues the writes made inside of the with block and flushes them
+        together when it exits, see WriteBatch. Nested batches join the
+        outermost one.
+
+        Examples
+        --------
+        >>> with rc.client.batch() as batch:
+        ...     for doc in docs:
+        ...         rc.client.update_one(dbname, collname, {"_id": doc["_id"]}, doc, upsert=True)
+        >>> batch.reports
+        """
+        if self._batch is not None:
+            yield self._batch
+            return
+        self._batch = WriteBatch(self)
+        try:
+            yield self._batch
+            self._batch.flush()
+        finally:
+            self._batch = None
+
+    def _snapshot(self, groups):
+        """Copies the in-memory collections that a flush will write to."""
+        snapshots = []
+        for dbname, collname in groups:
+            for client in self.clients:
+                dbs = getattr(client, "dbs", None)
+                if dbs is not None and dbname in dbs and collname in dbs[dbname]:
+                    snapshots.append((client, dbname, collname, dict(dbs[dbname][collname])))
+        return snapshots
+
+    def _bulk_write(self, dbname, collname, ops):
+        self._written(collname)
+        for client in self.clients:
+            if dbname in client.keys():
+                return client.bulk_write(dbname, collname, ops)
+        return {"inserted": 0, "updated": 0, "deleted": 0}
+
+    def reference_index(self):
+        """Returns the index from people to the documents that refer to them,
+        see ReferenceIndex, built on first use and dropped whenever one of
+        the indexed collections is written to."""
+        if self._reference_index is None:
+            self._reference_index = ReferenceIndex(
+                {collname: self.chained_db.get(collname, {}).values() for collname in REFERENCES}
+            )
+        return self._reference_index
+
+    def _written(self, collname):
+        """Drops the indexes that a write to a collection makes stale."""
+        self.fragment_indexes.pop(collname, None)
+        if collname in REFERENCES:
+            self._reference_index = None
 
     def insert_one(self, dbname, collname, doc):
         """Inserts one document to a database/collection."""
+        if self._batch is not None:
+            self._batch.queue(dbname, collname, ("insert", doc))
+            return
+        self._written(collname)
         for client in self.clients:
             if dbname in client.keys():
                 client.insert_one(dbname, collname, doc)
 
     def insert_many(self, dbname, collname, docs):
         """Inserts many documents into a database/collection."""
+        if self._batch is not None:
+            for doc in docs:
+                self._batch.queue(dbname, collname, ("insert", doc))
+            return
+        self._written(collname)
         for client in self.clients:
             if dbname in client.keys():
                 client.insert_many(dbname, collname, docs)
 
     def delete_one(self, dbname, collname, doc):
         """Removes a single document from a collection"""
+        if self._batch is not None:
+            self._batch.queue(dbname, collname, ("delete", doc))
+            return
+        self._written(collname)
         for client in self.clients:
             if dbname in client.keys():
                 client.delete_one(dbname, collname, doc)
@@ -134,6 +430,10 @@ class ClientManager:
 
     def update_one(self, dbname, collname, filter, update, **kwargs):
         """Updates one document."""
+        if self._batch is not None:
+            self._batch.queue(dbname, collname, ("update", filter, update, kwargs))
+            return
+        self._written(collname)
         for client in self.clients:
             if dbname in client.keys():
                 client.update_one(dbname, collname, filter, update, **kwargs)
@@ -4,21 +4,29 @@ import json
 import os
 import re
 import sys
+import time
 from copy import copy
 from pprint import pprint
 
 from regolith import storage
 from regolith.builder import BUILDERS, builder
 from regolith.deploy import deploy as dploy
-from regolith.emailer import emailer
 from regolith.helper import FAST_UPDATER_WHITELIST, HELPERS, UPDATER_HELPERS, helpr
 from regolith.runcontrol import RunControl
 from regolith.tools import string_types
 
-email = emailer
+
+def email(rc):
+    """Sends emails, see regolith.emailer"""
+    from regolith.emailer import emailer
+
+    emailer(rc)
+
 
 RE_AND = re.compile(r"\s+and\s+")
 RE_SPACE = re.compile(r"\s+")
+# the line an entry, string, comment or preamble of a .bib file starts on
+RE_BIB_START = re.compile(r"\s*@\w+\s*[{(]")
 
 INGEST_COLL_LU = {".bib": "citations"}
 
@@ -29,14 +37,25 @@ def add_cmd(rc):
     rc.client.insert_many(rc.db, rc.coll, docs)
 
 
-def _ingest_citations(rc):
-    import bibtexparser
+def iter_bib_chunks(f):
+    """Splits an open .bib file into chunks of text, one per entry (or
+    string, comment or preamble), so that they can be parsed one at a time."""
+    chunk = []
+    for line in f:
+        if RE_BIB_START.match(line) and len(chunk) != 0:
+            yield "".join(chunk)
+            chunk = []
+        chunk.append(line)
+    if len(chunk) != 0:
+        yield "".join(chunk)
+
+
+def iter_bib_entries(f):
+    """Parses an open .bib file entry by entry, yielding the _id and the
+    citation document of each entry."""
     from bibtexparser.bparser import BibTexParser
     from bibtexparser.customization import getnames
 
-    parser = BibTexParser()
-    parser.ignore_nonstandard_types = False
-
     def customizations(record):
         for n in ["author", "editor"]:
             if n in record:
@@ -48,17 +67,68 @@ def _ingest_citations(rc):
 
         return record
 
+    parser = BibTexParser()
+    parser.ignore_nonstandard_types = False
     parser.customization = customizations
+    # the parser keeps @string definitions between calls
+    parser.expect_multiple_parse = True
+    for chunk in iter_bib_chunks(f):
+        entries = parser.parse(chunk).entries
+        for bib in entries:
+            bibid = bib.pop("ID")
+            bib["entrytype"] = bib.pop("ENTRYTYPE")
+            if "author" in bib:
+                bib["author"] = [a.strip() for b in bib["author"] for a in RE_AND.split(b)]
+            if "title" in bib:
+                bib["title"] = RE_SPACE.sub(" ", bib["title"])
+            yield bibid, bib
+        del entries[:]
+
+
+def _ingest_citations(rc):
+    """Ingests a .bib file into a citations collection.
+
+    The entries are compared against the existing documents, looked up by
+    _id, and only the new and changed ones are written, in one batch.
+    """
+    start = time.perf_counter()
+    existing = dict(rc.client.dbs[rc.db].get(rc.coll, {}))
+    inserted, updated, unchanged = {}, {}, set()
+    nentries = 0
     with open(rc.filename, "r", encoding="utf-8") as f:
-        bibs = bibtexparser.load(f, parser=parser)
-    for bib in bibs.entries:
-        bibid = bib.pop("ID")
-        bib["entrytype"] = bib.pop("ENTRYTYPE")
-        if "author" in bib:
-            bib["author"] = [a.strip() for b in bib["author"] for a in RE_AND.split(b)]
-        if "title" in bib:
-            bib["title"] = RE_SPACE.sub(" ", bib["title"])
-        rc.client.update_one(rc.db, rc.coll, {"_id": bibid}, bib, upsert=True)
+        for bibid, bib in iter_bib_entries(f):
+            nentries += 1
+            doc = existing.get(bibid)
+            newdoc = dict({"_id": bibid} if doc is None else doc)
+            newdoc.update(bib)
+            if doc is not None and newdoc == doc:
+                if bibid not in inserted and bibid not in updated:
+                    unchanged.add(bibid)
+                continue
+            existing[bibid] = newdoc
+            unchanged.discard(bibid)
+            if bibid in inserted or (doc is None and bibid not in updated):
+                inserted[bibid] = newdoc
+            else:
+                updated.setdefault(bibid, {}).update(bib)
+    with rc.client.batch():
+        for doc in inserted.values():
+            rc.client.insert_one(rc.db, rc.coll, doc)
+        for bibid, bib in updated.items():
+            rc.client.update_one(rc.db, rc.coll, {"_id": bibid}, bib, upsert=True)
+    seconds = time.perf_counter() - start
+    print(
+        "ingested {0} entries from {1} in {2:.2f} s ({3:.0f} entries/s): "
+        "{4} inserted, {5} updated, {6} unchanged".format(
+            nentries,
+            rc.filename,
+            seconds,
+            nentries / seconds if seconds > 0 else 0,
+            len(inserted),
+            len(updated),
+            len(unchanged),
+        )
+    )
 
 
 def _determine_ingest_coll(rc):
@@ -132,6 +202,8 @@ def helper_db_check(rc):
     # only open the needed collections
     colls = set()
     bldr = HELPERS[rc.helper_target][0]
+    # helpers that query the database themselves can skip loading whole collections
+    rc.preload = getattr(bldr, "preload", True)
     needed_colls = getattr(bldr, "needed_colls", None)
     # If the requested builder doesn't state DB deps then it requires
     # all dbs!
@@ -222,6 +294,102 @@ def mongo_to_fs(rc: RunControl) -> None:
     return
 
 
+def compact(rc):
+    """Folds the operation journals of the databases back into their
+    collection files, which happens when they are dumped outside of journal
+    mode."""
+    for db in rc.databases:
+        db["journal_mode"] = False
+
+
+def bench(rc):
+    """Times regolith on synthetic databases, see regolith.bench"""
+    from regolith.bench import main
+
+    main(rc)
+
+
+def partition(rc):
+    """Splits a collection of each database into shards, or merges the shards
+    back into a single collection file, see regolith.partitions"""
+    import shutil
+
+    from regolith import fsclient, partitions
+    from regolith.tools import dbpathname
+
+    for db in rc.databases:
+        dbpath = dbpathname(db, rc)
+        path = os.path.join(dbpath, rc.coll)
+        journal = fsclient.journal_filename(dbpath, rc.coll)
+        if rc.merge:
+            if not partitions.is_partitioned(path):
+                continue
+            docs = partitions.merge_collection(path)
+            filename = os.path.join(dbpath, rc.coll + "." + rc.format)
+        else:
+            for ext in (".json", ".yaml", ".yml"):
+                filename = os.path.join(dbpath, rc.coll + ext)
+                if os.path.isfile(filename):
+                    break
+            else:
+                continue
+            docs = fsclient.load_json(filename) if ext == ".json" else fsclient.load_yaml(filename)
+        if os.path.exists(journal):
+            fsclient.replay_journal(journal, docs)
+        if rc.merge:
+            if rc.format == "json":
+                fsclient.dump_json(filename, docs, date_handler=fsclient.date_encoder)
+            else:
+                fsclient.dump_yaml(filename, docs)
+            shutil.rmtree(path)
+            print("merged {0} documents into {1}".format(len(docs), filename), file=sys.stderr)
+        else:
+            coll = partitions.split_collection(
+                docs, path, key=rc.shard_key, fmt=rc.format, hash_shards=rc.hash_shards
+            )
+            os.remove(filename)
+            print(
+                "split {0} documents into {1} shards in {2}".format(len(docs), len(coll.manifest["shards"]), path),
+                file=sys.stderr,
+            )
+        if os.path.exists(journal):
+            os.remove(journal)
+
+
+def fs_to_sqlite(rc: RunControl) -> None:
+    """Convert the collection files of each database into its SQLite file.
+
+    Parameters
+    ----------
+    rc : RunControl
+        The RunControl. The databases will be converted according to the 'databases' in it.
+    """
+    from regolith.sqliteclient import SQLiteClient
+
+    client = SQLiteClient(rc)
+    for db in getattr(rc, "databases"):
+        client.import_database(db)
+    client.close()
+    return
+
+
+def sqlite_to_fs(rc: RunControl) -> None:
+    """Export the SQLite file of each database into YAML collection files.
+
+    Parameters
+    ----------
+    rc : RunControl
+        The RunControl. The databases will be converted according to the 'databases' in it.
+    """
+    from regolith.sqliteclient import SQLiteClient
+
+    client = SQLiteClient(rc)
+    for db in getattr(rc, "databases"):
+        client.export_database(db)
+    client.close()
+    return
+
+
 def validate(rc):
     """Validate the combined database against the schemas"""
     from regolith.schemas import validate
@@ -258,12 +426,37 @@ def validate(rc):
         # sys.exit(f"Validation failed on some records")
 
 
+def snapshot(rc):
+    """Writes the chained databases to a snapshot that is loaded in their
+    place while they are unchanged, see regolith.snapshot"""
+    from regolith.database import open_dbs
+    from regolith.snapshot import write_snapshot
+
+    start = time.perf_counter()
+    client = open_dbs(rc, snapshot=False)
+    try:
+        filename = write_snapshot(client, rc)
+    finally:
+        client.close()
+    print(
+        "wrote a snapshot of {0} collections to {1} in {2:.2f} s".format(
+            len(client.chained_db), filename, time.perf_counter() - start
+        ),
+        file=sys.stderr,
+    )
+
+
 DISCONNECTED_COMMANDS = {
     "rc": lambda rc: print(rc._pformat()),
     "deploy": deploy,
     "store": storage.main,
     "json-to-yaml": json_to_yaml,
     "yaml-to-json": yaml_to_json,
+    "fs-to-sqlite": fs_to_sqlite,
+    "sqlite-to-fs": sqlite_to_fs,
+    "bench": bench,
+    "partition": partition,
+    "snapshot": snapshot,
 }
 
 CONNECTED_COMMANDS = {
@@ -272,6 +465,7 @@ CONNECTED_COMMANDS = {
     "app": app,
     "grade": grade,
     "build": build,
+    "compact": compact,
     "email": email,
     "classlist": classlist,
     "validate": validate,
@@ -1,8 +1,10 @@
 """Helps deploy what we have built."""
 
+import hashlib
 import os
+import shutil
+import sys
 import time
-from distutils.dir_util import copy_tree
 from warnings import warn
 
 from xonsh.api import subprocess
@@ -21,7 +23,103 @@ def ensure_deploy_dir(rc):
         os.makedirs(rc.deploydir, exist_ok=True)
 
 
-def deploy_git(rc, name, url, src="html", dst=None):
+VCS_DIRS = frozenset([".git", ".hg"])
+HASH_BLOCKSIZE = 1 << 16
+
+
+def file_digest(filename):
+    """Returns the sha1 hex digest of a file's contents."""
+    h = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCKSIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _walk_files(topdir):
+    """Yields the paths, relative to topdir, of all the files under topdir,
+    skipping version control metadata directories."""
+    for root, dirs, files in os.walk(topdir):
+        dirs[:] = [d for d in dirs if d not in VCS_DIRS]
+        for f in files:
+            yield os.path.relpath(os.path.join(root, f), topdir)
+
+
+def _same_content(src, dst):
+    """Checks whether two files have the same content, comparing sizes before
+    hashing so that most changed files are found without being read."""
+    if os.path.getsize(src) != os.path.getsize(dst):
+        return False
+    return file_digest(src) == file_digest(dst)
+
+
+def sync_tree(srcdir, dstdir, delete=False):
+    """Makes dstdir mirror srcdir, only touching the files whose contents differ.
+
+    Parameters
+    ----------
+    srcdir : str
+        The directory to copy from.
+    dstdir : str
+        The directory to copy to. Version control metadata directories
+        inside of it are never touched.
+    delete : bool, optional
+        Whether files in dstdir that are not in srcdir should be removed,
+        defaults to False.
+
+    Returns
+    -------
+    copied : list of str
+        The paths, relative to dstdir, of the files that were written.
+    removed : list of str
+        The paths, relative to dstdir, of the files that were deleted.
+    nbytes : int
+        The number of bytes copied.
+    """
+    srcfiles = set(_walk_files(srcdir))
+    dstfiles = set(_walk_files(dstdir)) if os.path.isdir(dstdir) else set()
+    copied, removed, nbytes = [], [], 0
+    for relpath in sorted(srcfiles):
+        src = os.path.join(srcdir, relpath)
+        dst = os.path.join(dstdir, relpath)
+        if relpath in dstfiles and _same_content(src, dst):
+            continue
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copy2(src, dst)
+        copied.append(relpath)
+        nbytes += os.path.getsize(dst)
+    if delete:
+        for relpath in sorted(dstfiles - srcfiles):
+            os.remove(os.path.join(dstdir, relpath))
+            removed.append(relpath)
+    return copied, removed, nbytes
+
+
+def print_manifest(copied, removed, nbytes, file=None):
+    """Prints what a deploy sync transferred."""
+    file = sys.stdout if file is None else file
+    for relpath in copied:
+        print("copied " + relpath, file=file)
+    for relpath in removed:
+        print("removed " + relpath, file=file)
+    print(
+        "deploy sync: {0} file(s) copied, {1} file(s) removed, {2} bytes "
+        "transferred".format(len(copied), len(removed), nbytes),
+        file=file,
+    )
+
+
+def _sync_build(rc, targetdir, src, dst, delete):
+    """Syncs the build dir into the deploy checkout, returns whether anything
+    changed and the synced directory relative to the checkout."""
+    srcdir = os.path.join(rc.builddir, src)
+    dstdir = os.path.join(targetdir, dst) if dst else targetdir
+    copied, removed, nbytes = sync_tree(srcdir, dstdir, delete=delete)
+    print_manifest(copied, removed, nbytes)
+    return len(copied) + len(removed) > 0, os.path.relpath(dstdir, targetdir)
+
+
+def deploy_git(rc, name, url, src="html", dst=None, delete=False):
     """Loads a git database"""
     targetdir = os.path.join(rc.deploydir, name)
     # get or update the database
@@ -32,12 +130,12 @@ def deploy_git(rc, name, url, src="html", dst=None):
         cmd = ["git", "clone", url, targetdir]
         cwd = None
     subprocess.check_call(cmd, cwd=cwd)
-    # copy the files over
-    srcdir = os.path.join(rc.builddir, src)
-    dstdir = os.path.join(targetdir, dst) if dst else targetdir
-    copy_tree(srcdir, dstdir, verbose=1)
-    # commit everything
-    cmd = ["git", "add", "."]
+    # copy the changed files over
+    changed, dstpath = _sync_build(rc, targetdir, src, dst, delete)
+    if not changed:
+        return
+    # stage what changed under dst, deletions included
+    cmd = ["git", "add", "--all", "--", dstpath]
     subprocess.check_call(cmd, cwd=targetdir)
     # commit
     cmd = [
@@ -60,7 +158,7 @@ def deploy_git(rc, name, url, src="html", dst=None):
         return
 
 
-def deploy_hg(rc, name, url, src="html", dst=None):
+def deploy_hg(rc, name, url, src="html", dst=None, delete=False):
     """Loads an hg database"""
     if hglib is None:
         raise ImportError("hglib")
@@ -73,24 +171,25 @@ def deploy_hg(rc, name, url, src="html", dst=None):
         # Strip off hg+
         hglib.clone(url[3:], targetdir)
         client = hglib.open(targetdir)
-    # copy the files over
-    srcdir = os.path.join(rc.builddir, src)
-    dstdir = os.path.join(targetdir, dst) if dst else targetdir
-    copy_tree(srcdir, dstdir, verbose=1)
-    # commit everything
+    # copy the changed files over
+    changed, dstpath = _sync_build(rc, targetdir, src, dst, delete)
+    if not changed:
+        return
+    # commit what changed under dst
     client.commit(
         message="regolith auto-deploy at {0}".format(time.time()),
+        include=[os.path.join(targetdir, dstpath)],
         addremove=True,
     )
     client.push()
 
 
-def deploy(rc, name, url, src="html", dst=None):
+def deploy(rc, name, url, src="html", dst=None, delete=False):
     """Deploys a target"""
     ensure_deploy_dir(rc)
     if url.startswith("git") or url.endswith(".git"):
-        deploy_git(rc, name, url, src=src, dst=dst)
+        deploy_git(rc, name, url, src=src, dst=dst, delete=delete)
     elif url.startswith("hg+"):
-        deploy_hg(rc, name, url, src=src, dst=dst)
+        deploy_hg(rc, name, url, src=src, dst=dst, delete=delete)
     else:
         raise ValueError("Do not know how to deploy to this kind of URL: " + url)
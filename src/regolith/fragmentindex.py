@@ -0,0 +1,94 @@
+"""An inverted trigram index for substring searches over collections."""
+
+from regolith.tools import doc_has_fragment, fragment_strings
+
+NGRAM = 3
+
+
+def ngrams(s, n=NGRAM):
+    """Returns the set of n-grams of a string."""
+    return {s[i : i + n] for i in range(len(s) - n + 1)}
+
+
+class FragmentIndex(object):
+    """Answers case-insensitive substring queries on the fields of a list of
+    documents, the same queries as ``fragment_retrieval``, without scanning
+    every document.
+
+    For every field that is queried, an index from each trigram of the
+    lower-cased strings in that field to the positions of the documents
+    containing it is built on first use. A query intersects the postings of
+    the trigrams of the fragment and then verifies the remaining candidates
+    against the documents themselves, so the results are always exactly those
+    of ``fragment_retrieval``.
+
+    Parameters
+    ----------
+    docs : list of dict
+        The documents to index.
+    """
+
+    def __init__(self, docs):
+        self.docs = list(docs)
+        self._fields = {}
+
+    def _field_index(self, field):
+        if field not in self._fields:
+            postings, present = {}, set()
+            for i, doc in enumerate(self.docs):
+                for s in fragment_strings(doc, [field]):
+                    if not isinstance(s, str):
+                        continue
+                    present.add(i)
+                    for gram in ngrams(s.lower()):
+                        postings.setdefault(gram, set()).add(i)
+            self._fields[field] = (postings, present)
+        return self._fields[field]
+
+    def candidates(self, field, fragment):
+        """Returns the positions of the documents whose field may contain
+        the fragment."""
+        postings, present = self._field_index(field)
+        grams = ngrams(fragment.lower())
+        if len(grams) == 0:
+            return set(present)
+        # intersect starting from the rarest trigram
+        lists = sorted((postings.get(gram, set()) for gram in grams), key=len)
+        return set(lists[0]).intersection(*lists[1:])
+
+    def search(self, fields, fragment, case_sensitive=False, within=None):
+        """Finds the documents where the fragment appears in any one of the
+        given fields.
+
+        Parameters
+        ----------
+        fields : iterable
+            The fields of each document to check for the fragment.
+        fragment : str
+            The substring to look for.
+        case_sensitive : bool, optional
+            When true will match case, defaults to False.
+        within : set of int, optional
+            Only consider the documents at these positions.
+
+        Returns
+        -------
+        positions : set of int
+            The positions in ``docs`` of the matching documents.
+        """
+        if not isinstance(fragment, str):
+            positions = set(range(len(self.docs)))
+        else:
+            positions = set()
+            for field in fields:
+                positions |= self.candidates(field, fragment)
+        if within is not None:
+            positions &= within
+        return {
+            i for i in positions if doc_has_fragment(self.docs[i], fields, fragment, case_sensitive=case_sensitive)
+        }
+
+    def matches(self, docs):
+        """Whether docs are, in order, the documents this index was built on
+        (or copies of them)."""
+        return len(docs) == len(self.docs) and all(a.get("_id") == b.get("_id") for a, b in zip(docs, self.docs))
@@ -1,20 +1,36 @@
 """Contains a client database backed by the file system."""
 
+import bz2
 import datetime
+import gzip
+import io
 import json
 import logging
+import lzma
 import os
+import pickle
 import signal
 import sys
 from collections import defaultdict
+from collections.abc import Mapping
 from copy import deepcopy
 from glob import iglob
+from warnings import warn
 
 import ruamel.yaml
 from ruamel.yaml import YAML
 from ruamel.yaml.comments import CommentedMap, CommentedSeq
 
-from regolith.tools import dbpathname
+from regolith.chained_db import ChainedCollection
+from regolith.lazyjson import LazyJSONCollection
+from regolith.partitions import MANIFEST, PartitionedCollection, is_partitioned
+from regolith.tools import dbdirname, dbpathname
+from regolith.vcs import GitRepo
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 
 class DelayedKeyboardInterrupt:
@@ -55,14 +71,71 @@ def _id_key(doc):
     return doc["_id"]
 
 
-def load_json(filename):
-    """Loads a JSON file and returns a dict of its documents."""
+# the extensions of compressed collection files, "citations.json.gz"
+CODECS = (".gz", ".bz2", ".xz", ".zst")
+
+
+def split_codec(filename):
+    """Splits the compression extension, if any, off of a file name, so that
+    "citations.yaml.gz" gives ("citations.yaml", ".gz") and "citations.yaml"
+    gives ("citations.yaml", "")."""
+    base, ext = os.path.splitext(filename)
+    if ext in CODECS:
+        return base, ext
+    return filename, ""
+
+
+def open_collection(filename, mode="r", fileobj=None):
+    """Opens a collection file as text, for reading ("r") or writing ("w"),
+    compressing or decompressing it as it is streamed if its extension is one
+    of CODECS. If fileobj, a binary file object, is given, the collection is
+    read from or written to it, and filename only gives its compression."""
+    codec = split_codec(filename)[1]
+    if codec == "":
+        if fileobj is not None:
+            return io.TextIOWrapper(fileobj, encoding="utf-8")
+        return open(filename, mode, encoding="utf-8")
+    if codec == ".gz":
+        # without a timestamp, dumping the same documents gives the same bytes
+        raw = gzip.GzipFile(filename, mode + "b", mtime=0, fileobj=fileobj)
+    elif codec == ".bz2":
+        raw = bz2.BZ2File(fileobj or filename, mode + "b")
+    elif codec == ".xz":
+        raw = lzma.LZMAFile(fileobj or filename, mode + "b")
+    else:
+        if zstandard is None:
+            raise RuntimeError("the zstandard package is needed to read and write " + filename)
+        return zstandard.open(fileobj or filename, mode, encoding="utf-8")
+    return io.TextIOWrapper(raw, encoding="utf-8")
+
+
+def collection_codec(db, rc, collname):
+    """The compression extension a collection is configured to be dumped
+    with, in the 'compression' rc or database key, "" for none, or None if it
+    is not configured, in which case it keeps the one it was loaded with."""
+    codecs = db.get("compression", getattr(rc, "compression", None)) or {}
+    if collname not in codecs:
+        return None
+    codec = codecs[collname] or ""
+    if codec and not codec.startswith("."):
+        codec = "." + codec
+    if codec and codec not in CODECS:
+        raise ValueError(
+            "unknown compression {0!r} for {1}, pick from {2}".format(
+                codecs[collname], collname, ", ".join(CODECS)
+            )
+        )
+    return codec
+
+
+def load_json(filename, fileobj=None):
+    """Loads a JSON file, which may be compressed, and returns a dict of its
+    documents. See open_collection for fileobj."""
     docs = {}
-    with open(filename, encoding="utf-8") as fh:
-        lines = fh.readlines()
-    for line in lines:
-        doc = json.loads(line)
-        docs[doc["_id"]] = doc
+    with open_collection(filename, fileobj=fileobj) as fh:
+        for line in fh:
+            doc = json.loads(line)
+            docs[doc["_id"]] = doc
     return docs
 
 
@@ -76,17 +149,18 @@ def dump_json(filename, docs, date_handler=None):
     docs = sorted(docs.values(), key=_id_key)
     lines = [json.dumps(doc, sort_keys=True, default=date_handler) for doc in docs]
     s = "\n".join(lines)
-    with open(filename, "w", encoding="utf-8") as fh:
+    with open_collection(filename, "w") as fh:
         fh.write(s)
 
 
-def load_yaml(filename, return_inst=False, loader=None):
-    """Loads a YAML file and returns a dict of its documents."""
+def load_yaml(filename, return_inst=False, loader=None, fileobj=None):
+    """Loads a YAML file and returns a dict of its documents. See
+    open_collection for fileobj."""
     if loader is None:
         inst = YAML()
     else:
         inst = loader
-    with open(filename, encoding="utf-8") as fh:
+    with open_collection(filename, fileobj=fileobj) as fh:
         docs = inst.load(fh)
         docs = _rec_re_type(docs)
     for _id, doc in docs.items():
@@ -106,11 +180,138 @@ def dump_yaml(filename, docs, inst=None):
         sorted_dict[k] = ruamel.yaml.comments.CommentedMap()
         for kk in sorted(doc.keys()):
             sorted_dict[k][kk] = doc[kk]
-    with open(filename, "w", encoding="utf-8") as fh:
+    with open_collection(filename, "w") as fh:
         with DelayedKeyboardInterrupt():
             inst.dump(sorted_dict, stream=fh)
 
 
+def _encode_default(obj):
+    if isinstance(obj, datetime.datetime):
+        return {"$datetime": obj.isoformat()}
+    if isinstance(obj, datetime.date):
+        return {"$date": obj.isoformat()}
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError("Object of type {0} is not JSON serializable".format(type(obj).__name__))
+
+
+def _decode_hook(obj):
+    if len(obj) == 1:
+        if "$date" in obj:
+            return datetime.date.fromisoformat(obj["$date"])
+        if "$datetime" in obj:
+            return datetime.datetime.fromisoformat(obj["$datetime"])
+    return obj
+
+
+def encode_doc(doc):
+    """Encodes a document as JSON, tagging dates so they survive the round trip."""
+    return json.dumps(doc, sort_keys=True, default=_encode_default)
+
+
+def decode_doc(s):
+    """Decodes a document encoded with encode_doc."""
+    return json.loads(s, object_hook=_decode_hook)
+
+
+JOURNAL_EXT = ".journal.jsonl"
+
+# the size, in bytes, past which a journal is folded back into its collection file
+JOURNAL_MAX_BYTES = 1 << 20
+
+
+def journal_filename(dbpath, collname):
+    """Gets the path to the operation journal of a collection."""
+    return os.path.join(dbpath, collname + JOURNAL_EXT)
+
+
+def journal_enabled(db, rc):
+    """Whether writes to a database are appended to operation journals
+    rather than rewriting its collection files."""
+    return db.get("journal_mode", getattr(rc, "journal_mode", False))
+
+
+def journal_max_bytes(db, rc):
+    """The size past which the journal of a collection is compacted."""
+    return db.get("journal_max_bytes", getattr(rc, "journal_max_bytes", JOURNAL_MAX_BYTES))
+
+
+def lazy_json_enabled(db, rc):
+    """Whether the JSON collection files of a database are memory-mapped and
+    decoded lazily, see LazyJSONCollection."""
+    return db.get("lazy_json", getattr(rc, "lazy_json", False))
+
+
+def db_revision(db, rc):
+    """The git revision a database is read at, rather than its working tree,
+    or None, see FileSystemClient.load_revision."""
+    return db.get("db_revision", getattr(rc, "db_revision", None))
+
+
+def sparse_checkout_enabled(db, rc):
+    """Whether a git database is cloned without its files, and only the
+    files of the collections that are needed are checked out."""
+    return db.get("sparse_checkout", getattr(rc, "sparse_checkout", False))
+
+
+def sparse_patterns(db, collnames):
+    """Returns the sparse-checkout patterns for the files of collections of a
+    database, or for every file if collnames is empty."""
+    path = db.get("path", "").strip("/")
+    prefix = "/" if path in ("", ".") else "/" + path + "/"
+    if len(collnames) == 0:
+        return [prefix + "*"]
+    patterns = []
+    for collname in sorted(collnames):
+        # the collection file, compressed or not, its journal, and the
+        # directory of a partitioned collection
+        patterns += [prefix + collname + ".*", prefix + collname + "/"]
+    return patterns
+
+
+def append_journal(filename, records):
+    """Appends encoded operation records to a journal, one per line."""
+    with open(filename, "a+b") as fh:
+        # start on a line of its own, even after an append that was cut short
+        if fh.tell() > 0:
+            fh.seek(fh.tell() - 1)
+            if fh.read(1) != b"\n":
+                records = [""] + list(records)
+        with DelayedKeyboardInterrupt():
+            fh.write("".join(record + "\n" for record in records).encode("utf-8"))
+            fh.flush()
+            os.fsync(fh.fileno())
+
+
+def replay_journal(filename, docs, fileobj=None):
+    """Applies the operations in a journal, in order, to a dict of documents.
+
+    A line that was cut short, by a crash part way through an append, is
+    skipped with a warning. See open_collection for fileobj.
+    """
+    with open_collection(filename, fileobj=fileobj) as fh:
+        lines = fh.readlines()
+    for i, line in enumerate(lines):
+        try:
+            record = decode_doc(line)
+        except ValueError:
+            warn("skipping the incomplete operation on line {0} of {1}".format(i + 1, filename), RuntimeWarning)
+            continue
+        if record["op"] == "insert":
+            docs[record["doc"]["_id"]] = record["doc"]
+        elif record["op"] == "update":
+            doc = dict(docs.get(record["_id"], {"_id": record["_id"]}))
+            doc.update(record["set"])
+            docs[record["_id"]] = doc
+        elif record["op"] == "delete":
+            docs.pop(record["_id"], None)
+        else:
+            raise ValueError("unknown operation {0!r} in {1}".format(record["op"], filename))
+    return docs
+
+
 def json_to_yaml(inp, out):
     """Converts a JSON file to a YAML one."""
     docs = load_json(inp)
@@ -123,6 +324,42 @@ def yaml_to_json(inp, out, loader=None):
     dump_json(out, docs)
 
 
+def declared_indexes(rc):
+    """Returns the secondary indexes declared in the 'indexes' rc key, a list
+    of "collection.field" strings, as a dict from collection to fields."""
+    indexes = defaultdict(set)
+    for spec in getattr(rc, "indexes", None) or ():
+        collname, _, field = spec.partition(".")
+        indexes[collname].add(field)
+    return indexes
+
+
+def _whitelisted(db, name):
+    """Whether a file of a database is loaded, by its name, according to the
+    white- and blacklists of the database."""
+    return (
+        name not in db.get("blacklist", [])
+        and len(db.get("whitelist") or []) == 0
+        or name.split(".")[0] in (db.get("whitelist") or [])
+    )
+
+
+def _matches(doc, filter):
+    """Whether every field in filter has the given value in doc."""
+    for key, value in filter.items():
+        if key not in doc or doc[key] != value:
+            return False
+    return True
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
 class FileSystemClient:
     """A client database backed by the file system."""
 
@@ -132,9 +369,26 @@ class FileSystemClient:
         self.dbs = None
         self.chained_db = None
         self.open()
+        # the file type, extension and compression extension ("" for none)
+        # of each collection, by database path and collection name, as
+        # databases may hold the same collection in different files
         self._collfiletypes = {}
         self._collexts = {}
+        self._collcodecs = {}
         self._yamlinsts = {}
+        self.declared_indexes = declared_indexes(rc)
+        # (dbname, collname, field) -> value -> ids of the documents with that value,
+        # and -> _id -> the value the document is indexed under
+        self._indexes = {}
+        self._indexed_values = {}
+        # the names of the databases in journal mode, and the operations on
+        # their collections, encoded, since they were loaded or last dumped
+        self._journaling = set()
+        self._journals = defaultdict(list)
+        # the collections of sparse git databases that are not checked out,
+        # by database name, see load_collection
+        self.deferred = defaultdict(set)
+        self._sparse_dbs = {}
 
     def is_alive(self):
         return not self.closed
@@ -145,81 +399,276 @@ class FileSystemClient:
             self.chained_db = {}
             self.closed = False
 
-    def load_json(self, db, dbpath):
-        """Loads the JSON part of a database."""
-        dbs = self.dbs
-        for f in [
+    def _collection_files(self, db, dbpath, pattern):
+        """Lists the collection files of a database matching a pattern, and
+        their compressed counterparts, that are not black- or whitelisted
+        out."""
+        files = list(iglob(os.path.join(dbpath, pattern)))
+        for codec in CODECS:
+            files.extend(iglob(os.path.join(dbpath, pattern + codec)))
+        return [
             file
-            for file in iglob(os.path.join(dbpath, "*.json"))
+            for file in files
             if file not in db["blacklist"]
             and len(db["whitelist"]) == 0
             or os.path.basename(file).split(".")[0] in db["whitelist"]
-        ]:
-            collfilename = os.path.split(f)[-1]
+        ]
+
+    def load_json(self, db, dbpath):
+        """Loads the JSON part of a database."""
+        dbs = self.dbs
+        for f in self._collection_files(db, dbpath, "*.json"):
+            collfilename, codec = split_codec(os.path.split(f)[-1])
             base, ext = os.path.splitext(collfilename)
-            self._collfiletypes[base] = "json"
+            self._collfiletypes[dbpath, base] = "json"
+            self._collcodecs[dbpath, base] = codec
             print("loading " + f + "...", file=sys.stderr)
-            dbs[db["name"]][base] = load_json(f)
+            if lazy_json_enabled(db, self.rc) and codec == "":
+                dbs[db["name"]][base] = LazyJSONCollection(f)
+            else:
+                dbs[db["name"]][base] = load_json(f)
+            self._replay(dbpath, base, dbs[db["name"]][base])
 
     def load_yaml(self, db, dbpath):
         """Loads the YAML part of a database."""
         dbs = self.dbs
-        for f in [
-            file
-            for file in iglob(os.path.join(dbpath, "*.y*ml"))
-            if file not in db["blacklist"]
-            and len(db["whitelist"]) == 0
-            or os.path.basename(file).split(".")[0] in db["whitelist"]
-        ]:
-            collfilename = os.path.split(f)[-1]
+        for f in self._collection_files(db, dbpath, "*.y*ml"):
+            collfilename, codec = split_codec(os.path.split(f)[-1])
             base, ext = os.path.splitext(collfilename)
-            self._collexts[base] = ext
-            self._collfiletypes[base] = "yaml"
+            self._collexts[dbpath, base] = ext
+            self._collfiletypes[dbpath, base] = "yaml"
+            self._collcodecs[dbpath, base] = codec
             # print("loading " + f + "...", file=sys.stderr)
             coll, inst = load_yaml(f, return_inst=True)
             dbs[db["name"]][base] = coll
             self._yamlinsts[dbpath, base] = inst
+            self._replay(dbpath, base, coll)
+
+    def load_partitioned(self, db, dbpath):
+        """Loads the partitioned collections of a database, whose shards are
+        read when they are needed."""
+        dbs = self.dbs
+        for base in sorted(os.listdir(dbpath)):
+            path = os.path.join(dbpath, base)
+            if not is_partitioned(path) or path in db["blacklist"]:
+                continue
+            if len(db["whitelist"]) != 0 and base not in db["whitelist"]:
+                continue
+            self._collfiletypes[dbpath, base] = "partitioned"
+            dbs[db["name"]][base] = PartitionedCollection(path)
+            self._replay(dbpath, base, dbs[db["name"]][base])
+
+    def _replay(self, dbpath, collname, coll):
+        """Applies the journal of a collection, if it has one."""
+        filename = journal_filename(dbpath, collname)
+        if os.path.exists(filename):
+            replay_journal(filename, coll)
 
     def load_database(self, db):
         """Loads a database."""
+        self.drop_indexes(db["name"])
+        if journal_enabled(db, self.rc):
+            self._journaling.add(db["name"])
+        dbpath = dbpathname(db, self.rc)
+        if db_revision(db, self.rc):
+            self.load_revision(db, db_revision(db, self.rc))
+            return
+        self.load_json(db, dbpath)
+        self.load_yaml(db, dbpath)
+        self.load_partitioned(db, dbpath)
+        if db.get("whitelist") and sparse_checkout_enabled(db, self.rc):
+            self._defer_sparse(db, dbpath)
+
+    def load_revision(self, db, rev):
+        """Loads a database as it was at a git revision, reading its files out
+        of the git objects rather than checking them out.
+
+        Each file is parsed as it would be from the working tree, and the
+        parsed documents are cached in the git directory by the hash of the
+        file, so that reading the same revision again, or another revision
+        that shares files with it, does not parse them again. The shards of
+        partitioned collections are merged into one collection.
+        """
+        dbpath = dbpathname(db, self.rc)
+        repo = GitRepo(dbpath)
+        blobs = repo.ls_tree(rev)
+        partitioned = {path.split("/")[0] for path, _ in blobs if path.count("/") == 1 and path.endswith(MANIFEST)}
+        colls = {}
+        journals = {}
+        for path, sha in blobs:
+            parts = path.split("/")
+            collname = parts[0].split(".")[0]
+            if parts[0].startswith(".") or not _whitelisted(db, parts[0]):
+                continue
+            name = parts[-1]
+            if len(parts) == 1 and name == collname + JOURNAL_EXT:
+                journals[collname] = sha
+                continue
+            if len(parts) > 1 and (len(parts) > 2 or parts[0] not in partitioned or name == MANIFEST):
+                continue
+            base, codec = split_codec(name)
+            ext = os.path.splitext(base)[1]
+            if ext not in (".json", ".yaml", ".yml"):
+                continue
+            docs = self._parse_blob(repo, sha, name)
+            colls.setdefault(collname, {}).update(docs)
+            if len(parts) == 1:
+                self._collfiletypes[dbpath, collname] = "json" if ext == ".json" else "yaml"
+                self._collexts[dbpath, collname] = ext
+                self._collcodecs[dbpath, collname] = codec
+        for collname, docs in colls.items():
+            if collname in journals:
+                replay_journal(
+                    collname + JOURNAL_EXT, docs, fileobj=io.BytesIO(repo.objects().read(journals[collname]))
+                )
+            self.dbs[db["name"]][collname] = docs
+        repo.objects().close()
+
+    def _parse_blob(self, repo, sha, name):
+        """Returns the documents of a collection file, by its blob hash, from
+        the cache of parsed files if they are in it."""
+        ext = split_codec(name)[0].rpartition(".")[2]
+        cache = os.path.join(repo.git_dir(), "regolith", "blobs", sha[:2], "{0}.{1}.pickle".format(sha, ext))
+        try:
+            with open(cache, "rb") as fh:
+                return pickle.load(fh)
+        except Exception:
+            # a missing, truncated or incompatible cache entry is parsed again
+            pass
+        fileobj = io.BytesIO(repo.objects().read(sha))
+        docs = load_json(name, fileobj=fileobj) if ext == "json" else load_yaml(name, fileobj=fileobj)
+        try:
+            os.makedirs(os.path.dirname(cache), exist_ok=True)
+            with open(cache + ".tmp", "wb") as fh:
+                pickle.dump(docs, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(cache + ".tmp", cache)
+        except OSError:
+            # the cache only saves time, so a read-only repo still works
+            pass
+        return docs
+
+    def _defer_sparse(self, db, dbpath):
+        """Defers the collections of a sparse git database that are tracked
+        but not checked out, so that they are checked out and loaded when
+        they are first needed."""
+        repo = GitRepo(dbdirname(db, self.rc))
+        if not repo.is_sparse():
+            return
+        path = os.path.relpath(dbpath, repo.path)
+        collnames = set()
+        for f in repo.tracked(path):
+            name = os.path.relpath(f, path).split("/")[0]
+            if not name.startswith(".") and name not in db["blacklist"]:
+                collnames.add(name.split(".")[0])
+        self.deferred[db["name"]] = collnames - set(self.dbs[db["name"]])
+        self._sparse_dbs[db["name"]] = db
+
+    def load_collection(self, dbname, collname):
+        """Checks out and loads a collection that was deferred when its
+        sparse git database was loaded."""
+        db = self._sparse_dbs[dbname]
+        GitRepo(dbdirname(db, self.rc)).sparse_add(sparse_patterns(db, [collname]))
+        db = dict(db, whitelist=[collname])
         dbpath = dbpathname(db, self.rc)
         self.load_json(db, dbpath)
         self.load_yaml(db, dbpath)
+        self.load_partitioned(db, dbpath)
+        self.deferred[dbname].discard(collname)
 
-    def dump_json(self, docs, collname, dbpath):
+    def dump_json(self, docs, collname, dbpath, codec=None):
         """Dumps json docs and returns filename"""
-        f = os.path.join(dbpath, collname + ".json")
-        dump_json(f, docs)
+        if codec is None:
+            codec = self._collcodecs.get((dbpath, collname), "")
+        f = os.path.join(dbpath, collname + ".json" + codec)
+        if isinstance(docs, LazyJSONCollection) and codec == "":
+            # only rewrite the file if a document may have changed
+            if docs.dirty:
+                docs.dump()
+        else:
+            dump_json(f, docs)
         filename = os.path.split(f)[-1]
         return filename
 
-    def dump_yaml(self, docs, collname, dbpath):
+    def dump_yaml(self, docs, collname, dbpath, codec=None):
         """Dumps json docs and returns filename"""
-        f = os.path.join(dbpath, collname + self._collexts.get(collname, ".yaml"))
+        if codec is None:
+            codec = self._collcodecs.get((dbpath, collname), "")
+        f = os.path.join(dbpath, collname + self._collexts.get((dbpath, collname), ".yaml") + codec)
         inst = self._yamlinsts.get((dbpath, collname), None)
         dump_yaml(f, docs, inst=inst)
         filename = os.path.split(f)[-1]
         return filename
 
     def dump_database(self, db):
-        """Dumps a database back to the filesystem."""
+        """Dumps a database back to the filesystem.
+
+        In journal mode the operations on each collection that was loaded
+        from a file are appended to its journal, and untouched collections
+        are not written at all. A collection is rewritten, and its journal
+        removed, when the journal grows past the ``journal_max_bytes``, or
+        whenever the database is not in journal mode.
+
+        Collection files are written with the compression they were loaded
+        with, unless the ``compression`` key configures another one, in which
+        case the file they were loaded from is replaced.
+        """
         dbpath = dbpathname(db, self.rc)
         os.makedirs(dbpath, exist_ok=True)
+        journaling = journal_enabled(db, self.rc)
         to_add = []
         for collname, collection in self.dbs[db["name"]].items():
+            records = self._journals.pop((db["name"], collname), [])
+            journal = journal_filename(dbpath, collname)
+            if journaling and (dbpath, collname) in self._collfiletypes:
+                if len(records) == 0:
+                    continue
+                append_journal(journal, records)
+                if os.path.getsize(journal) <= journal_max_bytes(db, self.rc):
+                    to_add.append(os.path.join(db["path"], os.path.basename(journal)))
+                    continue
             # print("dumping " + collname + "...", file=sys.stderr)
-            filetype = self._collfiletypes.get(collname, "yaml")
+            filetype = self._collfiletypes.get((dbpath, collname), "yaml")
+            loaded = self._collcodecs.get((dbpath, collname), "")
+            codec = collection_codec(db, self.rc, collname)
+            if codec is None:
+                codec = loaded
             if filetype == "json":
-                filename = self.dump_json(collection, collname, dbpath)
+                filename = self.dump_json(collection, collname, dbpath, codec=codec)
             elif filetype == "yaml":
-                filename = self.dump_yaml(collection, collname, dbpath)
+                filename = self.dump_yaml(collection, collname, dbpath, codec=codec)
+            elif filetype == "partitioned":
+                # only the shards that changed are written
+                filename = None
+                to_add.extend(os.path.join(db["path"], collname, f) for f in collection.dump())
             else:
                 raise ValueError("did not recognize file type for regolith")
-            to_add.append(os.path.join(db["path"], filename))
+            if filename is not None:
+                to_add.append(os.path.join(db["path"], filename))
+            if filename is not None and codec != loaded:
+                # the collection was compressed, or decompressed, so the file
+                # it was loaded from goes
+                old = split_codec(filename)[0] + loaded
+                if os.path.exists(os.path.join(dbpath, old)):
+                    os.remove(os.path.join(dbpath, old))
+                    to_add.append(os.path.join(db["path"], old))
+                self._collcodecs[dbpath, collname] = codec
+            if os.path.exists(journal):
+                os.remove(journal)
+                to_add.append(os.path.join(db["path"], os.path.basename(journal)))
         return to_add
 
     def close(self):
+        for colls in (self.dbs or {}).values():
+            for coll in colls.values():
+                if isinstance(coll, LazyJSONCollection):
+                    coll.close()
         self.dbs = None
+        self._indexes = {}
+        self._indexed_values = {}
+        self._journaling = set()
+        self._journals = defaultdict(list)
+        self.deferred = defaultdict(set)
+        self._sparse_dbs = {}
         self.closed = True
 
     def keys(self):
@@ -234,42 +683,172 @@ class FileSystemClient:
 
     def all_documents(self, collname, copy=True):
         """Returns an iteratable over all documents in a collection."""
+        coll = self.chained_db.get(collname, {})
         if copy:
-            return deepcopy(self.chained_db.get(collname, {})).values()
-        return self.chained_db.get(collname, {}).values()
+            if isinstance(coll, ChainedCollection):
+                # copy one document at a time, rather than the whole collection
+                return (deepcopy(doc) for doc in coll.values())
+            return deepcopy(coll).values()
+        return coll.values()
+
+    def index(self, dbname, collname, field):
+        """Returns the hash index of a field of a collection, building it if
+        need be. It maps each hashable value of the field to the _ids of the
+        documents with that value, which are not kept in collection order
+        as documents are written, see find_one.
+
+        The index is kept up to date by the writes made through the client.
+        A document whose indexed field is changed in place is indexed under
+        its old value until it is next written."""
+        key = (dbname, collname, field)
+        if key not in self._indexes:
+            self._indexes[key] = {}
+            self._indexed_values[key] = {}
+            for _id, doc in self.dbs[dbname][collname].items():
+                self._index_doc(key, _id, doc)
+        return self._indexes[key]
+
+    def _index_doc(self, key, _id, doc):
+        value = doc.get(key[2])
+        if _hashable(value):
+            self._indexes[key].setdefault(value, {})[_id] = None
+            self._indexed_values[key][_id] = value
+
+    def _unindex_doc(self, key, _id):
+        # by the value the document was indexed under, which is not its
+        # current value if it was changed in place
+        if _id not in self._indexed_values[key]:
+            return
+        value = self._indexed_values[key].pop(_id)
+        ids = self._indexes[key].get(value, {})
+        ids.pop(_id, None)
+        if len(ids) == 0:
+            self._indexes[key].pop(value, None)
+
+    def drop_indexes(self, dbname=None, collname=None):
+        """Drops the indexes of a collection, or all of a database, or all
+        of them. They are rebuilt when next used."""
+        for key in list(self._indexes):
+            if (dbname is None or key[0] == dbname) and (collname is None or key[1] == collname):
+                del self._indexes[key]
+                del self._indexed_values[key]
+
+    def _indexed(self, dbname, collname):
+        """Yields the keys of the indexes of a collection that have been built."""
+        for field in self.declared_indexes.get(collname, ()):
+            if (dbname, collname, field) in self._indexes:
+                yield dbname, collname, field
+
+    def _put(self, dbname, collname, doc):
+        """Adds or replaces a document, keeping the indexes up to date."""
+        coll = self.dbs[dbname][collname]
+        _id = doc["_id"]
+        for key in self._indexed(dbname, collname):
+            self._unindex_doc(key, _id)
+            self._index_doc(key, _id, doc)
+        coll[_id] = doc
+
+    def _pop(self, dbname, collname, _id):
+        """Removes a document, keeping the indexes up to date."""
+        old = self.dbs[dbname][collname].pop(_id)
+        for key in self._indexed(dbname, collname):
+            self._unindex_doc(key, _id)
+        return old
+
+    def _journal(self, dbname, collname, record):
+        """Records an operation for the journal, if the database is in journal mode."""
+        if dbname in self._journaling:
+            self._journals[dbname, collname].append(encode_doc(record))
+
+    def journal_length(self, dbname, collname):
+        """Returns the number of operations on a collection waiting to be
+        appended to its journal."""
+        return len(self._journals.get((dbname, collname), ()))
+
+    def truncate_journal(self, dbname, collname, length):
+        """Drops the operations on a collection recorded after the first
+        length, as when the writes that made them are rolled back."""
+        if (dbname, collname) in self._journals:
+            del self._journals[dbname, collname][length:]
+
+    def _update(self, dbname, collname, filter, update):
+        """Updates the first document matching filter, or inserts one, and
+        returns whether there was a match."""
+        doc = self.find_one(dbname, collname, filter)
+        newdoc = dict(filter if doc is None else doc)
+        newdoc.update(update)
+        self._put(dbname, collname, newdoc)
+        if doc is not None and doc.get("_id") == newdoc["_id"]:
+            self._journal(dbname, collname, {"op": "update", "_id": newdoc["_id"], "set": update})
+        else:
+            self._journal(dbname, collname, {"op": "insert", "doc": newdoc})
+        return doc is not None
 
     def insert_one(self, dbname, collname, doc):
         """Inserts one document to a database/collection."""
-        coll = self.dbs[dbname][collname]
-        coll[doc["_id"]] = doc
+        self._put(dbname, collname, doc)
+        self._journal(dbname, collname, {"op": "insert", "doc": doc})
 
     def insert_many(self, dbname, collname, docs):
         """Inserts many documents into a database/collection."""
-        coll = self.dbs[dbname][collname]
         for doc in docs:
-            coll[doc["_id"]] = doc
+            self.insert_one(dbname, collname, doc)
 
     def delete_one(self, dbname, collname, doc):
         """Removes a single document from a collection"""
-        coll = self.dbs[dbname][collname]
-        del coll[doc["_id"]]
+        self._pop(dbname, collname, doc["_id"])
+        self._journal(dbname, collname, {"op": "delete", "_id": doc["_id"]})
 
     def find_one(self, dbname, collname, filter):
-        """Finds the first document matching filter."""
+        """Finds the first document matching filter.
+
+        Filters on the _id, or on a field with a declared index, are looked
+        up directly rather than by scanning the collection. A filter that
+        the index finds no match for is still checked by a scan, as its
+        documents may have been changed in place, see index.
+        """
         coll = self.dbs[dbname][collname]
-        for doc in coll.values():
-            matches = True
-            for key, value in filter.items():
-                if key not in doc or doc[key] != value:
-                    matches = False
-                    break
-            if matches:
-                return doc
+        if "_id" in filter and _hashable(filter["_id"]):
+            doc = coll.get(filter["_id"])
+            return coll[filter["_id"]] if doc is not None and _matches(doc, filter) else None
+        for field in self.declared_indexes.get(collname, ()):
+            if field in filter and _hashable(filter[field]):
+                matched = set()
+                for _id in self.index(dbname, collname, field).get(filter[field], ()):
+                    doc = coll.get(_id)
+                    if doc is not None and _matches(doc, filter):
+                        matched.add(_id)
+                if len(matched) > 1:
+                    # the indexes do not keep collection order, so pick the
+                    # match a scan would have found first
+                    return next(coll[_id] for _id in coll if _id in matched)
+                if len(matched) == 1:
+                    return coll[matched.pop()]
+                break
+        # scan the collection, which only decodes one lazily loaded document
+        # at a time, and only reads the shards of a partitioned one that can match
+        docs = coll.scan(filter) if isinstance(coll, PartitionedCollection) else coll.items()
+        for _id, doc in docs:
+            if _matches(doc, filter):
+                return coll[_id]
+        return None
 
     def update_one(self, dbname, collname, filter, update, **kwargs):
         """Updates one document."""
-        coll = self.dbs[dbname][collname]
-        doc = self.find_one(dbname, collname, filter)
-        newdoc = dict(filter if doc is None else doc)
-        newdoc.update(update)
-        coll[newdoc["_id"]] = newdoc
+        self._update(dbname, collname, filter, update)
+
+    def bulk_write(self, dbname, collname, ops):
+        """Applies a batch of queued writes to a collection in one pass, see
+        ClientManager.batch, and returns the counts of each kind of write."""
+        counts = {"inserted": 0, "updated": 0, "deleted": 0}
+        for op in ops:
+            if op[0] == "insert":
+                self.insert_one(dbname, collname, op[1])
+                counts["inserted"] += 1
+            elif op[0] == "delete":
+                self.delete_one(dbname, collname, op[1])
+                counts["deleted"] += 1
+            else:
+                existed = self._update(dbname, collname, op[1], op[2])
+                counts["updated" if existed else "inserted"] += 1
+        return counts
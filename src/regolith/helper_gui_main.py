@@ -2,7 +2,6 @@
 
 from __future__ import print_function
 
-import copy
 import os
 
 from gooey import Gooey, GooeyParser
@@ -12,8 +11,7 @@ from regolith.commands import CONNECTED_COMMANDS
 from regolith.database import connect
 from regolith.helper import HELPERS
 from regolith.runcontrol import DEFAULT_RC, filter_databases, load_rcfile
-from regolith.schemas import SCHEMAS
-from regolith.tools import update_schemas
+from regolith.schemas import compiled_schemas
 
 NEED_RC = set(CONNECTED_COMMANDS.keys())
 NEED_RC |= {"rc", "deploy", "store"}
@@ -46,12 +44,7 @@ def main(args=None):
         rc._update(load_rcfile(rc.user_config))
     rc._update(load_rcfile("regolithrc.json"))
     rc._update(ns.__dict__)
-    if "schemas" in rc._dict:
-        user_schema = copy.deepcopy(rc.schemas)
-        default_schema = copy.deepcopy(SCHEMAS)
-        rc.schemas = update_schemas(default_schema, user_schema)
-    else:
-        rc.schemas = SCHEMAS
+    rc.schemas = compiled_schemas(rc._get("schemas"))
     filter_databases(rc)
     dbs = commands.helper_db_check(rc)
     with connect(rc, dbs=dbs) as rc.client:
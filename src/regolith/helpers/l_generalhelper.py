@@ -2,7 +2,13 @@
 
 from regolith.fsclient import _id_key
 from regolith.helpers.basehelper import SoutHelperBase
-from regolith.tools import all_docs_from_collection, collection_str, get_pi_id, search_collection
+from regolith.tools import (
+    all_docs_from_collection,
+    get_pi_id,
+    iter_collection_str,
+    iter_kv_filter,
+    write_stripped,
+)
 
 HELPER_TARGET = "lister"
 
@@ -66,23 +72,17 @@ class GeneralListerHelper(SoutHelperBase):
                 raise ValueError(f"{i} is not a valid key. Please choose a valid key from: {keys}")
         if len(coll) == 0:
             raise RuntimeError("This collection is empty or does not exist. Please inform a valid collection.")
+        header = "Results of your search:\n"
         if rc.kv_filter:
-            filter_result = search_collection(coll, rc.kv_filter).strip()
-            if filter_result == "":
+            index = rc.client.fragment_index(rc.coll, coll)
+            results = iter_kv_filter(coll, rc.kv_filter, index=index)
+            if not write_stripped(iter_collection_str(results, rc.return_fields), header=header):
                 print("There are no results that match your search.")
-            else:
-                if rc.return_fields:
-                    print(
-                        "Results of your search:\n"
-                        f"{(search_collection(coll, rc.kv_filter, rc.return_fields).strip())}"
-                    )
-                else:
-                    print(f"Results of your search:\n{filter_result}")
         if rc.return_fields and not rc.kv_filter:
-            print(f"Results of your search:\n{collection_str(coll, rc.return_fields).strip()}")
+            write_stripped(iter_collection_str(coll, rc.return_fields), header=header)
         if rc.keys:
             print(f"Available keys:\n{keys}")
             return
         if not rc.kv_filter and not rc.return_fields:
-            print(f"Results of your search:\n{collection_str(coll).strip()}")
+            write_stripped(iter_collection_str(coll), header=header)
         return
@@ -14,7 +14,6 @@ from regolith.helpers.basehelper import SoutHelperBase
 from regolith.schemas import PROJECTUM_ACTIVE_STATI, alloweds
 from regolith.tools import (
     all_docs_from_collection,
-    document_by_value,
     get_pi_id,
     key_value_pair_filter,
     print_task,
@@ -99,6 +98,8 @@ class TodoListerHelper(SoutHelperBase):
     # btype must be the same as helper target in helper.py
     btype = HELPER_TARGET
     needed_colls = [f"{TARGET_COLL}", "refereeReports", "proposalReviews"]
+    # only the documents of one person are needed, so they are queried in sout
+    preload = False
 
     def construct_global_ctx(self):
         """Constructs the global context"""
@@ -108,11 +109,6 @@ class TodoListerHelper(SoutHelperBase):
         if "groups" in self.needed_colls:
             rc.pi_id = get_pi_id(rc)
         rc.coll = f"{TARGET_COLL}"
-        colls = [
-            sorted(all_docs_from_collection(rc.client, collname), key=_id_key) for collname in self.needed_colls
-        ]
-        for db, coll in zip(self.needed_colls, colls):
-            gtx[db] = coll
         gtx["all_docs_from_collection"] = all_docs_from_collection
         gtx["float"] = float
         gtx["str"] = str
@@ -130,7 +126,7 @@ class TodoListerHelper(SoutHelperBase):
                 )
                 return
         try:
-            person = document_by_value(all_docs_from_collection(rc.client, "todos"), "_id", rc.assigned_to)
+            person = rc.client.find("todos", {"_id": rc.assigned_to}, fields=["todos"])[0]
             gather_todos = person.get("todos", [])
         except Exception:
             print("The id you entered can't be found in todos.yml.")
@@ -191,8 +187,8 @@ class TodoListerHelper(SoutHelperBase):
             print_task(gather_todos, stati=rc.stati)
 
         if rc.outstandingreview:
-            prop = self.gtx["proposalReviews"]
-            man = self.gtx["refereeReports"]
+            prop = sorted(rc.client.find("proposalReviews", {"reviewer": rc.assigned_to}), key=_id_key)
+            man = sorted(rc.client.find("refereeReports", {"reviewer": rc.assigned_to}), key=_id_key)
             outstanding_todo = []
             for manuscript in man:
                 if manuscript.get("reviewer") != rc.assigned_to:
@@ -193,21 +193,23 @@ class TodoUpdaterHelper(DbHelperBase):
                 for todo in reversed(todolist[:finished_todo]):
                     index_match[todo["running_index"]] = new_index_finished
                     new_index_finished += -1
-                for i in range(0, len(rc.databases)):
-                    db_name = rc.databases[i]["name"]
-                    person_idx = rc.client.find_one(db_name, rc.coll, filterid)
-                    if isinstance(person_idx, dict):
-                        todolist_idx = person_idx.get("todos", [])
-                    else:
-                        continue
-                    if len(todolist_idx) != 0:
-                        for todo in todolist_idx:
-                            index = index_match[todo["running_index"]]
-                            todo["running_index"] = index
-                        rc.client.update_one(
-                            db_name, rc.coll, {"_id": rc.assigned_to}, {"todos": todolist_idx}, upsert=True
-                        )
-                        print(f"Indices in {db_name} for {rc.assigned_to} have been updated.")
+                # write the renumbered todos of every database in one batch
+                with rc.client.batch():
+                    for i in range(0, len(rc.databases)):
+                        db_name = rc.databases[i]["name"]
+                        person_idx = rc.client.find_one(db_name, rc.coll, filterid)
+                        if isinstance(person_idx, dict):
+                            todolist_idx = person_idx.get("todos", [])
+                        else:
+                            continue
+                        if len(todolist_idx) != 0:
+                            for todo in todolist_idx:
+                                index = index_match[todo["running_index"]]
+                                todo["running_index"] = index
+                            rc.client.update_one(
+                                db_name, rc.coll, {"_id": rc.assigned_to}, {"todos": todolist_idx}, upsert=True
+                            )
+                            print(f"Indices in {db_name} for {rc.assigned_to} have been updated.")
                 return
             if rc.assigned_by:
                 if rc.assigned_by == "default_id":
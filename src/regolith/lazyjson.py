@@ -0,0 +1,202 @@
+"""JSON collection files that are memory-mapped and decoded lazily.
+
+A JSON collection file holds one document per line. Rather than decoding
+every line up front, a LazyJSONCollection maps the file into memory and keeps
+an index from each ``_id`` to the offset and length of its line, so that a
+document is only decoded when it is looked up, and iterating over the
+collection holds one decoded document at a time.
+
+The index is kept in a sidecar file, ``<collection>.json.idx``, next to the
+collection file, and is rebuilt whenever the collection file has changed
+since it was written.
+"""
+
+import json
+import mmap
+import os
+from collections.abc import ItemsView, MutableMapping, ValuesView
+
+INDEX_EXT = ".idx"
+
+
+def index_filename(filename):
+    """Gets the path to the sidecar index of a JSON collection file."""
+    return filename + INDEX_EXT
+
+
+def build_index(buf):
+    """Returns a dict from the _id of each document in a buffer of JSON
+    lines to the offset and length of its line."""
+    offsets = {}
+    start = 0
+    size = len(buf)
+    while start < size:
+        end = buf.find(b"\n", start)
+        if end == -1:
+            end = size
+        line = buf[start:end]
+        if line.strip():
+            offsets[json.loads(line)["_id"]] = (start, end - start)
+        start = end + 1
+    return offsets
+
+
+def load_index(filename, buf):
+    """Returns the offsets of the documents in a JSON collection file, from
+    its sidecar index if that is up to date, otherwise building the index and
+    writing the sidecar."""
+    st = os.stat(filename)
+    sidecar = index_filename(filename)
+    try:
+        with open(sidecar, encoding="utf-8") as fh:
+            index = json.load(fh)
+        if index["mtime_ns"] == st.st_mtime_ns and index["size"] == st.st_size:
+            return {_id: tuple(loc) for _id, loc in index["offsets"]}
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    offsets = build_index(buf)
+    index = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "offsets": [[k, v] for k, v in offsets.items()]}
+    try:
+        with open(sidecar, "w", encoding="utf-8") as fh:
+            json.dump(index, fh)
+    except OSError:
+        # the index is only a cache, so a read-only database still works
+        pass
+    return offsets
+
+
+class PeekValuesView(ValuesView):
+    """The values of a lazily loaded mapping, read with peek."""
+
+    def __iter__(self):
+        for key in self._mapping:
+            yield self._mapping.peek(key)
+
+
+class PeekItemsView(ItemsView):
+    """The items of a lazily loaded mapping, read with peek."""
+
+    def __iter__(self):
+        for key in self._mapping:
+            yield key, self._mapping.peek(key)
+
+
+class LazyJSONCollection(MutableMapping):
+    """A JSON collection file as a mapping from _id to document.
+
+    Looking a document up by key decodes it and keeps it, so that changes
+    made to it in place are written back by dump, as with a dict. Iterating
+    over the values or items decodes each document in turn without keeping
+    it, see peek. Documents that are set or deleted are kept in memory until
+    the collection is dumped.
+
+    Parameters
+    ----------
+    filename : str
+        The JSON collection file.
+    """
+
+    # chained on access, see ChainedCollection
+    lazy = True
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._fh = None
+        self._buf = b""
+        self._open()
+
+    def _open(self):
+        self._fh = open(self.filename, "rb")
+        if os.fstat(self._fh.fileno()).st_size > 0:
+            self._buf = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._buf = b""
+        self._offsets = load_index(self.filename, self._buf)
+        # documents that were looked up or set, and ids that were deleted
+        self._docs = {}
+        self._deleted = set()
+        self.modified = False
+
+    def close(self):
+        """Unmaps and closes the file."""
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._buf = b""
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def _decode(self, key):
+        offset, length = self._offsets[key]
+        return json.loads(self._buf[offset : offset + length])
+
+    def peek(self, key):
+        """Returns a document without keeping it, unless it already was."""
+        if key in self._docs:
+            return self._docs[key]
+        if key in self._deleted or key not in self._offsets:
+            raise KeyError(key)
+        return self._decode(key)
+
+    def __getitem__(self, key):
+        if key not in self._docs:
+            self._docs[key] = self.peek(key)
+        return self._docs[key]
+
+    def __setitem__(self, key, doc):
+        self._docs[key] = doc
+        self._deleted.discard(key)
+        self.modified = True
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._docs.pop(key, None)
+        if key in self._offsets:
+            self._deleted.add(key)
+        self.modified = True
+
+    def __contains__(self, key):
+        return key in self._docs or (key in self._offsets and key not in self._deleted)
+
+    def __iter__(self):
+        for key in self._offsets:
+            if key not in self._deleted:
+                yield key
+        for key in self._docs:
+            if key not in self._offsets:
+                yield key
+
+    def __len__(self):
+        return len(self._offsets) - len(self._deleted) + sum(1 for key in self._docs if key not in self._offsets)
+
+    def values(self):
+        return PeekValuesView(self)
+
+    def items(self):
+        return PeekItemsView(self)
+
+    @property
+    def dirty(self):
+        """Whether dump has anything to write, which is the case once a
+        document has been set, deleted or kept, as it may have been changed
+        in place."""
+        return self.modified or len(self._docs) != 0
+
+    def dump(self, date_handler=None):
+        """Writes the collection back to its file, sorted by _id as dump_json
+        does. The lines of the documents that were never decoded are copied
+        as they are."""
+        lines = []
+        for key in sorted(self):
+            if key in self._docs:
+                lines.append(json.dumps(self._docs[key], sort_keys=True, default=date_handler).encode("utf-8"))
+            else:
+                offset, length = self._offsets[key]
+                lines.append(self._buf[offset : offset + length])
+        tmp = self.filename + ".tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(b"\n".join(lines))
+        self.close()
+        os.replace(tmp, self.filename)
+        self._open()
@@ -6,17 +6,16 @@ import copy
 import os
 from argparse import ArgumentParser, Namespace, RawTextHelpFormatter
 
-from regolith import __version__, commands
+from regolith import __version__, commands, schemas
 from regolith.builder import BUILDERS
 from regolith.commands import CONNECTED_COMMANDS, DISCONNECTED_COMMANDS, INGEST_COLL_LU
 from regolith.database import connect
 from regolith.helper import HELPERS
+from regolith.profiler import PROFILER, span
 from regolith.runcontrol import DEFAULT_RC, filter_databases, load_rcfile
-from regolith.schemas import SCHEMAS
-from regolith.tools import update_schemas
 
 NEED_RC = set(CONNECTED_COMMANDS.keys())
-NEED_RC |= {"rc", "deploy", "store"}
+NEED_RC |= {"rc", "deploy", "store", "fs-to-sqlite", "sqlite-to-fs", "partition", "snapshot"}
 
 
 def create_parser():
@@ -24,6 +23,20 @@ def create_parser():
     subp = p.add_subparsers(title="cmd", dest="cmd")
 
     p.add_argument("--version", action="store_true")
+    p.add_argument(
+        "--profile",
+        default=None,
+        metavar="TRACE",
+        help="write a Chrome trace of where the time goes to this file, and a summary to stderr",
+    )
+    p.add_argument(
+        "--db-revision",
+        dest="db_revision",
+        default=None,
+        metavar="REV",
+        help="read the git databases as they were at this revision, such as a tag or a commit, without "
+        "checking it out, and do not write to them",
+    )
 
     # helper subparser
     subp.add_parser(
@@ -157,6 +170,12 @@ def create_parser():
         default=None,
     )
 
+    # compact subparser
+    subp.add_parser(
+        "compact",
+        help="folds the operation journals of the databases back into their collection files",
+    )
+
     # deploy subparser
     subp.add_parser("deploy", help="deploys what was built by regolith")
 
@@ -254,6 +273,83 @@ def create_parser():
         default=None,
     )
 
+    # fs-to-sqlite subparser
+    subp.add_parser(
+        "fs-to-sqlite",
+        help="Convert the JSON and YAML collection files of each database into a single SQLite file "
+        "in the same directory, for use with the 'sqlite' backend.",
+    )
+
+    # sqlite-to-fs subparser
+    subp.add_parser(
+        "sqlite-to-fs",
+        help="Export the SQLite file of each database into YAML collection files in the same directory.",
+    )
+
+    # partition subparser
+    ptp = subp.add_parser(
+        "partition",
+        help="splits a collection of the filesystem databases into shard files that are loaded on demand, "
+        "or merges the shards back into a single collection file",
+    )
+    ptp.add_argument("coll", help="collection name")
+    ptp.add_argument(
+        "--by",
+        dest="shard_key",
+        choices=["year", "letter", "hash"],
+        default="year",
+        help="shard the documents by year, by the first letter of their _id or by a hash of their _id, "
+        "defaults to year",
+    )
+    ptp.add_argument(
+        "--hash-shards",
+        dest="hash_shards",
+        type=int,
+        default=16,
+        help="the number of shards when sharding by hash, defaults to 16",
+    )
+    ptp.add_argument(
+        "--format",
+        choices=["yaml", "json"],
+        default="yaml",
+        help="the format of the files written, defaults to yaml",
+    )
+    ptp.add_argument(
+        "--merge",
+        action="store_true",
+        help="merge the shards of the collection back into a single collection file",
+    )
+
+    # snapshot subparser
+    subp.add_parser(
+        "snapshot",
+        help="writes the chained databases to a snapshot file, which is loaded in their place for as long as "
+        "they are unchanged",
+    )
+
+    # bench subparser
+    bnp = subp.add_parser(
+        "bench",
+        help="times loading, validating, builders and helpers on synthetic databases of increasing size",
+    )
+    bnp.add_argument(
+        "--scales",
+        nargs="+",
+        type=int,
+        default=[1, 10, 100],
+        help="the sizes of the databases, as multiples of the exemplars, defaults to 1 10 100",
+    )
+    bnp.add_argument("--repeat", type=int, default=3, help="the number of runs of each benchmark, defaults to 3")
+    bnp.add_argument("--only", nargs="+", default=None, help="the names of the benchmarks to run")
+    bnp.add_argument("--out", default=None, help="write the results to this JSON file")
+    bnp.add_argument("--compare", default=None, help="compare the results to those in this JSON file")
+    bnp.add_argument(
+        "--dir",
+        dest="bench_dir",
+        default=None,
+        help="write the databases here, rather than to a temporary directory",
+    )
+
     # Validator
     val = subp.add_parser("validate", help="Validates db")
     val.add_argument(
@@ -291,17 +387,27 @@ def main(args=None):
         ns = args3
     else:
         ns = args1
+    if ns.profile:
+        PROFILER.enable()
+    try:
+        with span("main", cmd=ns.cmd):
+            run(rc, ns)
+    finally:
+        if ns.profile:
+            PROFILER.disable()
+            PROFILER.write_trace(ns.profile)
+            PROFILER.print_summary()
+    return rc
+
+
+def run(rc, ns):
+    """Runs the command parsed into ns."""
     if ns.cmd in NEED_RC:
         if os.path.exists(rc.user_config):
             rc._update(load_rcfile(rc.user_config))
         rc._update(load_rcfile("regolithrc.json"))
     rc._update(ns.__dict__)
-    if "schemas" in rc._dict:
-        user_schema = copy.deepcopy(rc.schemas)
-        default_schema = copy.deepcopy(SCHEMAS)
-        rc.schemas = update_schemas(default_schema, user_schema)
-    else:
-        rc.schemas = SCHEMAS
+    rc.schemas = schemas.compiled_schemas(rc._get("schemas"))
     if ns.cmd in NEED_RC:
         filter_databases(rc)
     if rc.cmd in DISCONNECTED_COMMANDS:
@@ -314,7 +420,6 @@ def main(args=None):
             dbs = commands.helper_db_check(rc)
         with connect(rc, dbs=dbs) as rc.client:
             CONNECTED_COMMANDS[rc.cmd](rc)
-    return rc
 
 
 if __name__ == "__main__":
@@ -36,6 +36,7 @@ except ImportError:
 from pymongo.collection import Collection
 
 from regolith import fsclient
+from regolith.profiler import span
 from regolith.tools import dbpathname, fallback
 
 if not MONGO_AVAILABLE:
@@ -47,11 +48,20 @@ else:
     ON_PYMONGO_V2 = False
     ON_PYMONGO_V3 = True
 
+# fields that documents are most often looked up by, indexed case-insensitively
+# (the _id field always has an index)
+INDEXED_FIELDS = ("name", "aka", "lead", "assigned_to")
+
+# compares strings ignoring case and accents, see
+# https://www.mongodb.com/docs/manual/reference/collation/
+CASE_INSENSITIVE = {"locale": "en", "strength": 2}
+
 
 def import_jsons(dbpath: str, dbname: str, host: str = None, uri: str = None) -> None:
     """Import the json files to mongo db.
 
     Each json file will be a collection in the database. The _id will be the same as it is in the json file.
+    Compressed json files, such as "citations.json.gz", are imported too.
 
     Parameters
     ----------
@@ -68,28 +78,39 @@ def import_jsons(dbpath: str, dbname: str, host: str = None, uri: str = None) ->
     uri : str
         Specify a resolvable URI connection string (enclose in quotes) to connect to the MongoDB deployment.
     """
-    for json_path in Path(dbpath).glob("*.json"):
-        cmd = ["mongoimport"]
-        if host is not None:
-            cmd += ["--host", host, "--db", dbname]
-        if uri is not None:
-            cmd += ["--uri", uri]
-        cmd += ["--collection", json_path.stem, "--file", str(json_path)]
-        try:
-            subprocess.check_call(cmd, stderr=subprocess.STDOUT)
-        except FileNotFoundError:
-            print(
-                "mongoimport command not found in environment path.\n\n"
-                "If mongo server v4.4+ installed, download MongoDB Database Tools from:"
-                " https://www.mongodb.com/try/download/database-tools\n"
-                "and add C:\\Program Files\\MongoDB\\Tools\\<ToolsVersion>\\bin\\ to path.\n\n"
-                "If mongo server <v4.4, ensure that C:\\Program Files\\MongoDB\\Server\\<ServerVersion>\\bin\\ \n"
-                "has been added to the environment path.\n"
-            )
-            print("..................Upload failed..................")
-        except subprocess.CalledProcessError as exc:
-            print("Status : FAIL", exc.returncode, exc.output)
-            raise exc
+    with TemporaryDirectory() as tempd:
+        # mongoimport reads plain text, so compressed files are decompressed first
+        for json_path in Path(dbpath).glob("*.json.*"):
+            name, codec = fsclient.split_codec(json_path.name)
+            if codec == "":
+                continue
+            with fsclient.open_collection(str(json_path)) as src:
+                with open(Path(tempd).joinpath(name), "w", encoding="utf-8") as dst:
+                    shutil.copyfileobj(src, dst)
+        for json_path in itertools.chain(Path(dbpath).glob("*.json"), Path(tempd).glob("*.json")):
+            cmd = ["mongoimport"]
+            if host is not None:
+                cmd += ["--host", host, "--db", dbname]
+            if uri is not None:
+                cmd += ["--uri", uri]
+            cmd += ["--collection", json_path.stem, "--file", str(json_path)]
+            try:
+                with span(cmd[0], cat="subprocess"):
+                    subprocess.check_call(cmd, stderr=subprocess.STDOUT)
+            except FileNotFoundError:
+                print(
+                    "mongoimport command not found in environment path.\n\n"
+                    "If mongo server v4.4+ installed, download MongoDB Database Tools from:"
+                    " https://www.mongodb.com/try/download/database-tools\n"
+                    "and add C:\\Program Files\\MongoDB\\Tools\\<ToolsVersion>\\bin\\ to path.\n\n"
+                    "If mongo server <v4.4, ensure that "
+                    "C:\\Program Files\\MongoDB\\Server\\<ServerVersion>\\bin\\ \n"
+                    "has been added to the environment path.\n"
+                )
+                print("..................Upload failed..................")
+            except subprocess.CalledProcessError as exc:
+                print("Status : FAIL", exc.returncode, exc.output)
+                raise exc
     return
 
 
@@ -97,6 +118,7 @@ def import_yamls(dbpath: str, dbname: str, host: str = None, uri: str = None) ->
     """Import the yaml files to mongo db.
 
     Each yaml file will be a collection in the database. The _id will be the id_key for each doc in the yaml file.
+    Compressed yaml files, such as "citations.yaml.gz", are imported too.
 
     Parameters
     ----------
@@ -113,10 +135,13 @@ def import_yamls(dbpath: str, dbname: str, host: str = None, uri: str = None) ->
     uri : str
         Specify a resolvable URI connection string (enclose in quotes) to connect to the MongoDB deployment.
     """
-    yaml_files = itertools.chain(Path(dbpath).glob("*.yaml"), Path(dbpath).glob("*.yml"))
+    yaml_files = itertools.chain.from_iterable(
+        Path(dbpath).glob(pattern + codec) for pattern in ("*.yaml", "*.yml") for codec in ("",) + fsclient.CODECS
+    )
     with TemporaryDirectory() as tempd:
         for yaml_file in yaml_files:
-            json_file = Path(tempd).joinpath(yaml_file.with_suffix(".json").name)
+            name = fsclient.split_codec(yaml_file.name)[0]
+            json_file = Path(tempd).joinpath(Path(name).with_suffix(".json").name)
             loader = YAML(typ="safe")
             loader.constructor.yaml_constructors["tag:yaml.org,2002:timestamp"] = (
                 loader.constructor.yaml_constructors["tag:yaml.org,2002:str"]
@@ -126,15 +151,48 @@ def import_yamls(dbpath: str, dbname: str, host: str = None, uri: str = None) ->
     return
 
 
-def export_json(collection: str, dbpath: str, dbname: str, host: str = None, uri: str = None) -> None:
+def create_indexes(dbname: str, host: str = None, uri: str = None) -> None:
+    """Creates the case-insensitive indexes on the INDEXED_FIELDS of every collection in a mongo database.
+
+    Creating indexes needs write access, so this is done once, when a database is imported, rather than when
+    it is queried.
+
+    Parameters
+    ----------
+    dbname : str
+        The name of the database in mongo.
+
+    host : str
+        The hostname or IP address or Unix domain socket path of a single mongod or mongos instance to connect
+        to, or a mongodb URI, or a list of hostnames / mongodb URIs.
+
+    uri : str
+        Specify a resolvable URI connection string (enclose in quotes) to connect to the MongoDB deployment.
+    """
+    with pymongo.MongoClient(uri or host) as client:
+        for collname in client[dbname].list_collection_names():
+            for field in INDEXED_FIELDS:
+                client[dbname][collname].create_index(field, collation=CASE_INSENSITIVE)
+
+
+def export_json(
+    collection: str, dbpath: str, dbname: str, host: str = None, uri: str = None, codec: str = ""
+) -> None:
+    out = os.path.join(dbpath, collection + ".json")
     cmd = ["mongoexport", "--collection", collection]
     if host is not None:
         cmd += ["--host", host, "--db", dbname]
     if uri is not None:
         cmd += ["--uri", uri]
-    cmd += ["--out", str(os.path.join(dbpath, collection + ".json"))]
+    cmd += ["--out", str(out)]
     try:
-        subprocess.check_call(cmd, stderr=subprocess.STDOUT)
+        with span(cmd[0], cat="subprocess"):
+            subprocess.check_call(cmd, stderr=subprocess.STDOUT)
+        if codec:
+            # mongoexport writes plain text, which is compressed as it is copied
+            with open(out, encoding="utf-8") as src, fsclient.open_collection(out + codec, "w") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(out)
     except FileNotFoundError:
         print(
             "mongoexport command not found in environment path.\n\n"
@@ -254,6 +312,8 @@ class MongoClient:
         self.chained_db = dict()
         self.closed = True
         self.local = True
+        # the collections that were not preloaded, by database name
+        self.deferred = defaultdict(set)
 
     def _preclean(self):
         mongodbpath = self.rc.mongodbpath
@@ -291,7 +351,8 @@ class MongoClient:
             else:
                 cmd = ["mongostat", "--host", "localhost", "-n", "1"]
                 try:
-                    subprocess.check_call(cmd, stderr=subprocess.STDOUT)
+                    with span(cmd[0], cat="subprocess"):
+                        subprocess.check_call(cmd, stderr=subprocess.STDOUT)
                     alive = True
                 except subprocess.CalledProcessError as exc:
                     print("Status : FAIL", exc.returncode, exc.output)
@@ -368,6 +429,8 @@ class MongoClient:
         """Load the database information from mongo database.
 
         It populate the 'dbs' attribute with a dictionary like {database: {collection: docs_dict}}.
+        If the rc has 'preload' set to False, the collections are only listed in the 'deferred'
+        attribute, to be queried on the server or loaded one by one with load_collection.
 
         Parameters
         ----------
@@ -388,6 +451,9 @@ class MongoClient:
                 for coll in mongodb.list_collection_names()
                 if coll not in db["blacklist"] and len(db["whitelist"]) == 0 or coll in db["whitelist"]
             ]:
+                if not getattr(self.rc, "preload", True):
+                    self.deferred[db["name"]].add(colname)
+                    continue
                 col = mongodb[colname]
                 dbs[db["name"]][colname] = load_mongo_col(col)
         except OperationFailure as fail:
@@ -399,6 +465,52 @@ class MongoClient:
             )
         return
 
+    def load_collection(self, dbname, collname):
+        """Loads a collection that was deferred when its database was loaded."""
+        self.dbs[dbname][collname] = load_mongo_col(self.client[dbname][collname])
+        self.deferred[dbname].discard(collname)
+
+    def find(self, dbname, collname, filter, fields=None, case_sensitive=True):
+        """Queries a collection on the server.
+
+        Parameters
+        ----------
+        dbname : str
+            The name of the database.
+        collname : str
+            The name of the collection.
+        filter : dict
+            A mongo query, such as field-value pairs that must all match.
+        fields : list of str, optional
+            Only return these fields (and the _id) of the documents.
+        case_sensitive : bool, optional
+            When false, strings are compared ignoring case, using the indexes on INDEXED_FIELDS that
+            fs-to-mongo creates.
+
+        Returns
+        -------
+        docs : list of dict
+            The matching documents.
+        """
+        kwargs = {}
+        if fields is not None:
+            kwargs["projection"] = list(fields)
+        if not case_sensitive:
+            kwargs["collation"] = CASE_INSENSITIVE
+        return list(self.client[dbname][collname].find(filter, **kwargs))
+
+    def lookup(self, dbname, collname, value, sources=("_id", "name", "aka"), fields=None):
+        """Finds the document where any of the sources fields is value, ignoring case,
+        the server side version of fuzzy_retrieval."""
+        if "_id" in sources:
+            # an exact id is the most common case and can use the default _id index
+            docs = self.find(dbname, collname, {"_id": value}, fields=fields)
+            if docs:
+                return docs[0]
+        query = {"$or": [{source: value} for source in sources]}
+        docs = self.find(dbname, collname, query, fields=fields, case_sensitive=False)
+        return docs[0] if docs else None
+
     def import_database(self, db: dict):
         """Import the database from filesystem to the mongo backend.
 
@@ -417,6 +529,7 @@ class MongoClient:
         dbname = db["name"]
         import_jsons(dbpath, dbname, host=host, uri=uri)
         import_yamls(dbpath, dbname, host=host, uri=uri)
+        create_indexes(dbname, host=host, uri=uri)
         return
 
     def export_database(self, db: dict):
@@ -436,7 +549,8 @@ class MongoClient:
         dbpath = os.path.abspath(dbpathname(db, self.rc))
         dbname = db["name"]
         for collection in self.dbs[dbname].keys():
-            export_json(collection, dbpath, dbname, host=host, uri=uri)
+            codec = fsclient.collection_codec(db, self.rc, collection) or ""
+            export_json(collection, dbpath, dbname, host=host, uri=uri, codec=codec)
         return
 
     def dump_database(self, db):
@@ -457,7 +571,8 @@ class MongoClient:
                 f,
             ]
             try:
-                subprocess.check_call(cmd, stderr=subprocess.STDOUT)
+                with span(cmd[0], cat="subprocess"):
+                    subprocess.check_call(cmd, stderr=subprocess.STDOUT)
             except subprocess.CalledProcessError as exc:
                 print("Status : FAIL", exc.returncode, exc.output)
                 raise exc
@@ -560,3 +675,47 @@ class MongoClient:
             return coll.update(doc, update, **kwargs)
         else:
             return coll.find_one_and_update(filter, {"$set": update}, **kwargs)
+
+    def bulk_write(self, dbname, collname, ops):
+        """Validates a batch of queued writes to a collection together and sends
+        them in a single bulk write, see ClientManager.batch. Nothing is written
+        if any document fails validation.
+
+        Returns
+        -------
+        counts : dict
+            The number of documents inserted, updated and deleted.
+        """
+        from pymongo import DeleteOne, InsertOne, UpdateOne
+
+        coll = self.client[dbname][collname]
+        # fetch every document that is updated in one query, to validate the results
+        ids = [op[1]["_id"] for op in ops if op[0] == "update"]
+        current = {doc["_id"]: doc for doc in coll.find({"_id": {"$in": ids}})} if ids else {}
+        requests, errors = [], []
+        for op in ops:
+            if op[0] == "insert":
+                doc = doc_cleanup(op[1])
+                requests.append(InsertOne(doc))
+            elif op[0] == "delete":
+                requests.append(DeleteOne(doc_cleanup(op[1])))
+                continue
+            else:
+                filter, update, kwargs = op[1], op[2], op[3]
+                doc = dict(current.get(filter["_id"], filter))
+                doc.update(update)
+                current[filter["_id"]] = doc
+                requests.append(
+                    UpdateOne(filter, {"$set": bson_cleanup(update)}, upsert=kwargs.get("upsert", False))
+                )
+            valid, potential_error = validate_doc(collname, doc, self.rc)
+            if not valid:
+                errors.append(potential_error)
+        if len(errors) != 0:
+            raise ValueError("\n".join(errors))
+        result = coll.bulk_write(requests)
+        return {
+            "inserted": result.inserted_count + result.upserted_count,
+            "updated": result.matched_count,
+            "deleted": result.deleted_count,
+        }
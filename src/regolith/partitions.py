@@ -0,0 +1,278 @@
+"""Collections partitioned into shard files that are loaded on demand.
+
+A partitioned collection is a directory named after the collection, next to
+the collection files of its database, which holds one YAML (or JSON) file per
+shard and a ``manifest.json``::
+
+    db/citations/manifest.json
+    db/citations/2019.yaml
+    db/citations/2020.yaml
+
+The manifest records the shard key, the format of the shard files and the
+number of documents in each shard. Documents are sharded by their year, by
+the first letter of their ``_id`` or by a hash of their ``_id``. A shard is
+only read when a lookup needs it, and only the shards that were written to
+are written back.
+"""
+
+import datetime
+import json
+import os
+import zlib
+from collections.abc import MutableMapping
+
+from regolith.lazyjson import PeekItemsView, PeekValuesView
+
+MANIFEST = "manifest.json"
+SHARD_KEYS = ("year", "letter", "hash")
+DEFAULT_HASH_SHARDS = 16
+
+# the fields the year of a document is taken from, in order
+YEAR_FIELDS = ("year", "date", "begin_date")
+UNKNOWN_YEAR = "unknown"
+
+
+def is_partitioned(path):
+    """Whether a directory holds a partitioned collection."""
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def doc_year(doc):
+    """Returns the year of a document, as a string, for sharding by year."""
+    for field in YEAR_FIELDS:
+        value = doc.get(field)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return str(value.year)
+        if value is not None and str(value)[:4].isdigit():
+            return str(value)[:4]
+    return UNKNOWN_YEAR
+
+
+def id_letter(_id):
+    """Returns the shard of an _id when sharding by letter."""
+    c = str(_id)[:1].lower()
+    return c if c.isalnum() and c.isascii() else "_"
+
+
+def id_hash(_id, shards=DEFAULT_HASH_SHARDS):
+    """Returns the shard of an _id when sharding by hash, which is stable
+    across runs, unlike hash()."""
+    return "{0:02d}".format(zlib.crc32(str(_id).encode("utf-8")) % shards)
+
+
+def read_shard(filename):
+    from regolith.fsclient import load_json, load_yaml, split_codec
+
+    if split_codec(filename)[0].endswith(".json"):
+        return load_json(filename)
+    return load_yaml(filename)
+
+
+def write_shard(filename, docs):
+    from regolith.fsclient import date_encoder, dump_json, dump_yaml, split_codec
+
+    if split_codec(filename)[0].endswith(".json"):
+        dump_json(filename, docs, date_handler=date_encoder)
+    else:
+        # dump_yaml takes the _ids out of the documents it is given
+        dump_yaml(filename, {_id: dict(doc) for _id, doc in docs.items()})
+
+
+class PartitionedCollection(MutableMapping):
+    """A partitioned collection as a mapping from _id to document.
+
+    Looking up an _id only reads the shard it belongs in, when the shard key
+    is the letter or hash of the _id, and every shard otherwise. Documents
+    that are looked up by key mark their shard as changed, as they may be
+    changed in place, while iterating, see peek, does not.
+
+    Parameters
+    ----------
+    path : str
+        The directory of the collection.
+    """
+
+    # chained on access, see ChainedCollection
+    lazy = True
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as fh:
+            self.manifest = json.load(fh)
+        self.key = self.manifest["key"]
+        if self.key not in SHARD_KEYS:
+            raise ValueError("unknown shard key {0!r} in {1}".format(self.key, path))
+        self.shards = {}
+        self.dirty = set()
+
+    @property
+    def ext(self):
+        return "." + self.manifest.get("format", "yaml")
+
+    def shard_of(self, doc):
+        """Returns the shard a document belongs in."""
+        if self.key == "year":
+            return doc_year(doc)
+        return self.shard_of_id(doc["_id"])
+
+    def shard_of_id(self, _id):
+        """Returns the shard of an _id, or None if it does not follow from
+        the _id alone."""
+        if self.key == "letter":
+            return id_letter(_id)
+        if self.key == "hash":
+            return id_hash(_id, self.manifest.get("hash_shards", DEFAULT_HASH_SHARDS))
+        return None
+
+    def shards_for(self, filter):
+        """Returns the names of the shards that may hold the documents
+        matching a filter."""
+        if self.key == "year" and "year" in filter:
+            names = [str(filter["year"])]
+        elif "_id" in filter and self.shard_of_id(filter["_id"]) is not None:
+            names = [self.shard_of_id(filter["_id"])]
+        else:
+            names = list(self.shard_names())
+        return [name for name in names if name in self.manifest["shards"] or name in self.shards]
+
+    def shard_names(self):
+        names = list(self.manifest["shards"])
+        names.extend(name for name in self.shards if name not in self.manifest["shards"])
+        return names
+
+    def shard(self, name):
+        """Returns the documents of a shard, reading it if need be."""
+        if name not in self.shards:
+            filename = os.path.join(self.path, name + self.ext)
+            self.shards[name] = read_shard(filename) if os.path.exists(filename) else {}
+        return self.shards[name]
+
+    def _find(self, _id):
+        """Returns the name of the shard holding an _id, or None."""
+        for name in self.shards_for({"_id": _id}):
+            if _id in self.shard(name):
+                return name
+        return None
+
+    def scan(self, filter):
+        """Yields the _id and document of everything in the shards that may
+        hold documents matching filter, one shard at a time."""
+        for name in self.shards_for(filter):
+            yield from self.shard(name).items()
+
+    def peek(self, _id):
+        """Returns a document without marking its shard as changed."""
+        name = self._find(_id)
+        if name is None:
+            raise KeyError(_id)
+        return self.shards[name][_id]
+
+    def __getitem__(self, _id):
+        name = self._find(_id)
+        if name is None:
+            raise KeyError(_id)
+        self.dirty.add(name)
+        return self.shards[name][_id]
+
+    def __setitem__(self, _id, doc):
+        name = self.shard_of(doc)
+        old = self._find(_id)
+        if old is not None and old != name:
+            del self.shards[old][_id]
+            self.dirty.add(old)
+        self.shard(name)[_id] = doc
+        self.dirty.add(name)
+
+    def __delitem__(self, _id):
+        name = self._find(_id)
+        if name is None:
+            raise KeyError(_id)
+        del self.shards[name][_id]
+        self.dirty.add(name)
+
+    def __contains__(self, _id):
+        return self._find(_id) is not None
+
+    def __iter__(self):
+        for name in self.shard_names():
+            yield from list(self.shard(name))
+
+    def __len__(self):
+        return sum(
+            len(self.shards[name]) if name in self.shards else self.manifest["shards"][name]["count"]
+            for name in self.shard_names()
+        )
+
+    def values(self):
+        return PeekValuesView(self)
+
+    def items(self):
+        return PeekItemsView(self)
+
+    def dump(self):
+        """Writes the shards that changed, and the manifest, and returns the
+        files written, relative to the directory of the collection."""
+        written = []
+        for name in sorted(self.dirty):
+            filename = os.path.join(self.path, name + self.ext)
+            if len(self.shards[name]) == 0:
+                self.manifest["shards"].pop(name, None)
+                if os.path.exists(filename):
+                    os.remove(filename)
+            else:
+                write_shard(filename, self.shards[name])
+                self.manifest["shards"][name] = {"count": len(self.shards[name])}
+            written.append(name + self.ext)
+        if written:
+            write_manifest(self.path, self.manifest)
+            written.append(MANIFEST)
+        self.dirty = set()
+        return written
+
+
+def write_manifest(path, manifest):
+    manifest["shards"] = dict(sorted(manifest["shards"].items()))
+    with open(os.path.join(path, MANIFEST), "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+        fh.write("\n")
+
+
+def split_collection(docs, path, key="year", fmt="yaml", hash_shards=DEFAULT_HASH_SHARDS):
+    """Writes the documents of a collection as a partitioned collection.
+
+    Parameters
+    ----------
+    docs : dict
+        The documents, by _id.
+    path : str
+        The directory to write the shards and manifest to.
+    key : str, optional
+        The shard key, "year", "letter" or "hash", defaults to "year".
+    fmt : str, optional
+        The format of the shard files, "yaml" or "json", defaults to "yaml",
+        and may name a compression too, such as "yaml.gz".
+    hash_shards : int, optional
+        The number of shards when sharding by hash, defaults to 16.
+
+    Returns
+    -------
+    coll : PartitionedCollection
+    """
+    if key not in SHARD_KEYS:
+        raise ValueError("shard key must be one of {0}, not {1!r}".format(", ".join(SHARD_KEYS), key))
+    os.makedirs(path, exist_ok=True)
+    manifest = {"key": key, "format": fmt, "shards": {}}
+    if key == "hash":
+        manifest["hash_shards"] = hash_shards
+    write_manifest(path, manifest)
+    coll = PartitionedCollection(path)
+    for _id, doc in docs.items():
+        coll[_id] = doc
+    coll.dump()
+    return coll
+
+
+def merge_collection(path):
+    """Returns every document of a partitioned collection, by _id."""
+    coll = PartitionedCollection(path)
+    return {_id: coll.peek(_id) for _id in coll}
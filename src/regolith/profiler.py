@@ -0,0 +1,133 @@
+"""A lightweight phase profiler, writing Chrome (and Perfetto) traces.
+
+Spans mark the coarse phases of a run, loading and dumping databases,
+building, rendering and the subprocesses that regolith waits on, such as
+git and latex::
+
+    from regolith.profiler import span
+
+    with span("load_database", db=db["name"]):
+        ...
+
+While the profiler is disabled, which it is unless ``--profile`` is given,
+entering and leaving a span costs a single attribute check. While it is
+enabled each span records one complete event, so it is cheap enough to
+leave on for whole production runs.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+_PID = os.getpid()
+
+
+class Profiler(object):
+    """Collects the spans of a run as Chrome trace complete events.
+
+    Parameters
+    ----------
+    enabled : bool, optional
+        Whether spans are recorded, defaults to False
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.events = []
+        self.origin = time.perf_counter()
+
+    def enable(self):
+        """Starts recording spans, timed from now."""
+        self.enabled = True
+        self.events = []
+        self.origin = time.perf_counter()
+
+    def disable(self):
+        """Stops recording spans."""
+        self.enabled = False
+
+    def span(self, name, cat="regolith", **args):
+        """Returns a context manager that records the time spent in it as
+        an event called name, with args as its arguments."""
+        return Span(self, name, cat, args)
+
+    def record(self, name, cat, start, end, args):
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": (start - self.origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": _PID,
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = {k: str(v) for k, v in args.items()}
+        # appending to a list is atomic, so spans may end on any thread
+        self.events.append(event)
+
+    def trace(self):
+        """Returns the recorded spans as a Chrome trace."""
+        return {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+
+    def write_trace(self, filename):
+        """Writes the recorded spans as a Chrome trace, which can be opened
+        in chrome://tracing or https://ui.perfetto.dev."""
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(self.trace(), f)
+
+    def summary(self):
+        """Returns the count, total, mean and max duration, in seconds, of
+        the spans of each name, the longest total first."""
+        totals = {}
+        for event in self.events:
+            count, total, longest = totals.get(event["name"], (0, 0.0, 0.0))
+            dur = event["dur"] / 1e6
+            totals[event["name"]] = (count + 1, total + dur, max(longest, dur))
+        rows = [(name, count, total, total / count, longest) for name, (count, total, longest) in totals.items()]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def print_summary(self, file=None):
+        """Prints the summary as a table, to stderr by default."""
+        if file is None:
+            file = sys.stderr
+        rows = self.summary()
+        if len(rows) == 0:
+            return
+        width = max(len("span"), max(len(row[0]) for row in rows))
+        print(f"{'span':<{width}} {'count':>7} {'total s':>10} {'mean s':>10} {'max s':>10}", file=file)
+        for name, count, total, mean, longest in rows:
+            print(f"{name:<{width}} {count:>7} {total:>10.3f} {mean:>10.3f} {longest:>10.3f}", file=file)
+
+
+class Span(object):
+    """A context manager that records the time spent in it with a profiler."""
+
+    __slots__ = ("profiler", "name", "cat", "args", "start")
+
+    def __init__(self, profiler, name, cat, args):
+        self.profiler = profiler
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        if self.profiler.enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.start is not None:
+            self.profiler.record(self.name, self.cat, self.start, time.perf_counter(), self.args)
+        return False
+
+
+PROFILER = Profiler()
+
+
+def span(name, cat="regolith", **args):
+    """Returns a span of the global profiler, see Profiler.span."""
+    return PROFILER.span(name, cat=cat, **args)
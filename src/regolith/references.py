@@ -0,0 +1,108 @@
+"""A reverse index from people to the documents that refer to them."""
+
+from collections import defaultdict
+from collections.abc import Mapping
+
+# the fields, as dotted paths through lists and dicts, where each collection
+# refers to people, by name, alias or id
+REFERENCES = {
+    "grants": ("team.name",),
+    "proposals": ("team.name",),
+    "projects": ("team.name",),
+    "presentations": ("authors",),
+    "patents": ("inventors",),
+    "people": ("employment.advisor", "education.advisor"),
+    "projecta": ("lead",),
+}
+
+
+def path_values(doc, path):
+    """Yields the values at a dotted path in a document, descending into
+    every item of the lists along the way."""
+    values = [doc]
+    for key in path.split("."):
+        found = []
+        for value in values:
+            for item in value if isinstance(value, list) else [value]:
+                if isinstance(item, Mapping) and key in item:
+                    found.append(item[key])
+        values = found
+    for value in values:
+        yield from value if isinstance(value, list) else [value]
+
+
+class ReferenceIndex(object):
+    """Maps each person to the documents that refer to them, so that "every
+    document this person is on" does not need a scan of every collection
+    per person.
+
+    Every value at the REFERENCES paths is indexed twice, as it is written
+    and under the _id of the person it resolves to. Names are resolved as
+    ``fuzzy_retrieval(people, ["aka", "name", "_id"], name, case_sensitive=False)``
+    does, the first person with a matching id, name or alias, ignoring case.
+
+    Parameters
+    ----------
+    collections : dict
+        Maps collection names to their documents.
+    people : iterable of dict, optional
+        The people that names are resolved to, defaults to the people
+        collection.
+    """
+
+    def __init__(self, collections, people=None):
+        if people is None:
+            people = collections.get("people", ())
+        self.people = {}
+        self.aliases = {}
+        for person in people:
+            self.people.setdefault(person["_id"], person)
+            aka = person.get("aka", [])
+            for name in (aka if isinstance(aka, list) else [aka]) + [person.get("name"), person["_id"]]:
+                if isinstance(name, str):
+                    self.aliases.setdefault(name.lower(), person["_id"])
+        # value or person id -> collection -> [(doc _id, path)]
+        self.by_value = defaultdict(lambda: defaultdict(list))
+        self.by_person = defaultdict(lambda: defaultdict(list))
+        for collname, paths in REFERENCES.items():
+            for doc in collections.get(collname, ()):
+                for path in paths:
+                    for value in path_values(doc, path):
+                        if not isinstance(value, str):
+                            continue
+                        ref = (doc["_id"], path)
+                        self.by_value[value][collname].append(ref)
+                        person_id = self.resolve(value)
+                        if person_id is not None:
+                            self.by_person[person_id][collname].append(ref)
+
+    def resolve(self, name):
+        """Returns the _id of the person a name, alias or id refers to, or None."""
+        if not isinstance(name, str):
+            return None
+        return self.aliases.get(name.lower())
+
+    def person(self, name):
+        """Returns the person a name, alias or id refers to, or None."""
+        return self.people.get(self.resolve(name))
+
+    def references(self, person_id):
+        """Returns every reference to a person, as (collection, doc _id, path) tuples."""
+        return [
+            (collname, _id, path)
+            for collname, refs in self.by_person.get(person_id, {}).items()
+            for _id, path in refs
+        ]
+
+    def referencing(self, collname, values):
+        """Returns the _ids of the documents of a collection that contain any
+        of values, exactly as written, at one of their reference paths."""
+        ids = set()
+        for value in values:
+            ids.update(_id for _id, _ in self.by_value.get(value, {}).get(collname, ()))
+        return ids
+
+    def referencing_person(self, collname, person_id):
+        """Returns the _ids of the documents of a collection that refer to a
+        person, by any of their names."""
+        return {_id for _id, _ in self.by_person.get(person_id, {}).get(collname, ())}
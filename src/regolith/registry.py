@@ -0,0 +1,50 @@
+"""Lazily loaded registries of builders and helpers."""
+
+import importlib
+from collections.abc import Mapping
+
+
+def load_object(spec):
+    """Imports and returns the object named by a ``"module:attribute"`` string."""
+    modname, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(modname), attr)
+
+
+class LazyRegistry(Mapping):
+    """A mapping from target names to the objects that implement them.
+
+    The values are given as ``"module:attribute"`` strings, or tuples of them,
+    and are only imported when a target is looked up. Listing the targets
+    never imports anything, so the command line can show its help without
+    loading the heavy dependencies of every builder and helper.
+
+    Parameters
+    ----------
+    specs : dict
+        Maps target names to specs.
+    """
+
+    def __init__(self, specs):
+        self.specs = dict(specs)
+        self._loaded = {}
+
+    def __getitem__(self, key):
+        if key not in self._loaded:
+            spec = self.specs[key]
+            if isinstance(spec, tuple):
+                self._loaded[key] = tuple(load_object(s) for s in spec)
+            else:
+                self._loaded[key] = load_object(spec)
+        return self._loaded[key]
+
+    def __iter__(self):
+        return iter(self.specs)
+
+    def __len__(self):
+        return len(self.specs)
+
+    def __contains__(self, key):
+        return key in self.specs
+
+    def __repr__(self):
+        return "{0}({1!r})".format(self.__class__.__name__, self.specs)
@@ -1,7 +1,11 @@
 """Database schemas, examples, and tools"""
 
 import copy
+import hashlib
 import json
+import os
+import pickle
+import tempfile
 from pathlib import Path
 from warnings import warn
 
@@ -9,6 +13,7 @@ from cerberus import Validator
 from flatten_dict import flatten, unflatten
 
 from .sorters import POSITION_LEVELS
+from .version import __version__
 
 SORTED_POSITION = sorted(POSITION_LEVELS.keys(), key=POSITION_LEVELS.get)
 PROJECTUM_ACTIVE_STATI = ["proposed", "converged", "started"]
@@ -155,17 +160,107 @@ def load_exemplars():
     return exemplars
 
 
-EXEMPLARS = load_exemplars()
-SCHEMAS = load_schemas()
+def _compile_schemas(user_schema=None):
+    schemas = load_schemas()
+    for s in schemas:
+        schemas[s]["files"] = {
+            "description": "Files associated with the document",
+            # TODO: fix this since this is currently comming out a CommentedMap (+1: Yevgeny)
+            # "type": "list",
+            # "schema": {"type": "string"},
+            "required": False,
+        }
+    if user_schema:
+        from regolith.tools import update_schemas
 
-for s in SCHEMAS:
-    SCHEMAS[s]["files"] = {
-        "description": "Files associated with the document",
-        # TODO: fix this since this is currently comming out a CommentedMap (+1: Yevgeny)
-        # "type": "list",
-        # "schema": {"type": "string"},
-        "required": False,
-    }
+        schemas = update_schemas(schemas, user_schema)
+    return schemas
+
+
+# where compiled schemas are cached, defaults to a regolith dir in the user cache dir
+SCHEMA_CACHE_DIR = None
+# bump when what is pickled changes in a way the compile code does not show
+CACHE_FORMAT = 1
+_COMPILED_SCHEMAS = {}
+
+
+def schema_cache_dir():
+    """Returns the directory that compiled schemas for this version of regolith are cached in."""
+    cachedir = SCHEMA_CACHE_DIR
+    if cachedir is None:
+        cachedir = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "regolith")
+    return os.path.join(cachedir, "schemas", __version__)
+
+
+def schema_cache_key(user_schema=None):
+    """Returns a hash of everything that goes into the compiled schemas,
+    the code that compiles them included, as the version is the same for
+    every development build."""
+    h = hashlib.sha256()
+    h.update(str(CACHE_FORMAT).encode())
+    h.update(Path(__file__).read_bytes())
+    h.update((Path(__file__).parent / "schemas.json").read_bytes())
+    h.update(json.dumps(alloweds, sort_keys=True).encode())
+    h.update(json.dumps(user_schema, sort_keys=True, default=str).encode())
+    if user_schema:
+        import inspect
+
+        from regolith.tools import update_schemas
+
+        h.update(inspect.getsource(update_schemas).encode())
+    return h.hexdigest()
+
+
+def compiled_schemas(user_schema=None):
+    """Returns the schemas with the allowed lists inserted and the user schema
+    merged in.
+
+    Compiling the schemas is slow, so the result is pickled in the schema
+    cache dir under a hash of its inputs and later runs load it in one step.
+    The returned schemas are shared by every caller with the same user schema
+    and must not be modified.
+
+    Parameters
+    ----------
+    user_schema : dict, optional
+        The user defined schema, see the ``schemas`` run control key.
+
+    Returns
+    -------
+    schemas : dict
+        The compiled schemas.
+    """
+    key = schema_cache_key(user_schema)
+    if key in _COMPILED_SCHEMAS:
+        return _COMPILED_SCHEMAS[key]
+    filename = os.path.join(schema_cache_dir(), key + ".pkl")
+    try:
+        with open(filename, "rb") as f:
+            schemas = pickle.load(f)
+    except Exception:
+        # a missing, truncated or incompatible cache is compiled again
+        schemas = _compile_schemas(user_schema)
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(filename), delete=False) as f:
+                pickle.dump(schemas, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f.name, filename)
+        except OSError:
+            # a read only cache only costs us the speed up
+            pass
+    _COMPILED_SCHEMAS[key] = schemas
+    return schemas
+
+
+# SCHEMAS and EXEMPLARS are large, so they are only loaded on first access
+_LAZY_LOADERS = {"EXEMPLARS": load_exemplars, "SCHEMAS": compiled_schemas}
+
+
+def __getattr__(name):
+    if name in _LAZY_LOADERS:
+        value = globals()[name] = _LAZY_LOADERS[name]()
+        return value
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
 
 
 class NoDescriptionValidator(Validator):
@@ -0,0 +1,233 @@
+"""Binary snapshots of the fully chained databases, for fast cold starts.
+
+``regolith snapshot`` loads every database, chains them, and writes the
+result to a single file, by default ``regolith.snapshot``, which holds
+
+* a line identifying the file and the version of its format,
+* a JSON manifest of the databases and of the size, modification time and
+  SHA-256 hash of every file in them, on a line of its own, and
+* a pickle of the collections of each database together with the chained
+  collections built from them.
+
+The chained documents in the pickle are the very documents of the databases
+they came from, as they are when the databases are loaded, so that writes
+are routed to the database each document came from. ``open_dbs`` loads the
+snapshot in place of the databases whenever the manifest still matches the
+databases on disk, and loads the databases as usual otherwise.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import platform
+import sys
+from collections import defaultdict
+
+from regolith import __version__
+from regolith.lazyjson import INDEX_EXT
+from regolith.tools import dbpathname
+
+SNAPSHOT_FILENAME = "regolith.snapshot"
+MAGIC = b"regolith-snapshot"
+FORMAT_VERSION = 2
+
+# the fields of a database that decide what is loaded from it
+DB_FIELDS = ("name", "url", "path", "backend", "local", "public")
+
+
+def snapshot_filename(rc):
+    """Gets the path to the snapshot, the 'snapshot' rc key or
+    regolith.snapshot in the current directory."""
+    return getattr(rc, "snapshot", None) or SNAPSHOT_FILENAME
+
+
+def can_snapshot(rc):
+    """Whether all the databases are filesystem databases, either local or
+    git ones, which are the ones that snapshots hold."""
+    for db in rc.databases:
+        if db.get("backend", "filesystem") not in ("filesystem", "fs"):
+            return False
+        if db["url"].startswith("hg+"):
+            return False
+    return True
+
+
+def source_files(dbpath):
+    """Lists the files of a database directory, relative to it, leaving out
+    hidden directories, such as .git, and lazy JSON indexes."""
+    files = []
+    for root, dirs, names in os.walk(dbpath):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(names):
+            if name.endswith(INDEX_EXT) or name.startswith("."):
+                continue
+            files.append(os.path.relpath(os.path.join(root, name), dbpath))
+    return files
+
+
+def file_hash(filename):
+    """Returns the SHA-256 hash of a file, as a hex string."""
+    h = hashlib.sha256()
+    with open(filename, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _environment(rc):
+    return {
+        "version": FORMAT_VERSION,
+        "regolith": __version__,
+        "python": platform.python_version(),
+        # the backend is filled in when the databases are first opened
+        "databases": [
+            dict({"backend": "filesystem"}, **{k: db[k] for k in DB_FIELDS if k in db}) for db in rc.databases
+        ],
+    }
+
+
+def build_manifest(rc):
+    """Returns the manifest of the databases as they are on disk."""
+    manifest = _environment(rc)
+    manifest["files"] = {}
+    for db in rc.databases:
+        dbpath = dbpathname(db, rc)
+        files = manifest["files"][db["name"]] = {}
+        for f in source_files(dbpath):
+            st = os.stat(os.path.join(dbpath, f))
+            files[f] = [st.st_size, st.st_mtime_ns, file_hash(os.path.join(dbpath, f))]
+    return manifest
+
+
+def is_current(manifest, rc):
+    """Whether a manifest matches the databases on disk.
+
+    The files are compared by size first, and only hashed when their
+    modification time differs from the one in the manifest, as it does
+    after a fresh clone.
+    """
+    if {k: v for k, v in manifest.items() if k != "files"} != _environment(rc):
+        return False
+    for db in rc.databases:
+        dbpath = dbpathname(db, rc)
+        files = manifest["files"].get(db["name"], {})
+        if set(source_files(dbpath)) != set(files):
+            return False
+        for f, (size, mtime_ns, sha) in files.items():
+            filename = os.path.join(dbpath, f)
+            st = os.stat(filename)
+            if st.st_size != size:
+                return False
+            if st.st_mtime_ns != mtime_ns and file_hash(filename) != sha:
+                return False
+    return True
+
+
+def _fs_client(client):
+    from regolith.fsclient import FileSystemClient
+
+    for c in client.clients:
+        if isinstance(c, FileSystemClient):
+            return c
+    return None
+
+
+def write_snapshot(client, rc, filename=None):
+    """Writes the databases of a client, as loaded by open_dbs, and their
+    chained collections to a snapshot.
+
+    Parameters
+    ----------
+    client : ClientManager
+        The client that the databases were loaded with.
+    rc : RunControl
+        The rc with the databases.
+    filename : str, optional
+        Where to write the snapshot, defaults to snapshot_filename(rc).
+
+    Returns
+    -------
+    filename : str
+    """
+    filename = filename or snapshot_filename(rc)
+    if not can_snapshot(rc):
+        raise ValueError("snapshots only hold local and git filesystem databases")
+    fs = _fs_client(client)
+    for dbname, colls in fs.dbs.items():
+        for collname, coll in colls.items():
+            if getattr(coll, "lazy", False):
+                raise ValueError(
+                    "{0}/{1} is loaded lazily, lazy_json and partitioned collections cannot be "
+                    "snapshotted".format(dbname, collname)
+                )
+    manifest = build_manifest(rc)
+    # one pickle keeps the documents shared between the databases and the
+    # chained collections
+    state = {
+        "dbs": {dbname: {k: dict(v) for k, v in colls.items()} for dbname, colls in fs.dbs.items()},
+        "chained_db": client.chained_db,
+        "filetypes": fs._collfiletypes,
+        "exts": fs._collexts,
+        "codecs": fs._collcodecs,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    tmp = filename + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(MAGIC + b"\n")
+        fh.write(json.dumps(manifest, sort_keys=True).encode("utf-8") + b"\n")
+        pickle.dump(state, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, filename)
+    return filename
+
+
+def read_manifest(fh):
+    """Reads the manifest of an open snapshot, leaving the file at the start
+    of its pickle. Returns None if the file is not a snapshot of the current
+    format."""
+    if fh.readline().rstrip(b"\n") != MAGIC:
+        return None
+    try:
+        manifest = json.loads(fh.readline())
+    except ValueError:
+        return None
+    if not isinstance(manifest, dict) or manifest.get("version") != FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def load_snapshot(client, rc, filename=None):
+    """Loads a snapshot into a client in place of its databases, if the
+    snapshot matches the databases on disk.
+
+    Returns
+    -------
+    loaded : bool
+        Whether the snapshot was loaded.
+    """
+    from regolith.fsclient import journal_enabled
+
+    filename = filename or snapshot_filename(rc)
+    if not os.path.isfile(filename) or not can_snapshot(rc):
+        return False
+    fs = _fs_client(client)
+    if fs is None:
+        return False
+    with open(filename, "rb") as fh:
+        manifest = read_manifest(fh)
+        if manifest is None or not is_current(manifest, rc):
+            print("snapshot {0} is out of date, loading the databases".format(filename), file=sys.stderr)
+            return False
+        state = pickle.load(fh)
+    fs.dbs = defaultdict(lambda: defaultdict(dict))
+    for dbname, colls in state["dbs"].items():
+        fs.dbs[dbname].update(colls)
+    fs._collfiletypes.update(state["filetypes"])
+    fs._collexts.update(state["exts"])
+    fs._collcodecs.update(state["codecs"])
+    for db in rc.databases:
+        fs.drop_indexes(db["name"])
+        if journal_enabled(db, rc):
+            fs._journaling.add(db["name"])
+    client.chained_db = state["chained_db"]
+    return True
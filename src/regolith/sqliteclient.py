@@ -0,0 +1,249 @@
+"""Contains a client database backed by a single SQLite file.
+
+Documents are stored as JSON, one row per document, with generated and
+indexed columns for the fields that regolith most often looks documents up
+by. This gives indexed ``find_one`` queries and per-collection partial loads
+without needing a database server.
+"""
+
+import os
+import sqlite3
+import sys
+from collections import defaultdict
+from copy import deepcopy
+
+from regolith import fsclient
+from regolith.fsclient import decode_doc, encode_doc
+from regolith.tools import dbpathname
+
+SQLITE_FILENAME = "regolith.sqlite"
+
+# columns generated from the JSON document, these are indexed
+INDEXED_FIELDS = ("name", "aka", "date", "begin_date", "end_date")
+
+# scalar types that can be compared directly against the JSON columns
+SQL_SCALARS = (str, int, float)
+
+
+def _generated_column(field):
+    # dates are stored tagged, see encode_doc, so look through the tag
+    return (
+        "{0} GENERATED ALWAYS AS (coalesce(json_extract(doc, '$.{0}.\"$date\"'), "
+        "json_extract(doc, '$.{0}'))) VIRTUAL".format(field)
+    )
+
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS documents ("
+    "coll TEXT NOT NULL, "
+    "_id TEXT NOT NULL, "
+    "doc TEXT NOT NULL, " + ", ".join(_generated_column(f) for f in INDEXED_FIELDS) + ", PRIMARY KEY (coll, _id))",
+] + ["CREATE INDEX IF NOT EXISTS documents_{0} ON documents (coll, {0})".format(f) for f in INDEXED_FIELDS]
+
+
+def sqlite_filename(db, rc):
+    """Gets the path to the SQLite file of a database."""
+    return os.path.join(dbpathname(db, rc), db.get("sqlite_file", SQLITE_FILENAME))
+
+
+def _wanted(collname, db):
+    """Whether a collection passes the whitelist and blacklist of a database."""
+    whitelist = db.get("whitelist", [])
+    if len(whitelist) != 0:
+        return collname in whitelist
+    return collname not in db.get("blacklist", [])
+
+
+class SQLiteClient:
+    """A client database backed by SQLite."""
+
+    def __init__(self, rc):
+        self.rc = rc
+        self.closed = True
+        self.dbs = None
+        self.chained_db = None
+        self.conns = {}
+        self.open()
+
+    def is_alive(self):
+        return not self.closed
+
+    def open(self):
+        if self.closed:
+            self.dbs = defaultdict(lambda: defaultdict(dict))
+            self.chained_db = {}
+            self.conns = {}
+            self.closed = False
+
+    def connect(self, db):
+        """Returns the connection for a database, creating its file and tables
+        if need be."""
+        if db["name"] not in self.conns:
+            filename = sqlite_filename(db, self.rc)
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            conn = sqlite3.connect(filename)
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self.conns[db["name"]] = conn
+        return self.conns[db["name"]]
+
+    def stored_collection_names(self, db):
+        """Returns the names of the collections stored in the SQLite file."""
+        conn = self.connect(db)
+        return [row[0] for row in conn.execute("SELECT DISTINCT coll FROM documents ORDER BY coll")]
+
+    def load_database(self, db):
+        """Loads the collections of a database that pass its white and
+        blacklists."""
+        conn = self.connect(db)
+        for collname in self.stored_collection_names(db):
+            if not _wanted(collname, db):
+                continue
+            coll = self.dbs[db["name"]][collname]
+            for _id, doc in conn.execute("SELECT _id, doc FROM documents WHERE coll = ?", (collname,)):
+                coll[_id] = decode_doc(doc)
+
+    def dump_database(self, db):
+        """Writes the in-memory collections of a database to the SQLite file,
+        only touching the documents that changed, and returns the file name."""
+        conn = self.connect(db)
+        for collname, collection in self.dbs[db["name"]].items():
+            stored = dict(conn.execute("SELECT _id, doc FROM documents WHERE coll = ?", (collname,)))
+            encoded = {_id: encode_doc(doc) for _id, doc in collection.items()}
+            conn.executemany(
+                "INSERT OR REPLACE INTO documents (coll, _id, doc) VALUES (?, ?, ?)",
+                [(collname, _id, doc) for _id, doc in encoded.items() if stored.get(_id) != doc],
+            )
+            conn.executemany(
+                "DELETE FROM documents WHERE coll = ? AND _id = ?",
+                [(collname, _id) for _id in stored if _id not in encoded],
+            )
+        conn.commit()
+        return [os.path.join(db["path"], db.get("sqlite_file", SQLITE_FILENAME))]
+
+    def import_database(self, db):
+        """Imports the JSON and YAML collection files of a database into its
+        SQLite file."""
+        dbpath = dbpathname(db, self.rc)
+        for f in sorted(os.listdir(dbpath)):
+            collname, ext = os.path.splitext(fsclient.split_codec(f)[0])
+            if not _wanted(collname, db) or f in db.get("blacklist", []):
+                continue
+            if ext == ".json":
+                docs = fsclient.load_json(os.path.join(dbpath, f))
+            elif ext in (".yaml", ".yml"):
+                docs = fsclient.load_yaml(os.path.join(dbpath, f))
+            else:
+                continue
+            journal = fsclient.journal_filename(dbpath, collname)
+            if os.path.exists(journal):
+                fsclient.replay_journal(journal, docs)
+            print("importing " + f + "...", file=sys.stderr)
+            self.dbs[db["name"]][collname].update(docs)
+        self.dump_database(db)
+
+    def export_database(self, db, ext=".yaml"):
+        """Exports every collection in the SQLite file of a database to a
+        YAML (or JSON) collection file next to it."""
+        self.load_database(db)
+        dbpath = dbpathname(db, self.rc)
+        for collname, collection in self.dbs[db["name"]].items():
+            f = os.path.join(dbpath, collname + ext)
+            print("exporting " + f + "...", file=sys.stderr)
+            if ext == ".json":
+                fsclient.dump_json(f, collection, date_handler=fsclient.date_encoder)
+            else:
+                fsclient.dump_yaml(f, deepcopy(collection))
+
+    def close(self):
+        for conn in self.conns.values():
+            conn.close()
+        self.conns = {}
+        self.dbs = None
+        self.closed = True
+
+    def keys(self):
+        return self.dbs.keys()
+
+    def __getitem__(self, key):
+        return self.dbs[key]
+
+    def collection_names(self, dbname, include_system_collections=True):
+        """Returns the collection names for a database."""
+        return set(self.dbs[dbname].keys())
+
+    def all_documents(self, collname, copy=True):
+        """Returns an iteratable over all documents in a collection."""
+        if copy:
+            return deepcopy(self.chained_db.get(collname, {})).values()
+        return self.chained_db.get(collname, {}).values()
+
+    def _write(self, dbname, collname, doc):
+        self.conns[dbname].execute(
+            "INSERT OR REPLACE INTO documents (coll, _id, doc) VALUES (?, ?, ?)",
+            (collname, doc["_id"], encode_doc(doc)),
+        )
+
+    def insert_one(self, dbname, collname, doc):
+        """Inserts one document to a database/collection."""
+        self.dbs[dbname][collname][doc["_id"]] = doc
+        self._write(dbname, collname, doc)
+
+    def insert_many(self, dbname, collname, docs):
+        """Inserts many documents into a database/collection."""
+        for doc in docs:
+            self.insert_one(dbname, collname, doc)
+
+    def delete_one(self, dbname, collname, doc):
+        """Removes a single document from a collection"""
+        del self.dbs[dbname][collname][doc["_id"]]
+        self.conns[dbname].execute("DELETE FROM documents WHERE coll = ? AND _id = ?", (collname, doc["_id"]))
+
+    def find_one(self, dbname, collname, filter):
+        """Finds the first document matching filter.
+
+        Scalar filter values are matched in SQL, against the indexed columns
+        where there is one, and the candidates are then checked in full.
+        """
+        clauses, params = ["coll = ?"], [collname]
+        for key, value in filter.items():
+            if not isinstance(value, SQL_SCALARS) or isinstance(value, bool):
+                continue
+            if key == "_id" or key in INDEXED_FIELDS:
+                clauses.append("{0} = ?".format(key))
+            else:
+                clauses.append("json_extract(doc, ?) = ?")
+                params.append('$."{0}"'.format(key))
+            params.append(value)
+        query = "SELECT _id, doc FROM documents WHERE " + " AND ".join(clauses)
+        coll = self.dbs[dbname][collname]
+        for _id, s in self.conns[dbname].execute(query, params):
+            doc = coll[_id] if _id in coll else decode_doc(s)
+            if all(key in doc and doc[key] == value for key, value in filter.items()):
+                return doc
+
+    def update_one(self, dbname, collname, filter, update, **kwargs):
+        """Updates one document."""
+        doc = self.find_one(dbname, collname, filter)
+        newdoc = dict(filter if doc is None else doc)
+        newdoc.update(update)
+        self.insert_one(dbname, collname, newdoc)
+
+    def bulk_write(self, dbname, collname, ops):
+        """Applies a batch of queued writes to a collection in a single
+        transaction, see ClientManager.batch, and returns the counts of each
+        kind of write."""
+        counts = {"inserted": 0, "updated": 0, "deleted": 0}
+        with self.conns[dbname]:
+            for op in ops:
+                if op[0] == "insert":
+                    self.insert_one(dbname, collname, op[1])
+                    counts["inserted"] += 1
+                elif op[0] == "delete":
+                    self.delete_one(dbname, collname, op[1])
+                    counts["deleted"] += 1
+                else:
+                    existed = self.find_one(dbname, collname, op[1]) is not None
+                    self.update_one(dbname, collname, op[1], op[2], **op[3])
+                    counts["updated" if existed else "inserted"] += 1
+        return counts
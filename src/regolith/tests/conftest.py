@@ -292,6 +292,33 @@ def make_mixed_db():
         rmtree(repo)
 
 
+# the size of the synthetic bibliography that ingest is benchmarked on
+SYNTHETIC_BIB_ENTRIES = 10000
+
+
+def write_synthetic_bib(filename, n):
+    """Writes a .bib file of n synthetic articles with the ids paper00000, paper00001, ..."""
+    with open(filename, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(
+                "@article{{paper{0:05d},\n"
+                "  author = {{Doe, Jane and Roe, Richard and Smith, A. B.}},\n"
+                "  title = {{A synthetic   paper number {0}}},\n"
+                "  journal = {{Journal of Synthetic Results}},\n"
+                "  year = {{{1}}},\n"
+                "  volume = {{{2}}},\n"
+                "  pages = {{{0}--{3}}},\n"
+                "}}\n\n".format(i, 1990 + i % 30, i % 100, i + 10)
+            )
+    return filename
+
+
+@pytest.fixture(scope="session")
+def synthetic_bib(tmp_path_factory):
+    """A .bib file of SYNTHETIC_BIB_ENTRIES synthetic articles."""
+    return write_synthetic_bib(str(tmp_path_factory.mktemp("bib") / "synthetic.bib"), SYNTHETIC_BIB_ENTRIES)
+
+
 @pytest.fixture(scope="session")
 def make_bad_db():
     """A test fixutre that creates and destroys a git repo in a temporary
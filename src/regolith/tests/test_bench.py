@@ -0,0 +1,50 @@
+import json
+import os
+
+import pytest
+
+from regolith.bench import BENCHMARKS, compare, run_benchmarks, synthesize, write_database
+from regolith.fsclient import load_yaml
+from regolith.schemas import EXEMPLARS, SCHEMAS, validate
+
+
+def test_synthesize():
+    collections = synthesize(scale=2, counts={"citations": 5})
+    assert len(collections["people"]) == 2 * len(EXEMPLARS["people"])
+    assert len(collections["citations"]) == 5
+    assert "scopatz" in collections["people"] and "scopatz-1" in collections["people"]
+    assert collections["people"]["scopatz-1"]["name"] == "Anthony 1 Scopatz"
+    names = [person["name"] for person in collections["people"].values()]
+    assert len(set(names)) == len(names)
+    for collname, docs in collections.items():
+        for _id, doc in docs.items():
+            assert doc["_id"] == _id
+            valid, errors = validate(collname, doc, SCHEMAS)
+            assert valid, (collname, _id, errors)
+
+
+def test_write_database(tmp_path):
+    collections = write_database(str(tmp_path), scale=2)
+    with open(tmp_path / "regolithrc.json") as f:
+        rc = json.load(f)
+    assert rc["databases"][0]["url"] == str(tmp_path)
+    assert load_yaml(str(tmp_path / "db" / "people.yaml")).keys() == collections["people"].keys()
+
+
+def test_run_benchmarks(tmp_path, capsys):
+    cwd = os.getcwd()
+    results = run_benchmarks(scales=[1], repeat=2, only=["load", "helper-lister"], directory=str(tmp_path))
+    assert os.getcwd() == cwd
+    names = [r["name"] for r in results["results"]]
+    assert names == ["load", "load.load_database", "load.chain", "helper-lister"]
+    assert all(len(r["times"]) == 2 and r["min"] <= r["median"] for r in results["results"])
+    compare(results, results)
+    assert "1.00x" in capsys.readouterr().out
+    with pytest.raises(ValueError):
+        run_benchmarks(only=["nope"])
+
+
+@pytest.mark.skipif("REGOLITH_BENCHMARK" not in os.environ, reason="set REGOLITH_BENCHMARK to run benchmarks")
+def test_all_benchmarks(tmp_path):
+    results = run_benchmarks(scales=[1, 10], repeat=1, directory=str(tmp_path))
+    assert {r["name"] for r in results["results"]} >= set(BENCHMARKS)
@@ -10,6 +10,7 @@ import openpyxl
 import pytest
 
 from regolith.broker import load_db
+from regolith.builders.coabuilder import CollaborationGraph
 from regolith.main import main
 
 builder_map = [
@@ -335,3 +336,35 @@ def test_builder_python(bm, db_src, make_db, make_mongodb, monkeypatch):
         # Skip because of a date time in
         if file != "rss.xml":
             assert expected == actual
+
+
+def test_collaboration_graph():
+    people = [
+        {
+            "_id": "sbillinge",
+            "name": "Simon Billinge",
+            "aka": ["S. J. L. Billinge"],
+            "employment": [{"advisor": "someone"}],
+        },
+        {
+            "_id": "student",
+            "name": "A Student",
+            "education": [{"advisor": "sbillinge"}, {"advisor": "Simon Billinge"}],
+        },
+    ]
+    contacts = [{"_id": "cfriend", "name": "Colleague Friend", "aka": ["simon billinge"]}]
+    citations = [
+        {"_id": "p1", "author": ["S. J. L. Billinge", "C. Friend"]},
+        {"_id": "p2", "author": ["C. Friend"]},
+        {"_id": "p3", "editor": ["Simon Billinge"]},
+    ]
+    graph = CollaborationGraph(people, contacts, citations)
+    assert graph.person("SBILLINGE") is people[0]
+    assert graph.person("cfriend") is None
+    assert graph.find("cfriend") is contacts[0]
+    # people come before contacts
+    assert graph.find("simon billinge") is people[0]
+    names = people[0]["aka"] + [people[0]["name"]]
+    assert [c["_id"] for c in graph.publications(names)] == ["p1", "p3"]
+    assert graph.advisee_candidates(names + ["sbillinge"]) == [people[1]]
+    assert graph.advisee_candidates(["nobody"]) == []
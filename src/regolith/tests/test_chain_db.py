@@ -1,4 +1,4 @@
-from regolith.chained_db import ChainDB
+from regolith.chained_db import ChainDB, ChainedCollection
 
 
 def test_dddi():
@@ -156,3 +156,23 @@ def test_dicts_in_lists_mutation():
     extend_list = z["a"]["b"]
     extend_list.extend([{"hi": "world"}, {"spam": "eggs"}])
     assert z["a"]["b"] != extend_list
+
+
+def test_chained_collection():
+    first = {"a": {"_id": "a", "x": 0, "l": [1]}, "b": {"_id": "b", "x": 1}}
+    second = {"a": {"_id": "a", "x": 2, "l": [2]}, "c": {"_id": "c", "x": 3}}
+    chained = ChainedCollection([first])
+    chained.add(second)
+    assert list(chained) == ["a", "b", "c"]
+    assert len(chained) == 3 and "c" in chained and "d" not in chained
+    # the same documents as chaining into a dict of ChainDBs
+    expected = {}
+    for coll in (first, second):
+        for k, v in coll.items():
+            if k in expected:
+                expected[k].maps.append(v)
+            else:
+                expected[k] = ChainDB(v)
+    assert {k: dict(v) for k, v in chained.items()} == {k: dict(v) for k, v in expected.items()}
+    assert chained["a"]["l"] == [1, 2]
+    assert [doc["x"] for doc in chained.values()] == [2, 1, 3]
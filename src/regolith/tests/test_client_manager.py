@@ -2,8 +2,9 @@ import os
 from copy import copy, deepcopy
 
 import pytest
+from ruamel.yaml.parser import ParserError
 
-from regolith.database import connect
+from regolith.database import connect, open_dbs
 from regolith.runcontrol import DEFAULT_RC, load_rcfile
 from regolith.schemas import EXEMPLARS
 from regolith.tools import all_docs_from_collection
@@ -24,3 +25,181 @@ def test_collection_retrieval_python(make_mixed_db):
     mongo_expected_dict = deepcopy(EXEMPLARS[mongo_coll])
     assert fs_test_dict == fs_expected_dict
     assert mongo_test_dict == mongo_expected_dict
+
+
+def test_find_and_lookup(make_db):
+    repo = make_db
+    os.chdir(repo)
+    rc = copy(DEFAULT_RC)
+    rc._update(load_rcfile("regolithrc.json"))
+    with connect(rc) as rc.client:
+        people = rc.client.find("people", {"_id": "scopatz"}, fields=["name"])
+        assert people == [{"_id": "scopatz", "name": "Anthony Scopatz"}]
+        reports = rc.client.find("refereeReports", {"reviewer": "sbillinge"})
+        assert sorted(r["_id"] for r in reports) == ["1902nature", "2002nature"]
+        assert rc.client.find("refereeReports", {"reviewer": "SBillinge"}) == []
+        assert len(rc.client.find("refereeReports", {"reviewer": "SBillinge"}, case_sensitive=False)) == 2
+        assert rc.client.lookup("people", "scopatz, a")["_id"] == "scopatz"
+        assert rc.client.lookup("people", "BILLINGE", fields=["aka"]) == {"_id": "sbillinge", "aka": ["Billinge"]}
+        assert rc.client.lookup("people", "nobody") is None
+        # the results are copies
+        people[0]["name"] = "changed"
+        assert rc.client.lookup("people", "scopatz")["name"] == "Anthony Scopatz"
+
+
+def test_batch(make_db):
+    repo = make_db
+    os.chdir(repo)
+    rc = copy(DEFAULT_RC)
+    rc._update(load_rcfile("regolithrc.json"))
+    rc.client = open_dbs(rc)
+    people = rc.client.dbs["test"]["people"]
+    with rc.client.batch() as batch:
+        rc.client.update_one("test", "people", {"_id": "scopatz"}, {"name": "A. Scopatz"})
+        rc.client.insert_one("test", "people", {"_id": "newperson", "name": "New Person"})
+        rc.client.delete_one("test", "people", {"_id": "abeing"})
+        # nothing is written until the batch is flushed
+        assert people["scopatz"]["name"] == "Anthony Scopatz"
+        assert "newperson" not in people
+    assert people["scopatz"]["name"] == "A. Scopatz"
+    assert people["newperson"]["name"] == "New Person"
+    assert "abeing" not in people
+    assert len(batch.reports) == 1
+    report = batch.reports[0]
+    assert (report["writes"], report["inserted"], report["updated"], report["deleted"]) == (3, 1, 1, 1)
+
+    # a failing write rolls back the in-memory collection
+    before = dict(people)
+    with pytest.raises(KeyError):
+        with rc.client.batch():
+            rc.client.insert_one("test", "people", {"_id": "another", "name": "Another Person"})
+            rc.client.delete_one("test", "people", {"_id": "nobody"})
+    assert people == before
+
+    # and an error inside the block drops the queued writes
+    with pytest.raises(RuntimeError):
+        with rc.client.batch():
+            rc.client.insert_one("test", "people", {"_id": "another", "name": "Another Person"})
+            raise RuntimeError("stop")
+    assert people == before
+    rc.client.close()
+
+
+@pytest.fixture
+def three_dbs(tmp_path):
+    from regolith.fsclient import dump_yaml
+
+    databases = []
+    for i, name in enumerate(("first", "second", "third")):
+        os.makedirs(tmp_path / name / "db")
+        people = {"p": {"_id": "p", "name": name}, name: {"_id": name, "rank": i}}
+        dump_yaml(str(tmp_path / name / "db" / "people.yaml"), people)
+        databases.append({"name": name, "url": str(tmp_path / name), "path": "db", "local": True, "public": True})
+    return databases
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_open_dbs_concurrently(three_dbs, workers, monkeypatch):
+    import time
+
+    from regolith import database
+
+    fetch_database = database.fetch_database
+
+    def slow_first(db, rc):
+        # the first database is ready last, and is still chained first
+        if db["name"] == "first":
+            time.sleep(0.2)
+        fetch_database(db, rc)
+
+    monkeypatch.setattr(database, "fetch_database", slow_first)
+    rc = copy(DEFAULT_RC)
+    rc._update({"databases": three_dbs, "load_workers": workers})
+    client = open_dbs(rc, snapshot=False)
+    people = client.chained_db["people"]
+    # values from later databases take precedence, as when loaded one at a time
+    assert people["p"]["name"] == "third"
+    assert [m["name"] for m in people["p"].maps] == ["first", "second", "third"]
+    assert sorted(people) == ["first", "p", "second", "third"]
+    assert [t["name"] for t in client.load_timings] == ["first", "second", "third"]
+    assert client.load_timings[0]["fetch"] >= 0.2
+    if workers > 1:
+        # the others were fetched meanwhile, and waited for their turn to load
+        assert client.load_timings[1]["wait"] > 0.1
+    client.close()
+
+
+def test_open_dbs_concurrently_raises(three_dbs):
+    with open(os.path.join(three_dbs[1]["url"], "db", "people.yaml"), "w") as f:
+        f.write("p: [unclosed\n")
+    rc = copy(DEFAULT_RC)
+    rc._update({"databases": three_dbs, "load_workers": 3})
+    with pytest.raises(ParserError, match="flow sequence"):
+        open_dbs(rc, snapshot=False)
+
+
+class ServerSide(object):
+    """A client that deferred its collections and queries them in place, as
+    mongo does when the collections are not preloaded."""
+
+    def __init__(self, dbname, docs):
+        self.dbs = {}
+        self.deferred = {dbname: {"people"}}
+        self.docs = docs
+
+    def keys(self):
+        return list(self.deferred)
+
+    def close(self):
+        pass
+
+    def find(self, dbname, collname, filter, fields=None, case_sensitive=True):
+        from regolith.tools import doc_matches
+
+        if isinstance(filter.get("_id"), dict):
+            return [doc for doc in self.docs if doc["_id"] in filter["_id"]["$in"]]
+        return [doc for doc in self.docs if doc_matches(doc, filter, case_sensitive=case_sensitive)]
+
+
+def test_find_chains_deferred(three_dbs):
+    rc = copy(DEFAULT_RC)
+    rc._update({"databases": three_dbs})
+    client = open_dbs(rc, snapshot=False)
+    client.dbs["first"]["people"]["p"]["todos"] = ["a"]
+    client.dbs["third"]["people"]["p"]["todos"] = ["c"]
+    # a database between the first and the second that was not preloaded
+    rc.databases.insert(1, {"name": "server"})
+    server = ServerSide("server", [{"_id": "p", "name": "server", "todos": ["b"], "room": 7}])
+    client.clients = client.clients + (server,)
+    (p,) = client.find("people", {"_id": "p"})
+    # lists are joined and later databases win, as in the chained db
+    assert p["todos"] == ["a", "b", "c"]
+    assert p["name"] == "third"
+    assert p["room"] == 7
+    # the copies of documents matched in the preloaded databases are queried too
+    (p,) = client.find("people", {"name": "third"}, fields=["todos"])
+    assert dict(p) == {"_id": "p", "todos": ["a", "b", "c"]}
+    client.close()
+
+
+def test_batch_rollback_journal(three_dbs):
+    from regolith.database import dump_database
+    from regolith.fsclient import journal_filename
+
+    db = dict(three_dbs[0], journal_mode=True)
+    rc = copy(DEFAULT_RC)
+    rc._update({"databases": [db]})
+    client = open_dbs(rc, snapshot=False)
+    with pytest.raises(KeyError):
+        with client.batch():
+            client.insert_one("first", "people", {"_id": "t2", "name": "never written"})
+            client.delete_one("first", "people", {"_id": "nobody"})
+    client.insert_one("first", "people", {"_id": "t3", "name": "written"})
+    dump_database(db, client, rc)
+    client.close()
+    # the journal has only the write that was not rolled back
+    with open(journal_filename(os.path.join(db["url"], "db"), "people")) as f:
+        assert len(f.readlines()) == 1
+    client = open_dbs(rc, snapshot=False)
+    assert sorted(client.dbs["first"]["people"]) == ["first", "p", "t3"]
+    client.close()
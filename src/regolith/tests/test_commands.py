@@ -7,12 +7,14 @@ from pathlib import Path
 
 import pytest
 
-from regolith.database import connect
+from regolith.commands import _ingest_citations, iter_bib_chunks
+from regolith.database import connect, open_dbs
 from regolith.dates import convert_doc_iso_to_date
+from regolith.fsclient import dump_yaml
 from regolith.main import main
 from regolith.mongoclient import load_mongo_col
 from regolith.runcontrol import DEFAULT_RC, load_rcfile
-from regolith.tests.conftest import ALTERNATE_REGOLITH_MONGODB_NAME, FS_DB_NAME
+from regolith.tests.conftest import ALTERNATE_REGOLITH_MONGODB_NAME, FS_DB_NAME, write_synthetic_bib
 
 BILLINGE_TEST = False  # special tests for Billinge group, switch it to False before push to remote
 
@@ -113,3 +115,62 @@ def replace_rc_dbs(repo):
         json.dump(data, f, indent=4)
         f.truncate()
     os.chdir(cwd)
+
+
+def _citations_rc(repo):
+    os.makedirs(os.path.join(repo, "db"))
+    dump_yaml(os.path.join(repo, "db", "citations.yaml"), {"old": {"_id": "old", "title": "An old paper"}})
+    rc = copy.copy(DEFAULT_RC)
+    rc.databases = [{"name": "test", "url": repo, "path": "db", "local": True, "public": True}]
+    rc.db, rc.coll = "test", "citations"
+    return rc
+
+
+def test_ingest_citations(tmpdir, capsys):
+    repo = str(tmpdir)
+    rc = _citations_rc(repo)
+    rc.filename = write_synthetic_bib(os.path.join(repo, "synthetic.bib"), 20)
+    rc.client = open_dbs(rc)
+    _ingest_citations(rc)
+    citations = rc.client.dbs["test"]["citations"]
+    assert len(citations) == 21
+    assert citations["paper00003"]["title"] == "A synthetic paper number 3"
+    assert citations["paper00003"]["entrytype"] == "article"
+    assert "20 inserted, 0 updated, 0 unchanged" in capsys.readouterr().out
+    _ingest_citations(rc)
+    assert "0 inserted, 0 updated, 20 unchanged" in capsys.readouterr().out
+    citations["paper00003"] = dict(citations["paper00003"], title="An edited title")
+    _ingest_citations(rc)
+    assert "0 inserted, 1 updated, 19 unchanged" in capsys.readouterr().out
+    assert citations["paper00003"]["title"] == "A synthetic paper number 3"
+    rc.client.close()
+
+
+def test_iter_bib_chunks():
+    bib = [
+        "@string{jan = {January}}\n",
+        "@article{one,\n",
+        "  title = {One},\n",
+        "  note = {Replies to\n",
+        "  @someone on the mailing list}\n",
+        "}\n",
+        "  @book {two,\n",
+        "  title = {Two}}\n",
+    ]
+    chunks = list(iter_bib_chunks(bib))
+    assert chunks == ["".join(bib[:1]), "".join(bib[1:6]), "".join(bib[6:])]
+
+
+@pytest.mark.skipif("REGOLITH_BENCHMARK" not in os.environ, reason="set REGOLITH_BENCHMARK to run benchmarks")
+def test_ingest_citations_benchmark(tmpdir, synthetic_bib, capsys):
+    repo = str(tmpdir)
+    rc = _citations_rc(repo)
+    rc.filename = synthetic_bib
+    rc.client = open_dbs(rc)
+    _ingest_citations(rc)
+    _ingest_citations(rc)
+    out = capsys.readouterr().out
+    with capsys.disabled():
+        print(out)
+    assert "0 inserted, 0 updated, 10000 unchanged" in out
+    rc.client.close()
@@ -0,0 +1,45 @@
+import os
+
+from regolith.deploy import sync_tree
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_sync_tree(tmpdir):
+    src = os.path.join(tmpdir, "src")
+    dst = os.path.join(tmpdir, "dst")
+    _write(os.path.join(src, "index.html"), "new index")
+    _write(os.path.join(src, "same.html"), "unchanged")
+    _write(os.path.join(src, "img", "logo.png"), "logo")
+    _write(os.path.join(dst, "index.html"), "old index")
+    _write(os.path.join(dst, "same.html"), "unchanged")
+    _write(os.path.join(dst, "stale.html"), "stale")
+    _write(os.path.join(dst, ".git", "HEAD"), "ref: refs/heads/main")
+    copied, removed, nbytes = sync_tree(src, dst, delete=True)
+    assert copied == [os.path.join("img", "logo.png"), "index.html"]
+    assert removed == ["stale.html"]
+    assert nbytes == len("logo") + len("new index")
+    assert _read(os.path.join(dst, "index.html")) == "new index"
+    assert not os.path.exists(os.path.join(dst, "stale.html"))
+    assert os.path.exists(os.path.join(dst, ".git", "HEAD"))
+    assert sync_tree(src, dst, delete=True) == ([], [], 0)
+
+
+def test_sync_tree_no_delete(tmpdir):
+    src = os.path.join(tmpdir, "src")
+    dst = os.path.join(tmpdir, "dst")
+    _write(os.path.join(src, "index.html"), "index")
+    _write(os.path.join(dst, "CNAME"), "example.com")
+    copied, removed, nbytes = sync_tree(src, dst)
+    assert copied == ["index.html"]
+    assert removed == []
+    assert os.path.exists(os.path.join(dst, "CNAME"))
@@ -1,8 +1,23 @@
 import datetime
+import os
 import tempfile
+import time
 from pathlib import Path
 
-from regolith.fsclient import date_encoder, dump_json
+import pytest
+
+from regolith.fsclient import (
+    FileSystemClient,
+    collection_codec,
+    date_encoder,
+    dump_json,
+    dump_yaml,
+    journal_filename,
+    load_json,
+    load_yaml,
+)
+from regolith.lazyjson import LazyJSONCollection, index_filename
+from regolith.runcontrol import RunControl
 
 
 def test_date_encoder():
@@ -43,3 +58,317 @@ def test_dump_json():
 #         json.dump(json_doc, f)
 #     actual = load_json(filename)
 #     assert actual == expected
+
+
+def _indexed_client():
+    rc = RunControl(indexes=["todos.assigned_to"])
+    client = FileSystemClient(rc)
+    client.dbs["test"]["todos"] = {
+        "t1": {"_id": "t1", "assigned_to": "sbillinge", "status": "started"},
+        "t2": {"_id": "t2", "assigned_to": "scopatz", "status": "started"},
+        "t3": {"_id": "t3", "assigned_to": "sbillinge", "status": "finished"},
+    }
+    return client
+
+
+def test_find_one_indexed():
+    client = _indexed_client()
+    assert client.find_one("test", "todos", {"_id": "t2"})["assigned_to"] == "scopatz"
+    assert client.find_one("test", "todos", {"_id": "t2", "status": "finished"}) is None
+    assert client.find_one("test", "todos", {"_id": "nope"}) is None
+    assert client.find_one("test", "todos", {"assigned_to": "sbillinge"})["_id"] == "t1"
+    assert client.find_one("test", "todos", {"assigned_to": "sbillinge", "status": "finished"})["_id"] == "t3"
+    assert client.index("test", "todos", "assigned_to") == {
+        "sbillinge": {"t1": None, "t3": None},
+        "scopatz": {"t2": None},
+    }
+
+
+def test_indexes_maintained():
+    client = _indexed_client()
+    client.find_one("test", "todos", {"assigned_to": "nobody"})
+    client.insert_one("test", "todos", {"_id": "t4", "assigned_to": "abeing"})
+    client.update_one("test", "todos", {"_id": "t1"}, {"assigned_to": "abeing"})
+    client.delete_one("test", "todos", {"_id": "t2"})
+    client.insert_many("test", "todos", [{"_id": "t5", "assigned_to": ["not", "hashable"]}])
+    assert client.index("test", "todos", "assigned_to") == {
+        "sbillinge": {"t3": None},
+        "abeing": {"t4": None, "t1": None},
+    }
+    # the first match is the first in the collection, as with a scan
+    assert client.find_one("test", "todos", {"assigned_to": "abeing"})["_id"] == "t1"
+    assert client.find_one("test", "todos", {"assigned_to": "scopatz"}) is None
+    assert client.find_one("test", "todos", {"assigned_to": ["not", "hashable"]})["_id"] == "t5"
+    client.bulk_write("test", "todos", [("update", {"_id": "t3"}, {"assigned_to": "scopatz"}, {})])
+    assert client.find_one("test", "todos", {"assigned_to": "scopatz"})["_id"] == "t3"
+    # an index built from scratch agrees with the maintained one
+    maintained = client.index("test", "todos", "assigned_to")
+    client.drop_indexes("test", "todos")
+    assert client.index("test", "todos", "assigned_to") == maintained
+
+
+def test_indexes_in_place():
+    client = _indexed_client()
+    client.index("test", "todos", "assigned_to")
+    client.dbs["test"]["todos"]["t2"]["assigned_to"] = "abeing"
+    # the index misses the change, and a scan does not
+    assert client.find_one("test", "todos", {"assigned_to": "abeing"})["_id"] == "t2"
+    assert client.find_one("test", "todos", {"assigned_to": "scopatz"}) is None
+    # the next write indexes the document under its new value
+    client.update_one("test", "todos", {"_id": "t2"}, {"status": "finished"})
+    assert client.index("test", "todos", "assigned_to") == {
+        "sbillinge": {"t1": None, "t3": None},
+        "abeing": {"t2": None},
+    }
+
+
+def _journal_db(tmp_path, **kwargs):
+    db = {"name": "test", "url": str(tmp_path), "path": "db", "local": True, "whitelist": [], "blacklist": []}
+    db.update(kwargs)
+    os.makedirs(tmp_path / "db", exist_ok=True)
+    dump_yaml(
+        str(tmp_path / "db" / "todos.yaml"),
+        {
+            "t1": {"_id": "t1", "assigned_to": "sbillinge", "due_date": datetime.date(2020, 5, 1)},
+            "t2": {"_id": "t2", "assigned_to": "scopatz"},
+        },
+    )
+    dump_yaml(str(tmp_path / "db" / "people.yaml"), {"sbillinge": {"_id": "sbillinge", "name": "Simon"}})
+    return db
+
+
+def _loaded(db):
+    client = FileSystemClient(RunControl())
+    client.load_database(db)
+    return client
+
+
+def test_journal(tmp_path):
+    db = _journal_db(tmp_path, journal_mode=True)
+    yaml = tmp_path / "db" / "todos.yaml"
+    journal = journal_filename(str(tmp_path / "db"), "todos")
+    before = yaml.read_text()
+    client = _loaded(db)
+    client.insert_one(
+        "test", "todos", {"_id": "t3", "assigned_to": "abeing", "begin_date": datetime.date(2021, 1, 2)}
+    )
+    client.update_one("test", "todos", {"_id": "t1"}, {"assigned_to": "abeing"})
+    client.update_one("test", "todos", {"_id": "t4"}, {"assigned_to": "scopatz"})
+    client.delete_one("test", "todos", {"_id": "t2"})
+    expected = {_id: dict(doc) for _id, doc in client.dbs["test"]["todos"].items()}
+    assert client.dump_database(db) == [os.path.join("db", "todos.journal.jsonl")]
+    # only the journal of the collection that was written to is touched
+    assert yaml.read_text() == before
+    assert not os.path.exists(journal_filename(str(tmp_path / "db"), "people"))
+    with open(journal) as f:
+        assert len(f.readlines()) == 4
+    client = _loaded(db)
+    assert client.dbs["test"]["todos"] == expected
+    # a line cut short is skipped, and later appends still start on their own line
+    with open(journal, "a") as f:
+        f.write('{"op": "delete", "_id": "t')
+    with pytest.warns(RuntimeWarning):
+        client = _loaded(db)
+    assert client.dbs["test"]["todos"] == expected
+    client.delete_one("test", "todos", {"_id": "t4"})
+    del expected["t4"]
+    client.dump_database(db)
+    # dumping outside of journal mode, as regolith compact does, folds the journal in
+    db["journal_mode"] = False
+    with pytest.warns(RuntimeWarning):
+        client = _loaded(db)
+    assert client.dbs["test"]["todos"] == expected
+    client.dump_database(db)
+    assert not os.path.exists(journal)
+    assert load_yaml(str(yaml)) == expected
+
+
+def test_journal_compacted_past_max_bytes(tmp_path):
+    db = _journal_db(tmp_path, journal_mode=True, journal_max_bytes=100)
+    journal = journal_filename(str(tmp_path / "db"), "todos")
+    client = _loaded(db)
+    client.update_one("test", "todos", {"_id": "t1"}, {"assigned_to": "abeing"})
+    client.dump_database(db)
+    assert os.path.exists(journal)
+    client = _loaded(db)
+    client.update_one("test", "todos", {"_id": "t2"}, {"assigned_to": "abeing", "status": "finished"})
+    client.dump_database(db)
+    assert not os.path.exists(journal)
+    todos = load_yaml(str(tmp_path / "db" / "todos.yaml"))
+    assert todos["t1"]["assigned_to"] == todos["t2"]["assigned_to"] == "abeing"
+
+
+def _contacts(tmp_path):
+    os.makedirs(tmp_path / "db", exist_ok=True)
+    filename = str(tmp_path / "db" / "contacts.json")
+    dump_json(filename, {f"c{i}": {"_id": f"c{i}", "name": f"Contact {i}", "aka": [f"C{i}"]} for i in range(5)})
+    return filename
+
+
+def test_lazy_json_collection(tmp_path):
+    filename = _contacts(tmp_path)
+    coll = LazyJSONCollection(filename)
+    assert os.path.exists(index_filename(filename))
+    assert list(coll) == [f"c{i}" for i in range(5)] and len(coll) == 5
+    # iterating decodes one document at a time, without keeping them
+    assert [doc["name"] for doc in coll.values()] == [f"Contact {i}" for i in range(5)]
+    assert not coll.dirty
+    assert coll["c3"] == {"_id": "c3", "name": "Contact 3", "aka": ["C3"]}
+    assert coll["c3"] is coll["c3"]
+    assert "c9" not in coll and coll.get("c9") is None
+    coll["c3"]["name"] = "Changed"
+    coll["c9"] = {"_id": "c9", "name": "New"}
+    del coll["c0"]
+    assert len(coll) == 5 and "c0" not in coll
+    coll.dump()
+    assert load_json(filename) == {
+        "c1": {"_id": "c1", "name": "Contact 1", "aka": ["C1"]},
+        "c2": {"_id": "c2", "name": "Contact 2", "aka": ["C2"]},
+        "c3": {"_id": "c3", "name": "Changed", "aka": ["C3"]},
+        "c4": {"_id": "c4", "name": "Contact 4", "aka": ["C4"]},
+        "c9": {"_id": "c9", "name": "New"},
+    }
+    # the index is rebuilt for the rewritten file
+    assert coll.peek("c9")["name"] == "New" and not coll.dirty
+    coll.close()
+    assert dict(LazyJSONCollection(filename)) == load_json(filename)
+
+
+def test_lazy_json_client(tmp_path):
+    filename = _contacts(tmp_path)
+    db = {"name": "test", "url": str(tmp_path), "path": "db", "local": True, "whitelist": [], "blacklist": []}
+    db["lazy_json"] = True
+    client = _loaded(db)
+    assert isinstance(client.dbs["test"]["contacts"], LazyJSONCollection)
+    assert client.find_one("test", "contacts", {"_id": "c2"})["name"] == "Contact 2"
+    assert client.find_one("test", "contacts", {"name": "Contact 4"})["_id"] == "c4"
+    mtime = os.stat(filename).st_mtime_ns
+    # nothing changed, but looked up documents may have been changed in place
+    client.dbs["test"]["contacts"] = LazyJSONCollection(filename)
+    client.dump_database(db)
+    assert os.stat(filename).st_mtime_ns == mtime
+    client.update_one("test", "contacts", {"_id": "c2"}, {"name": "Updated"})
+    client.dump_database(db)
+    client.close()
+    assert load_json(filename)["c2"]["name"] == "Updated"
+
+
+@pytest.mark.parametrize("codec", [".gz", ".bz2", ".xz"])
+@pytest.mark.parametrize("ext", [".json", ".yaml"])
+def test_compressed_round_trip(tmp_path, ext, codec):
+    docs = {f"c{i}": {"_id": f"c{i}", "name": f"Contact {i}", "aka": [f"C{i}"]} for i in range(5)}
+    filename = str(tmp_path / ("contacts" + ext + codec))
+    if ext == ".json":
+        dump_json(filename, docs)
+        assert load_json(filename) == docs
+    else:
+        dump_yaml(filename, {_id: dict(doc) for _id, doc in docs.items()})
+        assert load_yaml(filename) == docs
+    with open(filename, "rb") as f:
+        compressed = f.read()
+    # dumping the same documents again gives the same bytes, as git would want
+    if ext == ".json":
+        dump_json(filename, docs)
+        with open(filename, "rb") as f:
+            assert f.read() == compressed
+
+
+def test_collection_codec():
+    rc = RunControl(compression={"citations": "gz", "people": None})
+    assert collection_codec({}, rc, "citations") == ".gz"
+    assert collection_codec({}, rc, "people") == ""
+    assert collection_codec({}, rc, "todos") is None
+    assert collection_codec({"compression": {"citations": ".xz"}}, rc, "citations") == ".xz"
+    with pytest.raises(ValueError):
+        collection_codec({"compression": {"citations": "rar"}}, rc, "citations")
+
+
+def test_compressed_client(tmp_path):
+    db = _journal_db(tmp_path)
+    dbpath = tmp_path / "db"
+    dump_json(str(dbpath / "contacts.json.gz"), {"c1": {"_id": "c1", "name": "Contact 1"}})
+    client = _loaded(db)
+    assert client.dbs["test"]["contacts"] == {"c1": {"_id": "c1", "name": "Contact 1"}}
+    # collections are written back with the compression they were loaded with
+    client.update_one("test", "contacts", {"_id": "c1"}, {"name": "Changed"})
+    assert os.path.join("db", "contacts.json.gz") in client.dump_database(db)
+    assert load_json(str(dbpath / "contacts.json.gz"))["c1"]["name"] == "Changed"
+    # unless configured otherwise, in which case the old file goes
+    db["compression"] = {"contacts": "", "todos": "bz2"}
+    client = _loaded(db)
+    to_add = client.dump_database(db)
+    for f in ("contacts.json", "contacts.json.gz", "todos.yaml", "todos.yaml.bz2"):
+        assert os.path.join("db", f) in to_add
+    assert sorted(os.listdir(dbpath)) == ["contacts.json", "people.yaml", "todos.yaml.bz2"]
+    assert _loaded(db).dbs["test"]["todos"]["t1"]["due_date"] == datetime.date(2020, 5, 1)
+
+
+def test_compressed_client_databases(tmp_path):
+    # an archival database compresses a collection that another keeps plain
+    arch = _journal_db(tmp_path / "arch", name="arch", url=str(tmp_path / "arch"))
+    pub = _journal_db(tmp_path / "pub", name="pub", url=str(tmp_path / "pub"))
+    dump_json(str(tmp_path / "arch" / "db" / "citations.json.gz"), {"a": {"_id": "a", "title": "Old"}})
+    dump_yaml(str(tmp_path / "pub" / "db" / "citations.yaml"), {"p": {"_id": "p", "title": "New"}})
+    client = FileSystemClient(RunControl())
+    client.load_database(arch)
+    client.load_database(pub)
+    client.update_one("arch", "citations", {"_id": "a"}, {"title": "Edited"})
+    assert os.path.join("db", "citations.json.gz") in client.dump_database(arch)
+    assert sorted(os.listdir(tmp_path / "arch" / "db")) == ["citations.json.gz", "people.yaml", "todos.yaml"]
+    assert load_json(str(tmp_path / "arch" / "db" / "citations.json.gz"))["a"]["title"] == "Edited"
+    assert os.path.join("db", "citations.yaml") in client.dump_database(pub)
+    assert sorted(os.listdir(tmp_path / "pub" / "db")) == ["citations.yaml", "people.yaml", "todos.yaml"]
+
+
+@pytest.mark.skipif("REGOLITH_BENCHMARK" not in os.environ, reason="set REGOLITH_BENCHMARK to run benchmarks")
+def test_compression_benchmark(tmp_path, capsys):
+    from regolith.bench import synthesize
+
+    # about 100 MB of citations as JSON, override with REGOLITH_BENCHMARK_MB
+    mb = int(os.environ.get("REGOLITH_BENCHMARK_MB", 100))
+    docs = synthesize(counts={"citations": mb * 1400})["citations"]
+    rows = []
+    for codec in ("", ".gz", ".bz2", ".xz"):
+        filename = str(tmp_path / ("citations.json" + codec))
+        start = time.perf_counter()
+        dump_json(filename, docs, date_handler=date_encoder)
+        dumped = time.perf_counter() - start
+        start = time.perf_counter()
+        load_json(filename)
+        loaded = time.perf_counter() - start
+        rows.append((codec or "plain", os.path.getsize(filename) / 1e6, dumped, loaded))
+        os.remove(filename)
+    with capsys.disabled():
+        for name, size, dumped, loaded in rows:
+            print(f"{name:>6}: {size:9.2f} MB  dump {dumped:7.2f} s  load {loaded:7.2f} s")
+
+
+@pytest.mark.skipif("REGOLITH_BENCHMARK" not in os.environ, reason="set REGOLITH_BENCHMARK to run benchmarks")
+def test_index_benchmark(capsys):
+    n = 100000
+    client = FileSystemClient(RunControl(indexes=["todos.assigned_to"]))
+    client.dbs["test"]["todos"] = {f"t{i}": {"_id": f"t{i}", "assigned_to": f"person{i % 1000}"} for i in range(n)}
+    timings = {}
+    start = time.perf_counter()
+    client.index("test", "todos", "assigned_to")
+    timings["build"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(1000):
+        client.find_one("test", "todos", {"assigned_to": f"person{i}"})
+    timings["1000 indexed finds"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(10):
+        client.find_one("test", "todos", {"status": "absent"})
+    timings["10 scanning finds"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(n):
+        client.update_one("test", "todos", {"_id": f"t{i}"}, {"assigned_to": f"person{i % 999}"})
+    timings[f"{n} indexed updates"] = time.perf_counter() - start
+    client.drop_indexes()
+    start = time.perf_counter()
+    for i in range(n):
+        client.update_one("test", "todos", {"_id": f"t{i}"}, {"assigned_to": f"person{i % 998}"})
+    timings[f"{n} unindexed updates"] = time.perf_counter() - start
+    with capsys.disabled():
+        for name, seconds in timings.items():
+            print(f"{name}: {seconds:.3f} s")
@@ -0,0 +1,49 @@
+"""Guards the start up time of the command line against heavy imports."""
+
+import subprocess
+import sys
+
+import pytest
+
+# total import time budget, in microseconds as reported by -X importtime, generous
+# enough for slow CI machines but well below the cost of importing every builder
+IMPORT_BUDGET = 1500000
+
+# modules that only some builders and helpers need
+HEAVY_MODULES = ["matplotlib", "numpy", "scipy", "openpyxl", "pandas", "habanero", "flask", "pymongo"]
+
+
+def importtime(args, cwd=None):
+    """Runs regolith with args under -X importtime and returns the total
+    import time and the names of all imported modules."""
+    code = "from regolith.main import main; main({0!r})".format(args)
+    cp = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd,
+        capture_output=True,
+        universal_newlines=True,
+    )
+    assert cp.returncode == 0, cp.stderr
+    total, modules = 0, set()
+    for line in cp.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules.add(name.strip())
+        # top level imports are not indented
+        if not name.startswith("  "):
+            total += int(cumulative)
+    return total, modules
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--version"],
+        ["helper", "l_todo"],
+    ],
+)
+def test_importtime(args, make_db):
+    total, modules = importtime(args, cwd=make_db)
+    assert sorted(modules & set(HEAVY_MODULES)) == []
+    assert total < IMPORT_BUDGET
@@ -0,0 +1,93 @@
+import datetime
+import json
+import os
+
+from regolith.fsclient import FileSystemClient, dump_yaml, load_yaml
+from regolith.main import main
+from regolith.partitions import PartitionedCollection, doc_year, id_hash, id_letter, split_collection
+from regolith.runcontrol import RunControl
+
+CITATIONS = {
+    "a2019": {"_id": "a2019", "title": "A", "year": 2019},
+    "b2019": {"_id": "b2019", "title": "B", "year": 2019},
+    "c2020": {"_id": "c2020", "title": "C", "year": 2020},
+    "dated": {"_id": "dated", "title": "D", "date": datetime.date(2021, 3, 1)},
+    "undated": {"_id": "undated", "title": "E"},
+}
+
+
+def test_shard_keys():
+    assert doc_year(CITATIONS["a2019"]) == "2019"
+    assert doc_year(CITATIONS["dated"]) == "2021"
+    assert doc_year({"begin_date": "2018-01-02"}) == "2018"
+    assert doc_year(CITATIONS["undated"]) == "unknown"
+    assert id_letter("Scopatz") == "s" and id_letter("_x") == "_"
+    assert id_hash("scopatz") == id_hash("scopatz") and 0 <= int(id_hash("scopatz", 4)) < 4
+
+
+def test_partitioned_collection(tmp_path):
+    path = str(tmp_path / "citations")
+    split_collection(CITATIONS, path, key="year")
+    assert sorted(os.listdir(path)) == ["2019.yaml", "2020.yaml", "2021.yaml", "manifest.json", "unknown.yaml"]
+    coll = PartitionedCollection(path)
+    assert coll.manifest["shards"]["2019"] == {"count": 2}
+    assert len(coll) == 5 and coll.shards == {}
+    # only the shards that can match are read
+    assert [_id for _id, _ in coll.scan({"year": 2019})] == ["a2019", "b2019"]
+    assert list(coll.shards) == ["2019"]
+    assert coll.peek("c2020")["title"] == "C" and coll.dirty == set()
+    # moving a document to another year moves it to another shard
+    doc = dict(coll["a2019"])
+    doc["year"] = 2020
+    coll["a2019"] = doc
+    del coll["undated"]
+    assert coll.dump() == ["2019.yaml", "2020.yaml", "unknown.yaml", "manifest.json"]
+    assert not os.path.exists(os.path.join(path, "unknown.yaml"))
+    coll = PartitionedCollection(path)
+    assert coll.manifest["shards"] == {"2019": {"count": 1}, "2020": {"count": 2}, "2021": {"count": 1}}
+    assert dict(coll.items()) == {_id: doc for _id, doc in load_yaml(os.path.join(path, "2020.yaml")).items()} | {
+        "b2019": CITATIONS["b2019"],
+        "dated": CITATIONS["dated"],
+    }
+
+
+def test_partitioned_client(tmp_path):
+    split_collection({"t1": {"_id": "t1"}, "s1": {"_id": "s1"}}, str(tmp_path / "db" / "todos"), key="letter")
+    db = {"name": "test", "url": str(tmp_path), "path": "db", "local": True, "whitelist": [], "blacklist": []}
+    client = FileSystemClient(RunControl())
+    client.load_database(db)
+    coll = client.dbs["test"]["todos"]
+    assert isinstance(coll, PartitionedCollection)
+    assert client.find_one("test", "todos", {"_id": "t1"}) == {"_id": "t1"}
+    assert list(coll.shards) == ["t"]
+    client.insert_one("test", "todos", {"_id": "t2", "status": "started"})
+    assert client.dump_database(db) == [
+        os.path.join("db", "todos", "t.yaml"),
+        os.path.join("db", "todos", "manifest.json"),
+    ]
+    assert load_yaml(str(tmp_path / "db" / "todos" / "t.yaml")) == {
+        "t1": {"_id": "t1"},
+        "t2": {"_id": "t2", "status": "started"},
+    }
+
+
+def test_partition_command(tmp_path):
+    cwd = os.getcwd()
+    os.makedirs(tmp_path / "db")
+    dump_yaml(str(tmp_path / "db" / "citations.yaml"), {_id: dict(doc) for _id, doc in CITATIONS.items()})
+    before = (tmp_path / "db" / "citations.yaml").read_text()
+    with open(tmp_path / "regolithrc.json", "w") as f:
+        json.dump(
+            {"databases": [{"name": "test", "url": str(tmp_path), "path": "db", "local": True, "public": True}]},
+            f,
+        )
+    os.chdir(tmp_path)
+    try:
+        main(["partition", "citations", "--by", "hash", "--hash-shards", "2"])
+        assert not os.path.exists(tmp_path / "db" / "citations.yaml")
+        assert len(PartitionedCollection(str(tmp_path / "db" / "citations"))) == 5
+        main(["partition", "citations", "--merge"])
+    finally:
+        os.chdir(cwd)
+    assert not os.path.exists(tmp_path / "db" / "citations")
+    assert (tmp_path / "db" / "citations.yaml").read_text() == before
@@ -0,0 +1,40 @@
+import json
+import os
+
+from regolith.main import main
+from regolith.profiler import PROFILER, Profiler
+
+
+def test_span():
+    profiler = Profiler()
+    with profiler.span("off"):
+        pass
+    assert profiler.events == []
+    profiler.enable()
+    with profiler.span("outer", db="test"):
+        with profiler.span("inner", cat="subprocess"):
+            pass
+        with profiler.span("inner", cat="subprocess"):
+            pass
+    profiler.disable()
+    assert [e["name"] for e in profiler.events] == ["inner", "inner", "outer"]
+    outer = profiler.events[-1]
+    assert outer["ph"] == "X" and outer["args"] == {"db": "test"}
+    assert all(e["dur"] <= outer["dur"] for e in profiler.events)
+    summary = profiler.summary()
+    assert summary[0][0] == "outer"
+    assert summary[1][:2] == ("inner", 2)
+
+
+def test_main_profile(make_db, tmp_path, capsys):
+    repo = make_db
+    os.chdir(repo)
+    trace = tmp_path / "trace.json"
+    try:
+        main(["--profile", str(trace), "build", "cv", "--no-pdf"])
+    finally:
+        PROFILER.disable()
+    with open(trace) as f:
+        names = {event["name"] for event in json.load(f)["traceEvents"]}
+    assert {"main", "open_dbs", "load_database", "cv.latex", "render", "dump_database"} <= names
+    assert "open_dbs" in capsys.readouterr().err
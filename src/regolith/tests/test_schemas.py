@@ -1,3 +1,6 @@
+import os
+
+from regolith import schemas
 from regolith.schemas import _update_dict_target, insert_alloweds
 
 
@@ -71,3 +74,33 @@ def test_insert_alloweds():
     }
     actual = insert_alloweds(doc, alloweds, "eallowed")
     assert actual == expected
+
+
+def test_compiled_schemas(tmpdir, monkeypatch):
+    monkeypatch.setattr(schemas, "SCHEMA_CACHE_DIR", str(tmpdir))
+    monkeypatch.setattr(schemas, "_COMPILED_SCHEMAS", {})
+    user_schema = {"people": {"hobby": {"description": "a hobby", "type": "string"}}}
+    compiled = schemas.compiled_schemas(user_schema)
+    assert compiled["people"]["hobby"] == user_schema["people"]["hobby"]
+    assert "files" in compiled["people"]
+    assert compiled["grants"]["status"]["eallowed"] == schemas.alloweds["GRANT_STATI"]
+    # shared within a session
+    assert schemas.compiled_schemas(user_schema) is compiled
+    # and cached on disk under a version and hash keyed path
+    key = schemas.schema_cache_key(user_schema)
+    filename = os.path.join(str(tmpdir), "schemas", schemas.__version__, key + ".pkl")
+    assert os.path.isfile(filename)
+    compile_schemas = schemas._compile_schemas
+    monkeypatch.setattr(schemas, "_COMPILED_SCHEMAS", {})
+    monkeypatch.setattr(schemas, "_compile_schemas", None)
+    assert schemas.compiled_schemas(user_schema) == compiled
+    # a cache that cannot be unpickled, here one of an unsupported protocol, is compiled again
+    monkeypatch.setattr(schemas, "_COMPILED_SCHEMAS", {})
+    monkeypatch.setattr(schemas, "_compile_schemas", compile_schemas)
+    with open(filename, "wb") as f:
+        f.write(b"\x80\x63")
+    assert schemas.compiled_schemas(user_schema) == compiled
+    assert schemas.schema_cache_key() != key
+    # the compile code changing without a new version does not load stale pickles
+    monkeypatch.setattr(schemas, "CACHE_FORMAT", schemas.CACHE_FORMAT + 1)
+    assert schemas.schema_cache_key(user_schema) != key
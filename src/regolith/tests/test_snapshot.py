@@ -0,0 +1,92 @@
+import json
+import os
+from copy import copy
+
+import pytest
+
+from regolith.client_manager import ClientManager
+from regolith.database import open_dbs
+from regolith.fsclient import dump_yaml
+from regolith.main import main
+from regolith.runcontrol import DEFAULT_RC, filter_databases, load_rcfile
+from regolith.snapshot import (
+    SNAPSHOT_FILENAME,
+    build_manifest,
+    is_current,
+    load_snapshot,
+    read_manifest,
+    write_snapshot,
+)
+
+
+@pytest.fixture
+def dbs(tmp_path):
+    databases = []
+    for name, people in (
+        ("public", {"p1": {"_id": "p1", "name": "Public One"}, "p2": {"_id": "p2", "name": "Two"}}),
+        ("private", {"p1": {"_id": "p1", "email": "one@example.com"}}),
+    ):
+        os.makedirs(tmp_path / name / "db")
+        dump_yaml(str(tmp_path / name / "db" / "people.yaml"), people)
+        databases.append({"name": name, "url": str(tmp_path / name), "path": "db", "local": True, "public": True})
+    with open(tmp_path / "regolithrc.json", "w") as f:
+        json.dump({"databases": databases}, f)
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        yield tmp_path
+    finally:
+        os.chdir(cwd)
+
+
+def _rc():
+    rc = copy(DEFAULT_RC)
+    rc._update(load_rcfile("regolithrc.json"))
+    filter_databases(rc)
+    return rc
+
+
+def test_snapshot(dbs):
+    main(["snapshot"])
+    rc = _rc()
+    with open(SNAPSHOT_FILENAME, "rb") as f:
+        manifest = read_manifest(f)
+    assert manifest["files"]["private"] == {"people.yaml": manifest["files"]["private"]["people.yaml"]}
+    assert is_current(manifest, rc)
+    assert load_snapshot(ClientManager(rc.databases, rc), rc)
+    client = open_dbs(rc)
+    p1 = client.chained_db["people"]["p1"]
+    assert dict(p1) == {"_id": "p1", "name": "Public One", "email": "one@example.com"}
+    # the chained documents are the documents of the databases they came from
+    assert p1.maps[0] is client.dbs["public"]["people"]["p1"]
+    assert p1.maps[1] is client.dbs["private"]["people"]["p1"]
+    # a file that is rewritten as it was is still current
+    os.utime(dbs / "public" / "db" / "people.yaml", ns=(0, 0))
+    assert is_current(manifest, rc)
+    client.close()
+
+
+def test_snapshot_out_of_date(dbs):
+    main(["snapshot"])
+    dump_yaml(str(dbs / "private" / "db" / "people.yaml"), {"p3": {"_id": "p3", "name": "Three"}})
+    rc = _rc()
+    client = open_dbs(rc)
+    assert not load_snapshot(client, rc)
+    assert sorted(client.chained_db["people"]) == ["p1", "p2", "p3"]
+    client.close()
+    # so is a snapshot of other databases, or of another regolith
+    rc.databases = rc.databases[:1]
+    with open(SNAPSHOT_FILENAME, "rb") as f:
+        assert not is_current(read_manifest(f), rc)
+
+
+def test_snapshot_lazy(dbs):
+    rc = _rc()
+    rc.databases[0]["lazy_json"] = True
+    with open(dbs / "public" / "db" / "contacts.json", "w") as f:
+        f.write('{"_id": "c1"}')
+    client = open_dbs(rc, snapshot=False)
+    with pytest.raises(ValueError):
+        write_snapshot(client, rc)
+    client.close()
+    assert build_manifest(rc)["files"]["public"].keys() == {"contacts.json", "people.yaml"}
@@ -0,0 +1,65 @@
+import datetime
+import json
+import os
+from copy import copy
+
+from regolith.database import connect
+from regolith.fsclient import load_yaml
+from regolith.main import main
+from regolith.runcontrol import DEFAULT_RC, load_rcfile
+from regolith.sqliteclient import SQLiteClient, decode_doc, encode_doc
+from regolith.tests.conftest import exemplars_to_fs
+
+
+def _make_repo(tmpdir, backend):
+    repo = str(tmpdir)
+    os.makedirs(os.path.join(repo, "db"), exist_ok=True)
+    with open(os.path.join(repo, "regolithrc.json"), "w") as f:
+        json.dump(
+            {
+                "default_user_id": "sbillinge",
+                "databases": [
+                    {"name": "test", "url": repo, "public": True, "path": "db", "local": True, "backend": backend}
+                ],
+            },
+            f,
+        )
+    return repo
+
+
+def test_encode_decode_doc():
+    doc = {"_id": "a", "date": datetime.date(2021, 5, 1), "when": datetime.datetime(2021, 5, 1, 6, 30)}
+    assert decode_doc(encode_doc(doc)) == doc
+
+
+def test_fs_to_sqlite_and_back(tmpdir, monkeypatch):
+    repo = _make_repo(tmpdir, "sqlite")
+    exemplars_to_fs(os.path.join(repo, "db"), ["people", "todos"])
+    expected = load_yaml(os.path.join(repo, "db", "people.yaml"))
+    monkeypatch.chdir(repo)
+    main(["fs-to-sqlite"])
+    assert os.path.isfile(os.path.join(repo, "db", "regolith.sqlite"))
+    os.remove(os.path.join(repo, "db", "people.yaml"))
+    main(["sqlite-to-fs"])
+    assert load_yaml(os.path.join(repo, "db", "people.yaml")) == expected
+
+
+def test_sqlite_backend(tmpdir, monkeypatch):
+    repo = _make_repo(tmpdir, "sqlite")
+    exemplars_to_fs(os.path.join(repo, "db"), ["people", "todos"])
+    monkeypatch.chdir(repo)
+    main(["fs-to-sqlite"])
+    rc = copy(DEFAULT_RC)
+    rc._update(load_rcfile("regolithrc.json"))
+    with connect(rc, dbs={"people"}) as rc.client:
+        assert "todos" not in rc.client["test"]
+        person = rc.client.find_one("test", "people", {"name": "Anthony Scopatz"})
+        assert person["_id"] == "scopatz"
+        rc.client.update_one("test", "people", {"_id": "scopatz"}, {"name": "A. Scopatz"})
+        rc.client.insert_one("test", "people", {"_id": "newbie", "name": "New Person"})
+        assert rc.client.find_one("test", "people", {"_id": "newbie"})["name"] == "New Person"
+    client = SQLiteClient(rc)
+    client.load_database(rc.databases[0])
+    assert client["test"]["people"]["scopatz"]["name"] == "A. Scopatz"
+    assert client["test"]["people"]["newbie"]["name"] == "New Person"
+    client.close()
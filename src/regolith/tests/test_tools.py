@@ -1,21 +1,30 @@
 import copy
 import datetime as dt
+import io
 
 import habanero
 import pytest
 import requests_mock
 
+from regolith.chained_db import ChainDB
+from regolith.fragmentindex import FragmentIndex
+from regolith.references import ReferenceIndex, path_values
 from regolith.runcontrol import DEFAULT_RC
 from regolith.tools import (
+    InstitutionResolver,
+    PresentationsView,
     awards_grants_honors,
     collect_appts,
     collection_str,
+    compile_kv_filter,
     compound_dict,
     compound_list,
     create_repo,
     date_to_rfc822,
     dereference_institution,
+    doc_matches,
     filter_employment_for_advisees,
+    filter_grants,
     filter_presentations,
     filter_publications,
     fragment_retrieval,
@@ -44,6 +53,7 @@ from regolith.tools import (
     search_collection,
     update_schemas,
     validate_meeting,
+    write_stripped,
 )
 
 PEOPLE_COLL = [
@@ -375,6 +385,17 @@ def test_fuzzy_retrieval():
     )
 
 
+def test_doc_matches():
+    todo = {"_id": "t1", "assigned_to": "sbillinge", "tags": ["Paper", "grant"], "duration": 30}
+    assert doc_matches(todo, {})
+    assert doc_matches(todo, {"assigned_to": "sbillinge", "duration": 30})
+    assert doc_matches(todo, {"tags": "grant"})
+    assert not doc_matches(todo, {"tags": "paper"})
+    assert doc_matches(todo, {"tags": "paper"}, case_sensitive=False)
+    assert not doc_matches(todo, {"assigned_to": "scopatz"})
+    assert not doc_matches(todo, {"status": "started"})
+
+
 def test_get_formatted_crossref_reference(monkeypatch):
     def mockreturn(*args, **kwargs):
         mock_article = {
@@ -1532,6 +1553,25 @@ def test_fragment_retrieval(input, expected):
     assert fragment_retrieval(input[0], input[1], input[2], case_sensitive=input[3]) == expected
 
 
+@pytest.mark.parametrize(
+    "input, expected",
+    [
+        (([p1, p2], ["aka", "name", "_id"], "Anth", False), [p1, p2]),
+        (([p1, p2], ["aka", "name", "_id"], "scopatz, a", True), []),
+        (([p1, p2], ["aka", "name", "_id"], "scopatz, a", False), [p1]),
+        (([p1, p2], ["aka", "name", "_id"], "ill", False), [p2]),
+        (([p3], ["company"], "Amazon", False), [p3]),
+        (([p3, p4], ["projects"], "PDF", False), [p4]),
+        (([p5], ["experience"], "20189", False), [p5]),
+        (([p5], ["experience"], "hello", False), []),
+    ],
+)
+def test_fragment_index(input, expected):
+    index = FragmentIndex(input[0])
+    positions = index.search(input[1], input[2], case_sensitive=input[3])
+    assert [index.docs[i] for i in sorted(positions)] == expected
+
+
 @pytest.mark.parametrize(
     "input, expected",
     [
@@ -1834,10 +1874,12 @@ people = [person1, person2, person3]
         ((people, ["name", "Jerry"]), []),
         ((people, ["position", "Prof"]), [person1, person2]),
         ((people, ["position", "Prof", "name", "Chris"]), [person2]),
+        ((people, []), people),
     ],
 )
 def test_key_value_pair_filter(input, expected):
     assert key_value_pair_filter(input[0], input[1]) == expected
+    assert key_value_pair_filter(input[0], input[1], index=FragmentIndex(input[0])) == expected
 
 
 @pytest.mark.parametrize(
@@ -1869,6 +1911,39 @@ def test_search_collection(input, expected):
     assert search_collection(input[0], input[1], input[2]) == expected
 
 
+@pytest.mark.parametrize(
+    "input, expected",
+    [
+        (["name", "Doe"], [False, False, True]),
+        (["position", "prof"], [True, True, False]),
+        (["position", "Prof", "name", "Chris"], [False, True, False]),
+        (["name", 1], [False, False, False]),
+    ],
+)
+def test_compile_kv_filter(input, expected):
+    predicate = compile_kv_filter(input)
+    assert [predicate(person) for person in people] == expected
+
+
+def test_compile_kv_filter_bad_arguments():
+    with pytest.raises(RuntimeError):
+        compile_kv_filter(["name"])
+
+
+@pytest.mark.parametrize(
+    "input, expected",
+    [
+        ([], ("", False)),
+        (["  jdoe    \n"], ("Results:\njdoe\n", True)),
+        (["scopatz    \n", "abc    \n"], ("Results:\nscopatz    \nabc\n", True)),
+    ],
+)
+def test_write_stripped(input, expected):
+    out = io.StringIO()
+    written = write_stripped(input, header="Results:\n", file=out)
+    assert (out.getvalue(), written) == expected
+
+
 appointed_people = [
     {
         "name": "Kurt Godel",
@@ -2972,6 +3047,29 @@ def test_dereference_institution(input, expected, sysout, capsys):
     assert sysout == out
 
 
+def test_institution_resolver(capsys):
+    resolver = InstitutionResolver(INSTITUTIONS)
+    assert resolver.institution("purple") is institution4
+    assert resolver.institution("PURPLE") is None
+    assert resolver.institution("PURPLE", case_sensitive=False) is institution4
+    records = [
+        {"institution": "barnardc", "department": "Phys"},
+        {"institution": "barnardc", "department": "physics"},
+        {"institution": "notindbu"},
+        {"institution": "notindbu", "city": "Near", "state": "BY"},
+    ]
+    for record in records:
+        resolver.dereference(record)
+    assert records[0]["department"] == records[1]["department"] == "Department of Physics"
+    assert records[3]["location"] == "Near, BY"
+    assert len(resolver._memo) == 2
+    assert capsys.readouterr().out == ""
+    resolver.report()
+    assert capsys.readouterr().out == "WARNING: notindbu not found in institutions (2 records)\n"
+    resolver.report()
+    assert capsys.readouterr().out == ""
+
+
 @pytest.mark.parametrize(
     "args, kwargs, expected",
     [
@@ -3000,6 +3098,79 @@ def test_filter_presentations(args, kwargs, expected):
     assert actual == expected
 
 
+VIEW = PresentationsView(PEOPLE, PRESENTATIONS)
+
+
+@pytest.mark.parametrize(
+    "target, kwargs",
+    [
+        ("tstark", {}),
+        ("tstark", {"statuses": ["all"]}),
+        ("nromanov", {"statuses": ["all"], "since": dt.date(2019, 1, 1)}),
+        ("nobody", {"statuses": ["all"]}),
+    ],
+)
+def test_filter_presentations_indexed(target, kwargs):
+    index = ReferenceIndex({"presentations": PRESENTATIONS}, people=PEOPLE)
+    expected = filter_presentations(PEOPLE, PRESENTATIONS, INSTITUTIONS, target, **kwargs)
+    actual = filter_presentations(PEOPLE, PRESENTATIONS, INSTITUTIONS, target, index=index, **kwargs)
+    assert actual == expected
+    actual = filter_presentations(PEOPLE, PRESENTATIONS, INSTITUTIONS, target, view=VIEW, **kwargs)
+    assert actual == expected
+
+
+def test_presentations_view():
+    view = PresentationsView(PEOPLE, PRESENTATIONS)
+    assert view.person("TONY STARK") is person1
+    assert view.by_author["tstark"] == [0, 1]
+    assert view.select("tstark", types=["all"], statuses=["accepted"]) == [0]
+    assert view.select("tstark", types=["poster"], statuses=["all"]) == [1]
+    assert view.select("nobody", types=["all"], statuses=["all"]) == []
+
+
+def test_reference_index():
+    people = [
+        {"_id": "tstark", "aka": ["iron man"], "name": "tony stark"},
+        {"_id": "pepper", "name": "Pepper Potts", "employment": [{"advisor": "Tony Stark"}]},
+    ]
+    grants = [
+        ChainDB({"_id": "g1", "team": [{"name": "Iron Man"}, {"name": "Pepper Potts"}]}),
+        {"_id": "g2", "team": [{"name": "someone else"}]},
+    ]
+    assert list(path_values(grants[0], "team.name")) == ["Iron Man", "Pepper Potts"]
+    index = ReferenceIndex({"people": people, "grants": grants})
+    assert index.resolve("IRON MAN") == "tstark"
+    assert index.person("nobody") is None
+    assert index.referencing("grants", ["Iron Man", "Tony Stark"]) == {"g1"}
+    assert index.referencing_person("grants", "tstark") == {"g1"}
+    assert index.referencing_person("people", "tstark") == {"pepper"}
+    assert sorted(index.references("tstark")) == [
+        ("grants", "g1", "team.name"),
+        ("people", "pepper", "employment.advisor"),
+    ]
+
+
+def test_filter_grants_indexed_alias():
+    people = [{"_id": "tstark", "aka": ["Iron Man"], "name": "Tony Stark"}]
+    grants = [
+        {
+            "_id": "g1",
+            "amount": 100.0,
+            "begin_date": "2020-01-01",
+            "end_date": "2021-01-01",
+            "team": [{"name": "Iron Man", "position": "pi"}],
+        },
+    ]
+    index = ReferenceIndex({"people": people, "grants": grants})
+    # the builders put the canonical name in the team after the index is built
+    canonical = [dict(grants[0], team=[{"name": "Tony Stark", "position": "pi"}])]
+    expected = filter_grants(copy.deepcopy(canonical), {"Tony Stark"}, pi=False, multi_pi=True)
+    assert len(expected[0]) == 1
+    assert (
+        filter_grants(copy.deepcopy(canonical), {"Tony Stark"}, pi=False, multi_pi=True, index=index) == expected
+    )
+
+
 @pytest.mark.parametrize(
     "coll, expected",
     [
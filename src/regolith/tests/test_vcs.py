@@ -0,0 +1,161 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from regolith.vcs import GitRepo
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="does not run on windows")
+
+
+def _git(path, *args):
+    return subprocess.check_output(["git"] + list(args), cwd=path, universal_newlines=True)
+
+
+@pytest.fixture
+def clone(tmpdir):
+    origin = os.path.join(tmpdir, "origin.git")
+    subprocess.check_call(["git", "init", "--bare", "-q", "-b", "master", origin])
+    repo = GitRepo.clone(origin, os.path.join(tmpdir, "clone"))
+    _git(repo.path, "config", "user.email", "test@example.com")
+    _git(repo.path, "config", "user.name", "test")
+    return origin, repo
+
+
+def _write(repo, name, content):
+    with open(os.path.join(repo.path, name), "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def test_commit_and_push(clone):
+    origin, repo = clone
+    _write(repo, "people.yml", "a: {}\n")
+    _write(repo, "todos.yml", "b: {}\n")
+    assert repo.commit_and_push(["people.yml", "todos.yml"], "first", remote="origin", branch="master")
+    assert _git(origin, "log", "--format=%s", "master").split() == ["first"]
+    assert not repo.has_changes()
+    # nothing changed so nothing is committed or pushed
+    assert not repo.commit_and_push(["people.yml", "todos.yml"], "second", remote="origin", branch="master")
+    assert _git(origin, "log", "--format=%s", "master").split() == ["first"]
+
+
+def test_commit_and_push_retries(clone):
+    origin, repo = clone
+    _write(repo, "people.yml", "a: {}\n")
+    assert repo.commit_and_push(["people.yml"], "first", remote="origin", branch="master")
+    _write(repo, "people.yml", "a: {b: 1}\n")
+    # the push fails while the remote is away, and the commit is kept
+    os.rename(origin, origin + ".away")
+    with pytest.warns(RuntimeWarning):
+        assert not repo.commit_and_push(["people.yml"], "second", remote="origin", branch="master")
+    os.rename(origin + ".away", origin)
+    assert repo.unpushed(remote="origin", branch="master") == 1
+    # so it is pushed by the next run, which has nothing new to commit
+    assert repo.commit_and_push(["people.yml"], "third", remote="origin", branch="master")
+    assert _git(origin, "log", "--format=%s", "master").split() == ["second", "first"]
+    assert repo.unpushed(remote="origin", branch="master") == 0
+
+
+def test_pull_freshness(clone):
+    origin, repo = clone
+    _write(repo, "people.yml", "a: {}\n")
+    repo.commit_and_push(["people.yml"], "first", remote="origin", branch="master")
+    assert repo.last_fetched() is None
+    assert repo.pull()
+    assert repo.is_fresh(5)
+    assert not repo.pull(freshness=5)
+    fetch_head = os.path.join(repo.path, ".git", "FETCH_HEAD")
+    stale = time.time() - 10 * 60
+    os.utime(fetch_head, (stale, stale))
+    assert not repo.is_fresh(5)
+    assert repo.pull(freshness=5)
+    # in a worktree .git is a file, and the fetch is still found
+    worktree = GitRepo(os.path.join(os.path.dirname(repo.path), "worktree"))
+    _git(repo.path, "worktree", "add", "-q", "-b", "other", worktree.path)
+    assert worktree.last_fetched() is None
+    assert worktree.pull(branch="master")
+    assert worktree.is_fresh(5)
+
+
+def test_shallow_sparse_clone(clone, tmpdir, monkeypatch):
+    from regolith.database import dump_database, open_dbs
+    from regolith.runcontrol import RunControl
+
+    origin, repo = clone
+    os.makedirs(os.path.join(repo.path, "db"))
+    for name in ("people", "todos", "citations"):
+        _write(repo, os.path.join("db", name + ".yaml"), "{0}1:\n  name: {0}\n".format(name))
+    repo.commit_and_push(["db"], "first", remote="origin", branch="master")
+    _write(repo, os.path.join("db", "people.yaml"), "people1:\n  name: changed\n")
+    repo.commit_and_push(["db"], "second", remote="origin", branch="master")
+    for var in ("AUTHOR", "COMMITTER"):
+        monkeypatch.setenv("GIT_{0}_NAME".format(var), "test")
+        monkeypatch.setenv("GIT_{0}_EMAIL".format(var), "test@example.com")
+    db = {"name": "test", "url": "file://" + origin, "path": "db", "clone_depth": 1, "sparse_checkout": True}
+    rc = RunControl(builddir=os.path.join(tmpdir, "_build"), databases=[db])
+    client = open_dbs(rc, dbs={"people"})
+    dbdir = os.path.join(tmpdir, "_build", "_dbs", "test")
+    assert os.listdir(os.path.join(dbdir, "db")) == ["people.yaml"]
+    assert _git(dbdir, "rev-list", "--count", "HEAD").strip() == "1"
+    assert client.chained_db["people"]["people1"]["name"] == "changed"
+    # a collection that was not needed is checked out when it is first used
+    assert [doc["name"] for doc in client.all_documents("todos")] == ["todos"]
+    assert client.lookup("citations", "citations1")["name"] == "citations"
+    assert sorted(os.listdir(os.path.join(dbdir, "db"))) == ["citations.yaml", "people.yaml", "todos.yaml"]
+    # new collections are committed, although they are outside the checkout
+    client.insert_one("test", "news", {"_id": "n1", "body": "hi"})
+    dump_database(db, client, rc)
+    client.close()
+    assert "db/news.yaml" in _git(origin, "ls-tree", "-r", "--name-only", "master").split()
+
+
+def test_blob_reader(clone):
+    _, repo = clone
+    _write(repo, "people.yml", "a: {}\n")
+    repo.commit_and_push(["people.yml"], "first")
+    reader = repo.objects()
+    ((path, sha),) = repo.ls_tree("HEAD")
+    assert path == "people.yml"
+    assert reader.read(sha) == reader.read("HEAD:people.yml") == b"a: {}\n"
+    with pytest.raises(KeyError):
+        reader.read("HEAD:absent.yml")
+    reader.close()
+
+
+def test_load_revision(clone):
+    from regolith.fsclient import FileSystemClient, dump_json
+    from regolith.runcontrol import RunControl
+
+    _, repo = clone
+    os.makedirs(os.path.join(repo.path, "db"))
+    _write(repo, os.path.join("db", "people.yaml"), "p1:\n  name: first\n")
+    dump_json(os.path.join(repo.path, "db", "todos.json.gz"), {"t1": {"_id": "t1", "status": "started"}})
+    _write(repo, os.path.join("db", "todos.journal.jsonl"), '{"op": "delete", "_id": "t1"}\n')
+    repo.commit_and_push(["db"], "first")
+    _write(repo, os.path.join("db", "people.yaml"), "p1:\n  name: second\n")
+    os.remove(os.path.join(repo.path, "db", "todos.journal.jsonl"))
+    repo.commit_and_push(["db"], "second")
+    _write(repo, os.path.join("db", "people.yaml"), "p1:\n  name: uncommitted\n")
+    db = {"name": "test", "url": repo.path, "path": "db", "local": True, "whitelist": [], "blacklist": []}
+    for rev, name, todos in (
+        ("HEAD~1", "first", {}),
+        ("HEAD", "second", {"t1": {"_id": "t1", "status": "started"}}),
+    ):
+        client = FileSystemClient(RunControl(db_revision=rev))
+        client.load_database(db)
+        assert client.dbs["test"]["people"] == {"p1": {"_id": "p1", "name": name}}
+        assert client.dbs["test"]["todos"] == todos
+    # the parsed files are cached by their hash, and todos is the same at both revisions
+    cached = [f for _, _, files in os.walk(os.path.join(repo.git_dir(), "regolith", "blobs")) for f in files]
+    assert len(cached) == 3
+    # a cache entry that cannot be unpickled is parsed again
+    for root, _, files in os.walk(os.path.join(repo.git_dir(), "regolith", "blobs")):
+        for f in files:
+            with open(os.path.join(root, f), "wb") as fh:
+                fh.write(b"\x80\x63")
+    client = FileSystemClient(RunControl(db_revision="HEAD"))
+    client.load_database(db)
+    assert client.dbs["test"]["people"] == {"p1": {"_id": "p1", "name": "second"}}
+    assert _git(repo.path, "status", "--porcelain").split() == ["M", "db/people.yaml"]
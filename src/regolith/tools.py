@@ -1,6 +1,7 @@
 """Misc. regolith tools."""
 
 import email.utils
+import io
 import os
 import pathlib
 import platform
@@ -11,15 +12,8 @@ from copy import copy, deepcopy
 from datetime import date, datetime
 from urllib.parse import urlparse
 
-import requests
 from dateutil import parser as date_parser
 from dateutil.relativedelta import relativedelta
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from habanero import Crossref
-from requests.exceptions import ConnectionError, HTTPError
 
 from regolith.dates import date_to_float, get_dates, is_current, month_to_int
 from regolith.schemas import alloweds
@@ -226,7 +220,7 @@ def filter_publications(
     return pubs
 
 
-def filter_projects(projects, people, reverse=False, active_only=False, group=None, ptype=None):
+def filter_projects(projects, people, reverse=False, active_only=False, group=None, ptype=None, index=None):
     """Filter projects by the author(s)
 
     Parameters
@@ -252,8 +246,13 @@ def filter_projects(projects, people, reverse=False, active_only=False, group=No
     ptype : str, optional
         The type of the project to filter for, such as ossoftware for open source
         software, defaults to None
+    index : ReferenceIndex, optional
+        When given, only the projects that it has the people on are considered
     """
     projs = []
+    if index is not None:
+        ids = index.referencing("projects", people)
+        projects = [proj for proj in projects if proj.get("_id") in ids]
     # Fixme dereference team from grant collection if provided
     for proj in projects:
         team_names = set(gets(proj["team"], "name"))
@@ -274,7 +273,7 @@ def filter_projects(projects, people, reverse=False, active_only=False, group=No
     return projs
 
 
-def filter_grants(input_grants, names, pi=True, reverse=True, multi_pi=False):
+def filter_grants(input_grants, names, pi=True, reverse=True, multi_pi=False, index=None):
     """Filter grants by those involved
 
     Parameters
@@ -289,16 +288,28 @@ def filter_grants(input_grants, names, pi=True, reverse=True, multi_pi=False):
         If True reverse the order, defaults to False
     multi_pi : bool, optional
         If True compute sub-awards for multi PI grants, defaults to False
+    index : ReferenceIndex, optional
+        When given, the teams of only the grants and proposals that it has
+        the names, or any alias of the people they resolve to, on are checked
     """
     grants = []
     total_amount = 0.0
     subaward_amount = 0.0
+    if index is not None:
+        ids = index.referencing("grants", names) | index.referencing("proposals", names)
+        # the teams may be canonicalized after the index was built, so the
+        # grants naming the people by any alias or _id are kept
+        for person_id in filter(None, map(index.resolve, names)):
+            ids |= index.referencing_person("grants", person_id) | index.referencing_person("proposals", person_id)
     for grant in input_grants:
         grant_dates = get_dates(grant)
         datenames = ["begin_", "end_"]
         for datename in datenames:
             grant[f"{datename}year"] = grant_dates[f"{datename}date"].year
             grant[f"{datename}month"] = grant_dates[f"{datename}date"].month
+        # grants merged with their proposals may have the team of either
+        if index is not None and grant.get("_id") not in ids and grant.get("proposal_id") not in ids:
+            continue
         team_names = set(gets(grant["team"], "name"))
         if len(team_names & names) == 0:
             continue
@@ -326,7 +337,7 @@ def filter_grants(input_grants, names, pi=True, reverse=True, multi_pi=False):
     return grants, total_amount, subaward_amount
 
 
-def filter_employment_for_advisees(peoplecoll, begin_period, status, advisor, now=None):
+def filter_employment_for_advisees(peoplecoll, begin_period, status, advisor, now=None, index=None):
     """Filter people to get advisees since begin_period
 
     Parameters
@@ -338,7 +349,12 @@ def filter_employment_for_advisees(peoplecoll, begin_period, status, advisor, no
         is after begin_period
     status: str
         the status of the person in the group to filter for,  e.g., ms, phd, postdoc
+    index: ReferenceIndex, optional
+        When given, only the people that it has the advisor on are considered
     """
+    if index is not None:
+        ids = index.referencing("people", [advisor])
+        peoplecoll = [p for p in peoplecoll if p.get("_id") in ids]
     people = deepcopy(peoplecoll)
     if not now:
         now = date.today()
@@ -424,27 +440,35 @@ def filter_facilities(people, begin_period, type, verbose=False):
     return facilities
 
 
-def filter_patents(patentscoll, people, target, since=None, before=None):
+def filter_patents(patentscoll, people, target, since=None, before=None, index=None):
     patents = []
     allowed_statuses = ["active", "pending"]
+    target_id = index.resolve(target) if index is not None else None
+    if target_id is not None:
+        ids = index.referencing_person("patents", target_id)
+        patentscoll = [i for i in patentscoll if i.get("_id") in ids]
     for i in patentscoll:
         if i.get("status") in allowed_statuses and i.get("type") in "patent":
-            inventors = [
-                fuzzy_retrieval(
+            if target_id is not None:
+                is_inventor = target_id in [index.resolve(inv) for inv in i["inventors"]]
+            else:
+                inventors = [
+                    fuzzy_retrieval(
+                        people,
+                        ["aka", "name", "_id"],
+                        inv,
+                        case_sensitive=False,
+                    )
+                    for inv in i["inventors"]
+                ]
+                person = fuzzy_retrieval(
                     people,
                     ["aka", "name", "_id"],
-                    inv,
+                    target,
                     case_sensitive=False,
                 )
-                for inv in i["inventors"]
-            ]
-            person = fuzzy_retrieval(
-                people,
-                ["aka", "name", "_id"],
-                target,
-                case_sensitive=False,
-            )
-            if person in inventors:
+                is_inventor = person in inventors
+            if is_inventor:
                 if i.get("end_year"):
                     end_year = i.get("end_year")
                 else:
@@ -551,8 +575,85 @@ def filter_activities(people, begin_period, type, verbose=False):
     return activities
 
 
+class PresentationsView(object):
+    """The presentations with their authors resolved to people, and their
+    dates parsed, once, so that filtering them for many people does not
+    resolve every author of every presentation for each person.
+
+    Authors are resolved as ``fuzzy_retrieval(people, ["aka", "name", "_id"],
+    author, case_sensitive=False)`` does, and the presentations are indexed
+    by the ids of their authors.
+
+    Parameters
+    ----------
+    people : iterable of dicts
+        The people the authors are resolved to
+    presentations : iterable of dicts
+        The presentations
+    """
+
+    def __init__(self, people, presentations):
+        self.aliases = {}
+        for person in people:
+            for alias in _alias_values(person, ["aka", "name", "_id"]):
+                if isinstance(alias, str):
+                    self.aliases.setdefault(alias.lower(), person)
+        self.presentations = list(presentations)
+        # (author as written, person or None) for each presentation
+        self.authors = []
+        self.by_author = {}
+        for i, pres in enumerate(self.presentations):
+            pauthors = pres["authors"]
+            if isinstance(pauthors, str):
+                pauthors = [pauthors]
+            authors = [(author, self.person(author)) for author in pauthors]
+            self.authors.append(authors)
+            for _id in {person["_id"] for _, person in authors if person is not None}:
+                self.by_author.setdefault(_id, []).append(i)
+        self._dates = {}
+
+    def person(self, name):
+        """Returns the person with name as their alias, name or id, or None."""
+        return self.aliases.get(name.lower()) if isinstance(name, str) else None
+
+    def date(self, i):
+        """Returns the date, or else the begin date, of the i-th presentation."""
+        if i not in self._dates:
+            dates = get_dates(self.presentations[i])
+            self._dates[i] = dates.get("date") or dates.get("begin_date")
+        return self._dates[i]
+
+    def select(self, target, types=None, statuses=None, since=None, before=None):
+        """Returns the positions of the presentations of target with one of
+        types and statuses, dated after since and before before when given,
+        in a single pass."""
+        selected = []
+        for i in self.by_author.get(target, ()):
+            pres = self.presentations[i]
+            if not (pres["status"] in statuses or "all" in statuses):
+                continue
+            if not (pres["type"] in types or "all" in types):
+                continue
+            if since and not self.date(i) > since:
+                continue
+            if before and not self.date(i) < before:
+                continue
+            selected.append(i)
+        return selected
+
+
 def filter_presentations(
-    people, presentations, institutions, target, types=None, since=None, before=None, statuses=None
+    people,
+    presentations,
+    institutions,
+    target,
+    types=None,
+    since=None,
+    before=None,
+    statuses=None,
+    index=None,
+    resolver=None,
+    view=None,
 ):
     f"""
     filters presentations for different types and date ranges
@@ -577,6 +678,15 @@ def filter_presentations(
     statuses: list of str.  Optional. Default is accepted
       The list of statuses to filter for.  Allowed statuses are
         {PRESENTATION_STATI}
+    index: ReferenceIndex.  Optional, default is None
+      When given, only the presentations that it has the target on are
+      considered
+    resolver: InstitutionResolver.  Optional, default is None
+      When given, the institutions are dereferenced with it, rather than
+      institutions, and its warnings are left for the caller to report
+    view: PresentationsView.  Optional, default is None
+      When given, the presentations, and their authors, are taken from it
+      rather than from people and presentations
 
     Returns
     -------
@@ -587,92 +697,23 @@ def filter_presentations(
         types = ["all"]
     if not statuses:
         statuses = ["accepted"]
-    presentations = deepcopy(presentations)
-
-    firstclean = list()
-    secondclean = list()
-    thirdclean = list()
-    fourthclean = list()
-    presclean = list()
-
-    # build the filtered collection
-    # only list the talk if the group member is an author
-    for pres in presentations:
-        pauthors = pres["authors"]
-        if isinstance(pauthors, str):
-            pauthors = [pauthors]
-        authors = [
-            fuzzy_retrieval(
-                people,
-                ["aka", "name", "_id"],
-                author,
-                case_sensitive=False,
-            )
-            for author in pauthors
-        ]
-        authorids = [author["_id"] if author is not None else author for author in authors]
-        if target in authorids:
-            firstclean.append(pres)
-    # only list the presentation if it has status in statuses
-    for pres in firstclean:
-        if pres["status"] in statuses or "all" in statuses:
-            secondclean.append(pres)
-    # only list the presentation if it has type in types
-    for pres in secondclean:
-        if pres["type"] in types or "all" in types:
-            thirdclean.append(pres)
-    # if specified, only list presentations in specified date ranges
-    if since:
-        for pres in thirdclean:
-            if get_dates(pres).get("date"):
-                presdate = get_dates(pres).get("date")
-            else:
-                presdate = get_dates(pres).get("begin_date")
-            if presdate > since:
-                fourthclean.append(pres)
-    else:
-        fourthclean = thirdclean
-    if before:
-        for pres in fourthclean:
-            if get_dates(pres).get("date"):
-                presdate = get_dates(pres).get("date")
-            else:
-                presdate = get_dates(pres).get("begin_date")
-            if presdate < before:
-                presclean.append(pres)
-    else:
-        presclean = fourthclean
-
+    if view is None:
+        if index is not None:
+            ids = index.referencing_person("presentations", target)
+            presentations = [pres for pres in presentations if pres.get("_id") in ids]
+        view = PresentationsView(people, presentations)
+    selected = view.select(target, types=types, statuses=statuses, since=since, before=before)
+    presclean = deepcopy([view.presentations[i] for i in selected])
+
+    report = resolver is None
+    if report:
+        resolver = InstitutionResolver(institutions)
     # build author list
-    for pres in presclean:
-        pauthors = pres["authors"]
-        if isinstance(pauthors, str):
-            pauthors = [pauthors]
-        pres["authors"] = [
-            (
-                author
-                if fuzzy_retrieval(
-                    people,
-                    ["aka", "name", "_id"],
-                    author,
-                    case_sensitive=False,
-                )
-                is None
-                else fuzzy_retrieval(
-                    people,
-                    ["aka", "name", "_id"],
-                    author,
-                    case_sensitive=False,
-                )["name"]
-            )
-            for author in pauthors
-        ]
-        authorlist = ", ".join(pres["authors"])
-        pres["authors"] = authorlist
-        if get_dates(pres).get("date"):
-            presdate = get_dates(pres).get("date")
-        else:
-            presdate = get_dates(pres).get("begin_date")
+    for i, pres in zip(selected, presclean):
+        pres["authors"] = ", ".join(
+            author if person is None else person["name"] for author, person in view.authors[i]
+        )
+        presdate = view.date(i)
         pres["begin_month"] = presdate.month
         pres["begin_year"] = presdate.year
         pres["begin_day"] = presdate.day
@@ -687,7 +728,7 @@ def filter_presentations(
                 print(f"presentation {pres.get('_id')} has no {day}date")
         if "institution" in pres:
             inst = {"institution": pres.get("institution"), "department": pres.get("department")}
-            dereference_institution(inst, institutions)
+            resolver.dereference(inst)
             pres["institution"] = {
                 "name": inst.get("institution", ""),
                 "city": inst.get("city"),
@@ -695,6 +736,8 @@ def filter_presentations(
                 "country": inst.get("country"),
             }
             pres["department"] = {"name": inst.get("department")}
+    if report:
+        resolver.report()
     if len(presclean) > 0:
         presclean = sorted(
             presclean,
@@ -922,6 +965,36 @@ def document_by_value(documents, address, value):
             return g_doc
 
 
+def doc_matches(doc, filter, case_sensitive=True):
+    """Whether every field in filter has the given value in the document, or,
+    for list fields, is a list containing it. These are the semantics of
+    simple mongo queries.
+
+    Parameters
+    ----------
+    doc: dict
+        The document
+    filter: dict
+        Maps fields to the values they must have
+    case_sensitive: Bool
+        When true will match case (Default = True)
+
+    Returns
+    -------
+    bool:
+        Whether the document matches
+    """
+    for field, value in filter.items():
+        found = doc.get(field)
+        found = found if isinstance(found, list) else [found]
+        if not case_sensitive and isinstance(value, str):
+            found = [f.lower() for f in found if isinstance(f, str)]
+            value = value.lower()
+        if value not in found:
+            return False
+    return True
+
+
 def fuzzy_retrieval(documents, sources, value, case_sensitive=True):
     """Retrieve a document from the documents where value is compared against
     multiple potential sources
@@ -989,10 +1062,171 @@ def number_suffix(number):
     return suffix
 
 
+def _alias_values(doc, sources):
+    """The hashable values of a document at sources, as fuzzy_retrieval
+    compares them."""
+    values = []
+    for k in sources:
+        ret = doc.get(k, [])
+        if not isinstance(ret, list):
+            ret = [ret]
+        values.extend(v for v in ret if isinstance(v, (str, int, float, tuple)) or v is None)
+    return values
+
+
+class InstitutionResolver(object):
+    """Dereferences institutions, and their departments, in many records
+    against one institutions collection.
+
+    The same lookups as ``dereference_institution`` are answered from alias
+    maps built once, and the fields each (institution, department) pair
+    resolves to are memoized. Warnings are collected, each reported once by
+    ``report``, rather than printed for every record.
+
+    Parameters
+    ----------
+    institutions : iterable of dicts
+        The institutions
+    verbose : bool, optional
+        Also warn about records without an institution and institutions
+        without departments, defaults to False
+    """
+
+    def __init__(self, institutions, verbose=False):
+        self.verbose = verbose
+        self.aliases = {}
+        self.folded = {}
+        for inst in institutions:
+            for alias in _alias_values(inst, ["name", "_id", "aka"]):
+                self.aliases.setdefault(alias, inst)
+                if isinstance(alias, str):
+                    self.folded.setdefault(alias.lower(), inst)
+        self.warnings = {}
+        self._memo = {}
+        self._departments = {}
+
+    def institution(self, name, case_sensitive=True):
+        """Returns the institution with name as its name, id or alias, or None."""
+        if not case_sensitive:
+            return self.folded.get(name.lower()) if isinstance(name, str) else None
+        try:
+            return self.aliases.get(name)
+        except TypeError:
+            return None
+
+    def department(self, departments, name, inst_id=None):
+        """Returns the department with name as its key, name or alias, or None."""
+        aliases = self._departments.get(inst_id)
+        if aliases is None:
+            aliases = {}
+            for k, v in departments.items():
+                for alias in _alias_values(v, ["name", "aka"]) + [k]:
+                    aliases.setdefault(alias, v)
+            if inst_id is not None:
+                self._departments[inst_id] = aliases
+        try:
+            return aliases.get(name)
+        except TypeError:
+            return None
+
+    def warn(self, message):
+        """Records a warning to be reported."""
+        self.warnings[message] = self.warnings.get(message, 0) + 1
+
+    def report(self, file=None):
+        """Prints each of the warnings recorded since the last report once."""
+        for message, count in self.warnings.items():
+            if count > 1:
+                message += f" ({count} records)"
+            print(message, file=file)
+        self.warnings = {}
+
+    def dereference(self, input_record):
+        """Replaces the placeholders for the institution, and department, in
+        a record with the institution data. The replacement is done inplace.
+
+        Parameters
+        ----------
+        input_record : dict
+            The record to dereference
+        """
+        inst = input_record.get("institution") or input_record.get("organization")
+        if self.verbose and not inst:
+            self.warn(f"WARNING: no institution or organization in entry: {input_record}")
+            return
+        key = (inst, input_record.get("department"), "department" in input_record)
+        try:
+            updates = self._memo.get(key)
+        except TypeError:
+            key, updates = None, None
+        if updates is None:
+            db_inst = self.institution(inst)
+            if db_inst is None:
+                name = input_record.get("institution", input_record.get("organization", "unknown"))
+                self.warn(f"WARNING: {name} not found in institutions")
+                db_inst = {
+                    "name": name,
+                    "location": input_record.get(
+                        "location",
+                        f"{input_record.get('city', 'unknown')}, {input_record.get('state', 'unknown')}",
+                    ),
+                    "city": input_record.get("city", "unknown"),
+                    "country": input_record.get("country", "unknown"),
+                    "state": input_record.get("state", "unknown"),
+                    "departments": {
+                        input_record.get("department", "unknown"): {
+                            "name": input_record.get("department", "unknown")
+                        }
+                    },
+                }
+                # the fallback depends on more of the record than the key
+                updates = self._resolve(input_record, db_inst, None)
+            else:
+                updates = self._resolve(input_record, db_inst, db_inst.get("_id"))
+                if key is not None:
+                    self._memo[key] = updates
+        input_record.update(updates)
+
+    def _resolve(self, input_record, db_inst, inst_id):
+        department = input_record.get("department")
+        departments = db_inst.get("departments")
+        if department and not departments:
+            if self.verbose:
+                self.warn(f"WARNING: no departments in {db_inst.get('_id')}. {department} sought")
+            departments, inst_id = {department: {"name": department}}, None
+        if db_inst.get("country") == "USA":
+            state_country = db_inst.get("state")
+        else:
+            state_country = db_inst.get("country")
+        updates = {
+            "location": db_inst.get("location", f"{db_inst['city']}, {state_country}"),
+            "institution": db_inst["name"],
+            "organization": db_inst["name"],
+            "city": db_inst["city"],
+            "country": db_inst["country"],
+        }
+        for optional_key in OPTIONAL_KEYS_INSTITUTIONS:
+            if optional_key not in ["departments", "schools"]:
+                if db_inst.get(optional_key):
+                    updates[optional_key] = db_inst.get(optional_key)
+        if "department" in input_record:
+            extracted_department = self.department(departments or {}, department, inst_id)
+            if extracted_department:
+                updates["department"] = extracted_department.get("name")
+            else:
+                updates["department"] = input_record.get("department", "")
+        else:
+            updates["department"] = "unknown"
+        return updates
+
+
 def dereference_institution(input_record, institutions, verbose=False):
     """Tool for replacing placeholders for institutions with the actual
     institution data. Note that the replacement is done inplace
 
+    To dereference many records against the same institutions, use an
+    InstitutionResolver.
+
     Parameters
     ----------
     input_record : dict
@@ -1004,66 +1238,9 @@ def dereference_institution(input_record, institutions, verbose=False):
     -------
     nothing
     """
-    inst = input_record.get("institution") or input_record.get("organization")
-    if verbose:
-        if not inst:
-            print(f"WARNING: no institution or organization in entry: {input_record}")
-            return
-    db_inst = fuzzy_retrieval(institutions, ["name", "_id", "aka"], inst)
-    if not db_inst:
-        print(
-            f"WARNING: {input_record.get('institution', input_record.get('organization', 'unknown'))} "
-            "not found in institutions"
-        )
-        db_inst = {
-            "name": input_record.get("institution", input_record.get("organization", "unknown")),
-            "location": input_record.get(
-                "location", f"{input_record.get('city', 'unknown')}, {input_record.get('state', 'unknown')}"
-            ),
-            "city": input_record.get("city", "unknown"),
-            "country": input_record.get("country", "unknown"),
-            "state": input_record.get("state", "unknown"),
-            "departments": {
-                input_record.get("department", "unknown"): {"name": input_record.get("department", "unknown")}
-            },
-        }
-    if input_record.get("department") and not db_inst.get("departments"):
-        if verbose:
-            print(f"WARNING: no departments in {db_inst.get('_id')}. " f"{input_record.get('department')} sought")
-        db_inst.update(
-            {
-                "departments": {
-                    input_record.get("department", "unknown"): {"name": input_record.get("department", "unknown")}
-                }
-            }
-        )
-    if db_inst.get("country") == "USA":
-        state_country = db_inst.get("state")
-    else:
-        state_country = db_inst.get("country")
-    # now update the input record in place with what we have found
-    input_record["location"] = db_inst.get("location", f"{db_inst['city']}, {state_country}")
-    input_record["institution"] = db_inst["name"]
-    input_record["organization"] = db_inst["name"]
-    input_record["city"] = db_inst["city"]
-    input_record["country"] = db_inst["country"]
-    for optional_key in OPTIONAL_KEYS_INSTITUTIONS:
-        if optional_key not in ["departments", "schools"]:
-            if db_inst.get(optional_key):
-                input_record[optional_key] = db_inst.get(optional_key)
-    if "department" in input_record:
-        for k, v in db_inst.get("departments").items():
-            v.update({"_id": k})
-        extracted_department = fuzzy_retrieval(
-            db_inst["departments"].values(), ["name", "aka", "_id"], input_record["department"]
-        )
-        if extracted_department:
-            input_record["department"] = extracted_department.get("name")
-        else:
-            input_record["department"] = input_record.get("department", "")
-    else:
-        input_record["department"] = "unknown"
-
+    resolver = InstitutionResolver(institutions, verbose=verbose)
+    resolver.dereference(input_record)
+    resolver.report()
     return
 
 
@@ -1260,16 +1437,10 @@ def update_schemas(default_schema, user_schema):
 
 def get_person(person_id, rc):
     """Get the person's name."""
-    person_found = fuzzy_retrieval(
-        all_docs_from_collection(rc.client, "people"), ["name", "aka", "_id"], person_id, case_sensitive=False
-    )
-    if person_found:
-        return person_found
-    person_found = fuzzy_retrieval(
-        all_docs_from_collection(rc.client, "contacts"), ["name", "aka", "_id"], person_id, case_sensitive=False
-    )
-    if person_found:
-        return person_found
+    for collname in ("people", "contacts"):
+        person_found = rc.client.lookup(collname, person_id, ["name", "aka", "_id"])
+        if person_found:
+            return person_found
     print("WARNING: {} missing from people and contacts. Check aka.".format(person_id))
     return None
 
@@ -1494,35 +1665,68 @@ def fragment_retrieval(coll, fields, fragment, case_sensitive=False):
 
     """
 
-    ret_list = []
-    for doc in coll:
-        returns = []
-        for k in fields:
-            ret = doc.get(k, None)
-            if ret is not None:
-                if isinstance(ret, list):
-                    ret = compound_list(ret, [])
-                elif isinstance(ret, dict):
-                    ret = compound_dict(ret, [])
-                else:
-                    ret = [ret]
+    return [doc for doc in coll if doc_has_fragment(doc, fields, fragment, case_sensitive=case_sensitive)]
 
+
+def fragment_strings(doc, fields):
+    """Collects all the values of the given fields of a document, flattening
+    any lists and dicts in them down to their strings
+
+    Parameters
+    ----------
+    doc: dict
+        The document
+    fields: iterable
+        The fields of the document to collect the values of
+
+    Returns
+    -------
+    list:
+        The values
+    """
+    returns = []
+    for k in fields:
+        ret = doc.get(k, None)
+        if ret is not None:
+            if isinstance(ret, list):
+                ret = compound_list(ret, [])
+            elif isinstance(ret, dict):
+                ret = compound_dict(ret, [])
             else:
-                ret = []
-            returns.extend(ret)
-        if not case_sensitive:
-            returns = [reti.lower() for reti in returns if isinstance(reti, str)]
-            if isinstance(fragment, str):
-                for item in frozenset(returns):
-                    if fragment.lower() in item:
-                        ret_list.append(doc)
-                        break
+                ret = [ret]
         else:
-            for item in frozenset(returns):
-                if fragment in item:
-                    ret_list.append(doc)
-                    break
-    return ret_list
+            ret = []
+        returns.extend(ret)
+    return returns
+
+
+def doc_has_fragment(doc, fields, fragment, case_sensitive=False):
+    """Checks whether the fragment appears in any one of the given fields of
+    a document, see fragment_retrieval
+
+    Parameters
+    ----------
+    doc: dict
+        The document
+    fields: iterable
+        The fields of the document to check for the fragment
+    fragment:
+       The value to look for
+    case_sensitive: Bool
+        When true will match case (Default = False)
+
+    Returns
+    -------
+    bool:
+        True if the fragment was found
+    """
+    returns = fragment_strings(doc, fields)
+    if not case_sensitive:
+        if not isinstance(fragment, str):
+            return False
+        fragment = fragment.lower()
+        return any(fragment in item.lower() for item in returns if isinstance(item, str))
+    return any(fragment in item for item in returns)
 
 
 def get_id_from_name(coll, name):
@@ -1608,7 +1812,75 @@ def is_fully_appointed(person, begin_date, end_date):
     return status
 
 
-def key_value_pair_filter(collection, arguments):
+def compile_kv_filter(arguments):
+    """Compiles the key-value pair arguments of a search into a single
+    predicate on a document
+
+    The predicate checks the pairs in order with doc_has_fragment and stops
+    at the first one that does not match, so a collection can be filtered in one pass rather than
+    one pass per pair.
+
+    Parameters
+    ----------
+    arguments: list
+        The name of the fields to look for and their accompanying substring
+
+    Returns
+    -------
+    callable:
+        Takes a document and returns True if it matches every pair
+
+    Examples
+    --------
+    >>> is_prof = compile_kv_filter(['position', 'prof'])
+    >>> [person for person in people if is_prof(person)]
+
+    """
+    if len(arguments) % 2 != 0:
+        raise RuntimeError("Error: Number of keys and values do not match")
+    pairs = [([arguments[i]], arguments[i + 1]) for i in range(0, len(arguments) - 1, 2)]
+
+    def predicate(doc):
+        return all(doc_has_fragment(doc, fields, fragment) for fields, fragment in pairs)
+
+    return predicate
+
+
+def iter_kv_filter(collection, arguments, index=None):
+    """Yields the documents from the collection where each fragment appears
+    in its accompanying field, see key_value_pair_filter
+
+    Parameters
+    ----------
+    collection: generator
+        The collection containing the documents
+    arguments: list
+        The name of the fields to look for and their accompanying substring
+    index: FragmentIndex, optional
+        A substring index over the collection used to find the documents
+        without scanning them all
+
+    Yields
+    ------
+    dict:
+        The documents that satisfy the search criteria, in collection order
+    """
+    predicate = compile_kv_filter(arguments)
+    if index is None:
+        yield from filter(predicate, collection)
+        return
+    if len(arguments) == 0:
+        # no pairs to match, as with the scan every document is kept
+        yield from index.docs
+        return
+    positions = None
+    for i in range(0, len(arguments) - 1, 2):
+        positions = index.search([arguments[i]], arguments[i + 1], within=positions)
+    for i in sorted(positions):
+        yield index.docs[i]
+
+
+def key_value_pair_filter(collection, arguments, index=None):
     """Retrieves a list of all documents from the collection where the fragment
     appears in any one of the given fields
 
@@ -1618,6 +1890,9 @@ def key_value_pair_filter(collection, arguments):
         The collection containing the documents
     arguments: list
         The name of the fields to look for and their accompanying substring
+    index: FragmentIndex, optional
+        A substring index over the collection used to find the documents
+        without scanning them all
 
     Returns
     -------
@@ -1632,18 +1907,11 @@ def key_value_pair_filter(collection, arguments):
     and whose position is professor and return them
 
     """
-
-    if len(arguments) % 2 != 0:
-        raise RuntimeError("Error: Number of keys and values do not match")
-    elements = collection
-    for i in range(0, len(arguments) - 1, 2):
-        elements = fragment_retrieval(elements, [arguments[i]], arguments[i + 1])
-    return elements
+    return list(iter_kv_filter(collection, arguments, index=index))
 
 
-def collection_str(collection, keys=None):
-    """Retrieves a list of all documents from the collection where the fragment
-    appears in any one of the given fields
+def iter_collection_str(collection, keys=None):
+    """Yields the line of collection_str for each document in the collection
 
     Parameters
     ----------
@@ -1652,27 +1920,82 @@ def collection_str(collection, keys=None):
     keys: list, optional
         The name of the fields to return from the search. Defaults to none in which case only the id is returned
 
-    Returns
-    -------
+    Yields
+    ------
     str:
-        A str of all the values
+        The values of one document, newline terminated
     """
     if not keys:
         keys = ["_id"]
     if "_id" not in keys:
         keys.insert(0, "_id")
-    output = ""
     for doc in collection:
+        line = io.StringIO()
         for key in keys:
             if key == "_id":
-                output += doc.get(key) + "    "
+                line.write(doc.get(key) + "    ")
             else:
-                output += "{}: {}    ".format(key, doc.get(key))
-        output += "\n"
-    return output
+                line.write("{}: {}    ".format(key, doc.get(key)))
+        line.write("\n")
+        yield line.getvalue()
+
+
+def collection_str(collection, keys=None):
+    """Retrieves a list of all documents from the collection where the fragment
+    appears in any one of the given fields
 
+    Parameters
+    ----------
+    collection: generator
+        The collection containing the documents
+    keys: list, optional
+        The name of the fields to return from the search. Defaults to none in which case only the id is returned
 
-def search_collection(collection, arguments, keys=None):
+    Returns
+    -------
+    str:
+        A str of all the values
+    """
+    output = io.StringIO()
+    output.writelines(iter_collection_str(collection, keys))
+    return output.getvalue()
+
+
+def write_stripped(lines, header="", file=None):
+    """Writes lines as they come, stripping the whitespace from the start of
+    the first and the end of the last, so the output is that of writing
+    ``"".join(lines).strip()`` followed by a newline without building the
+    whole string
+
+    Parameters
+    ----------
+    lines: iterable of str
+        The lines to write
+    header: str, optional
+        Written before the first line, only if there are lines
+    file: file-like, optional
+        Where to write to, defaults to sys.stdout
+
+    Returns
+    -------
+    bool:
+        False if there were no lines to write
+    """
+    file = sys.stdout if file is None else file
+    lines = iter(lines)
+    previous = next(lines, None)
+    if previous is None:
+        return False
+    file.write(header)
+    previous = previous.lstrip()
+    for line in lines:
+        file.write(previous)
+        previous = line
+    file.write(previous.rstrip() + "\n")
+    return True
+
+
+def search_collection(collection, arguments, keys=None, index=None):
     """Retrieves a list of all documents from the collection where the fragment
     appears in any one of the given fields
 
@@ -1684,6 +2007,9 @@ def search_collection(collection, arguments, keys=None):
         The name of the fields to look for and their accompanying substring
     keys: list, optional
         The name of the fields to return from the search. Defaults to none in which case only the id is returned
+    index: FragmentIndex, optional
+        A substring index over the collection used to find the documents
+        without scanning them all
 
     Returns
     -------
@@ -1699,8 +2025,7 @@ def search_collection(collection, arguments, keys=None):
     valid entries
 
     """
-    collection = key_value_pair_filter(collection, arguments)
-    return collection_str(collection, keys)
+    return collection_str(iter_kv_filter(collection, arguments, index=index), keys)
 
 
 def collect_appts(ppl_coll, filter_key=None, filter_value=None, begin_date=None, end_date=None):
@@ -1955,6 +2280,8 @@ def get_formatted_crossref_reference(doi):
     returns None None in the article cannot be found given the doi
 
     """
+    from habanero import Crossref
+    from requests.exceptions import ConnectionError, HTTPError
 
     cr = Crossref()
     try:
@@ -2068,6 +2395,9 @@ def add_to_google_calendar(event):
     Returns:
         None
     """
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build
 
     tokendir = os.path.expanduser("~/.config/regolith/tokens/google_calendar_api")
     creds = None
@@ -2105,6 +2435,8 @@ def add_to_google_calendar(event):
 def google_cal_auth_flow():
     """First time authentication, this function opens a window to request user consent to use google calendar API,
     and then returns a token"""
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     tokendir = os.path.expanduser("~/.config/regolith/tokens/google_calendar_api")
     os.makedirs(tokendir, exist_ok=True)
     tokenfile = os.path.join(tokendir, "token.json")
@@ -2227,6 +2559,8 @@ def create_repo(destination_id, token_info_id, rc):
         Success message (repo target_repo has been created in talks) if repo is successfully created in target_repo
         Warning/setup messages if unsuccessful (or if repo info or token are not valid)
     """
+    import requests
+    from requests.exceptions import HTTPError
 
     repo_info = get_target_repo_info(destination_id, rc.repos)
     token = get_target_token(token_info_id, rc.tokens)
@@ -0,0 +1,257 @@
+"""Thin adapters over the version control systems that hold databases."""
+
+import os
+import subprocess
+import time
+from warnings import warn
+
+from regolith.profiler import span
+
+
+class GitRepo(object):
+    """A git working tree that regolith reads from and writes to.
+
+    Each method maps onto as few git calls as possible so that loading and
+    dumping a database does not pay for one process (or one network round
+    trip) per file.
+
+    Parameters
+    ----------
+    path : str
+        The path to the working tree.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._objects = None
+
+    def _git(self, *args, check=True, quiet=False):
+        cmd = ["git"] + list(args)
+        stderr = subprocess.DEVNULL if quiet else None
+        with span("git " + args[0], cat="subprocess", path=self.path):
+            if check:
+                return subprocess.check_output(cmd, cwd=self.path, universal_newlines=True, stderr=stderr)
+            return subprocess.call(cmd, cwd=self.path)
+
+    @classmethod
+    def clone(cls, url, path, args=()):
+        """Clones url into path and returns the repo."""
+        with span("git clone", cat="subprocess", url=url):
+            subprocess.check_call(["git", "clone"] + list(args) + [url, path])
+        return cls(path)
+
+    def is_sparse(self):
+        """Whether only part of the tree is checked out."""
+        try:
+            return self._git("config", "--bool", "core.sparseCheckout").strip() == "true"
+        except subprocess.CalledProcessError:
+            return False
+
+    def sparse_set(self, patterns):
+        """Checks out only the paths matching patterns, which are in the
+        .gitignore format, rather than directories as in cone mode."""
+        self._git("sparse-checkout", "set", "--no-cone", *patterns)
+
+    def checkout(self, branch, start="master"):
+        """Checks out branch, creating it from start if it does not exist."""
+        if self._git("checkout", branch, check=False) != 0:
+            self._git("checkout", "-b", branch, start)
+
+    def sparse_add(self, patterns):
+        """Widens the sparse checkout to the paths matching patterns, fetching
+        their files if the repo was cloned without them."""
+        if len(patterns) == 0:
+            return
+        self._git("sparse-checkout", "add", *patterns)
+
+    def tracked(self, path="."):
+        """Returns the paths tracked at HEAD under path, relative to the root
+        of the repo, whether they are checked out or not."""
+        return self._git("ls-tree", "-r", "--name-only", "HEAD", "--", path).splitlines()
+
+    def ls_tree(self, rev, path="."):
+        """Returns the blobs under path at a revision, as a list of
+        (path, blob hash) pairs, with paths relative to path."""
+        out = self._git("ls-tree", "-r", "-z", rev, "--", path)
+        blobs = []
+        for entry in out.split("\0"):
+            if not entry:
+                continue
+            info, _, name = entry.partition("\t")
+            _, kind, sha = info.split()
+            if kind == "blob":
+                blobs.append((name, sha))
+        return blobs
+
+    def git_dir(self):
+        """Returns the path to the git directory, shared by all worktrees."""
+        return os.path.join(self.path, self._git("rev-parse", "--git-common-dir").strip())
+
+    def objects(self):
+        """Returns a BlobReader on the repo, started on first use and kept
+        for the life of the repo object."""
+        if self._objects is None:
+            self._objects = BlobReader(self.path)
+        return self._objects
+
+    def remotes(self):
+        """Returns the names of the configured remotes."""
+        return self._git("remote").split()
+
+    def last_fetched(self):
+        """Returns the time of the last fetch or pull, or None if there has
+        never been one."""
+        try:
+            # .git is a file in worktrees and submodules
+            gitdir = self._git("rev-parse", "--git-dir", quiet=True).strip()
+        except subprocess.CalledProcessError:
+            return None
+        fetch_head = os.path.join(self.path, gitdir, "FETCH_HEAD")
+        if not os.path.exists(fetch_head):
+            return None
+        return os.path.getmtime(fetch_head)
+
+    def is_fresh(self, window):
+        """Whether the repo has been fetched within the last window minutes."""
+        if not window:
+            return False
+        fetched = self.last_fetched()
+        return fetched is not None and time.time() - fetched < 60 * window
+
+    def pull(self, branch="master", freshness=None):
+        """Pulls from upstream, falling back to origin and then to the
+        tracking branch. Only remotes that exist are tried.
+
+        Parameters
+        ----------
+        branch : str, optional
+            The branch to pull from the named remotes.
+        freshness : int or None, optional
+            Skip the pull if the repo was fetched within this many minutes.
+
+        Returns
+        -------
+        pulled : bool
+            Whether a pull succeeded.
+        """
+        if self.is_fresh(freshness):
+            return False
+        remotes = self.remotes()
+        attempts = [[remote, branch] for remote in ("upstream", "origin") if remote in remotes]
+        attempts.append([])
+        for attempt in attempts:
+            if self._git("pull", *attempt, check=False) == 0:
+                return True
+        warn("Could not git pull in " + self.path, RuntimeWarning)
+        return False
+
+    def add(self, paths):
+        """Stages all of the paths in a single call."""
+        if len(paths) == 0:
+            return
+        self._git("add", "--all", "--", *paths)
+
+    def status(self, paths=None):
+        """Returns the porcelain status lines, optionally restricted to paths."""
+        args = ["status", "--porcelain"]
+        if paths:
+            args += ["--"] + list(paths)
+        return self._git(*args).splitlines()
+
+    def has_changes(self, paths=None):
+        """Whether there is anything to commit for paths."""
+        return len(self.status(paths)) != 0
+
+    def commit(self, message):
+        """Commits what is staged, returns whether the commit succeeded."""
+        if self._git("commit", "-m", message, check=False) != 0:
+            warn("Could not git commit to " + self.path, RuntimeWarning)
+            return False
+        return True
+
+    def push(self, remote=None, branch=None):
+        """Pushes to remote and branch if given, otherwise to the default
+        upstream. Returns whether the push succeeded."""
+        args = ["push"]
+        if remote is not None and branch is not None:
+            args += [remote, branch]
+        if self._git(*args, check=False) != 0:
+            warn("Could not git push from " + self.path, RuntimeWarning)
+            return False
+        return True
+
+    def unpushed(self, remote=None, branch=None):
+        """Returns the number of commits on HEAD that are not on remote and
+        branch if given, otherwise on the upstream. When that has never been
+        pushed to, all of the commits are unpushed. A repo without remotes
+        has nothing to push to."""
+        if len(self.remotes()) == 0:
+            return 0
+        upstream = "{0}/{1}".format(remote, branch) if remote is not None and branch is not None else "@{u}"
+        for rev in (upstream + "..HEAD", "HEAD"):
+            try:
+                return int(self._git("rev-list", "--count", rev, quiet=True))
+            except subprocess.CalledProcessError:
+                continue
+        # there are no commits at all
+        return 0
+
+    def commit_and_push(self, paths, message, remote=None, branch=None):
+        """Stages paths and, if that leaves something to commit, commits.
+        Pushes if there is a new commit, or commits that an earlier push
+        failed to send.
+
+        Returns
+        -------
+        pushed : bool
+            Whether commits were pushed.
+        """
+        self.add(paths)
+        if self.has_changes(paths):
+            if not self.commit(message):
+                return False
+        elif self.unpushed(remote=remote, branch=branch) == 0:
+            return False
+        return self.push(remote=remote, branch=branch)
+
+
+class BlobReader(object):
+    """Reads objects out of a git repo, without checking them out, through a
+    single long-lived ``git cat-file --batch`` process rather than one
+    process per object.
+
+    Parameters
+    ----------
+    path : str
+        A path in the repo.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.proc = None
+
+    def read(self, name):
+        """Returns the contents of an object, named by hash or as
+        ``rev:path``, as bytes."""
+        if self.proc is None:
+            self.proc = subprocess.Popen(
+                ["git", "cat-file", "--batch"], cwd=self.path, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+            )
+        with span("git cat-file", cat="subprocess", path=self.path):
+            self.proc.stdin.write(name.encode("utf-8") + b"\n")
+            self.proc.stdin.flush()
+            header = self.proc.stdout.readline().decode("utf-8").split()
+            if len(header) != 3:
+                raise KeyError("{0} is not an object in {1}".format(name, self.path))
+            data = self.proc.stdout.read(int(header[2]))
+            # each object is followed by a newline
+            self.proc.stdout.read(1)
+        return data
+
+    def close(self):
+        """Stops the cat-file process."""
+        if self.proc is not None:
+            self.proc.stdin.close()
+            self.proc.wait()
+            self.proc.stdout.close()
+            self.proc = None